@@ -0,0 +1,230 @@
+import json
+import logging
+import pathlib
+import random
+import sys
+import threading
+import time
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from docopt import docopt
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from coinarb import utils  # noqa: E402
+from coinarb.fundmanager import FundManager  # noqa: E402
+
+BENCHMARKS = {}  # type: Dict[str, Callable[[dict], Tuple[Callable[[], None], int]]]
+
+
+def benchmark(name: str):
+    def _decorator(f):
+        BENCHMARKS[name] = f
+        return f
+
+    return _decorator
+
+
+def make_levels(rnd: random.Random, depth: int, best: float, step: float) -> List[Tuple[float, float]]:
+    levels = []
+    price = best
+    for _ in range(depth):
+        levels.append((round(price, 5), float(rnd.randint(1, 1000))))
+        price += step * rnd.randint(1, 3)
+    return levels
+
+
+def make_order_book(rnd: random.Random, depth: int, mid: float = 100, spread: float = 0.1,
+                    instrument: str = 'XRP_JPY') -> dict:
+    return dict(instrument=instrument, timestamp=time.time(),
+                asks=make_levels(rnd, depth, mid + spread / 2, 0.01),
+                bids=make_levels(rnd, depth, mid - spread / 2, -0.01))
+
+
+@benchmark('utils.adjust_asks_bids')
+def bench_adjust_asks_bids(params: dict):
+    order_book = make_order_book(random.Random(0), params['depth'], spread=-0.05)
+    return lambda: utils.adjust_asks_bids(order_book['asks'], order_book['bids'], 1.5), 1
+
+
+@benchmark('utils.calculate_diff')
+def bench_calculate_diff(params: dict):
+    rnd = random.Random(0)
+    sell = make_order_book(rnd, params['depth'], mid=101)
+    buy = make_order_book(rnd, params['depth'], mid=99)
+    sell['asks'], sell['bids'] = utils.adjust_asks_bids(sell['asks'], sell['bids'], 1)
+    buy['asks'], buy['bids'] = utils.adjust_asks_bids(buy['asks'], buy['bids'], 1)
+    return lambda: utils.calculate_diff(sell, buy, 0.5), 1
+
+
+@benchmark('arraybook.calculate_diff')
+def bench_arraybook_calculate_diff(params: dict):
+    from coinarb import arraybook
+    rnd = random.Random(0)
+    sell = make_order_book(rnd, params['depth'], mid=101)
+    buy = make_order_book(rnd, params['depth'], mid=99)
+    sell['asks'], sell['bids'] = arraybook.adjust_asks_bids(sell['asks'], sell['bids'], 1)
+    buy['asks'], buy['bids'] = arraybook.adjust_asks_bids(buy['asks'], buy['bids'], 1)
+    return lambda: arraybook.calculate_diff(sell, buy, 0.5), 1
+
+
+@benchmark('DataProvider.on_order_book')
+def bench_on_order_book(params: dict):
+    from coinarb.dataprovider import DataProvider
+    from coinarb.fxprovider import FxProvider
+    data_provider = DataProvider([('quoinex', 'XRP_JPY')], fx_provider=FxProvider([]))
+    for _ in range(params['callbacks']):
+        data_provider.register_callback(lambda exchange, key, data: None)
+    rnd = random.Random(0)
+    order_books = [make_order_book(rnd, params['depth']) for _ in range(100)]
+    key = ('order_book', 'XRP_JPY')
+
+    def run():
+        for order_book in order_books:
+            data_provider.on_order_book('quoinex', key, order_book)
+
+    return run, len(order_books)
+
+
+@benchmark('DataProvider.on_order_book/one_level')
+def bench_on_order_book_one_level(params: dict):
+    """full books of a live feed: each message changes the qty of one level"""
+    from coinarb.dataprovider import DataProvider
+    from coinarb.fxprovider import FxProvider
+    data_provider = DataProvider([('quoinex', 'XRP_JPY')], fx_provider=FxProvider([]))
+    for _ in range(params['callbacks']):
+        data_provider.register_callback(lambda exchange, key, data: None)
+    rnd = random.Random(0)
+    order_book = make_order_book(rnd, params['depth'])
+    order_books = []
+    for i in range(100):
+        side = order_book['asks' if i % 2 else 'bids'][:]
+        j = rnd.randrange(len(side))
+        side[j] = (side[j][0], float(rnd.randint(1, 1000)))
+        order_book = dict(order_book, **{'asks' if i % 2 else 'bids': side})
+        order_books.append(order_book)
+    key = ('order_book', 'XRP_JPY')
+
+    def run():
+        for order_book in order_books:
+            data_provider.on_order_book('quoinex', key, order_book)
+
+    return run, len(order_books)
+
+
+@benchmark('FundManager.reserve_fund/release_fund')
+def bench_fund_manager(params: dict):
+    fund_manager = FundManager('quoinex')
+    fund_manager.logger.setLevel(logging.CRITICAL)
+    fund_manager.update_balances(dict(JPY=dict(total=10 ** 12, used=0)))
+    n_threads = params['threads']
+    n = 1000
+
+    def worker():
+        for _ in range(n):
+            fund_manager.reserve_fund('JPY', 1).release()
+
+    def run():
+        threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return run, n * n_threads
+
+
+@benchmark('Agent.on_data/_try_arbitrage_xrp_jpy')
+def bench_agent_cycle(params: dict):
+    from coinarb import agents
+    from coinarb.arbconfig import CONFIG
+    from coinarb.dataprovider import DataProvider
+    from coinarb.fxprovider import FxProvider
+    # debug agents never connect, they only need a credential to build their pools
+    for name in ('quoinex', 'bitbankcc'):
+        CONFIG[name].setdefault('credentials', [dict(api_key='benchmark', api_secret='benchmark')])
+    data_provider = DataProvider([], fx_provider=FxProvider([]))
+    quoinex = agents.quoinex.Agent(data_provider, debug=True)
+    bitbankcc = agents.bitbankcc.Agent(data_provider, debug=True)
+    for a in (quoinex, bitbankcc):
+        a.logger.setLevel(logging.CRITICAL)
+        a.fund_manager.logger.setLevel(logging.CRITICAL)
+        a.fund_manager.update_balances(dict(JPY=dict(total=10 ** 12, used=0), XRP=dict(total=10 ** 9, used=0)))
+        for b in (quoinex, bitbankcc):
+            a.register_agent(b)
+    # bitbankcc bids cross quoinex asks by more than diff_signal and diff_execute,
+    # so every update goes through the signal, sizing and the (debug) execution
+    diff = CONFIG['XRP_JPY']['diff_signal'] + CONFIG['XRP_JPY']['diff_execute']
+    rnd = random.Random(0)
+    updates = []
+    for i in range(100):
+        exchange = ('quoinex', 'bitbankcc')[i % 2]
+        updates.append((exchange, make_order_book(rnd, params['depth'], mid=100 + (i % 2) * diff)))
+    key = ('order_book', 'XRP_JPY')
+
+    def run():
+        for exchange, order_book in updates:
+            data_provider.on_order_book(exchange, key, order_book)
+            quoinex.run_pending_tasks()
+
+    return run, len(updates)
+
+
+def run_benchmarks(params: dict, names: List[str] = None) -> dict:
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        try:
+            func, ops = setup(params)
+        except ImportError as e:
+            results[name] = dict(skipped=repr(e))
+            continue
+        number = params['number']
+        times = timeit.repeat(func, number=number, repeat=params['repeat'])
+        best = min(times) / number / ops
+        results[name] = dict(seconds_per_op=best, ops_per_second=1 / best if best else None,
+                             ops=ops, number=number, repeat=params['repeat'])
+    return dict(params=params, python=sys.version, timestamp=time.time(), results=results)
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    ratios = {}
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name, {})
+        if 'seconds_per_op' in result and 'seconds_per_op' in base:
+            ratios[name] = result['seconds_per_op'] / base['seconds_per_op']
+    return ratios
+
+
+def main():
+    args = docopt("""
+    Usage:
+      {f} [options] [<name>...]
+
+    Options:
+      --depth DEPTH          levels per side of synthetic books [default: 50]
+      --callbacks N          callbacks registered to DataProvider [default: 4]
+      --threads N            threads reserving funds concurrently [default: 4]
+      --number N             calls per measurement [default: 100]
+      --repeat N             measurements, the best one is reported [default: 5]
+      --output FILE          write the json report to FILE
+      --baseline FILE        compare with a json report written before
+
+    """.format(f=pathlib.Path(sys.argv[0]).name))
+    params = {k.lstrip('-'): int(v) for k, v in args.items()
+              if k in ('--depth', '--callbacks', '--threads', '--number', '--repeat')}
+    report = run_benchmarks(params, args['<name>'])
+    if args['--baseline']:
+        with open(args['--baseline']) as f:
+            report['ratio_to_baseline'] = compare(report, json.load(f))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args['--output']:
+        with open(args['--output'], 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
+import asyncio
 import contextlib
+import functools
 import threading
 import time
 from collections import deque
-from queue import Empty, Queue
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
 from typing import Hashable, Tuple, Dict, Any, Type
 
 import coinlib
@@ -10,9 +13,16 @@ from coinlib.coinlib.errors import CoinLibError
 from coinlib.utils.mixins import LoggerMixin, ThreadMixin
 
 from coinarb.dataprovider import DataProvider
+from .. import latency
 from ..arbconfig import CONFIG
+from ..bookstore import Snapshot
 from ..credentialpool import CredentialPool
+from ..eventlog import eventlog
+from ..execution import OrderStateUnknown
 from ..fundmanager import Fund, FundManager, InsufficientFund
+from ..instrumentspec import InstrumentSpec, compile_specs
+from ..ordertracker import OrderTracker
+from ..taskqueue import BACKGROUND, MARKET, PRIORITY_NAMES, ROUTINE, PriorityTaskQueue
 
 
 class TaskEmtpy(Empty):
@@ -21,6 +31,14 @@ class TaskEmtpy(Empty):
 
 class Agent(LoggerMixin, ThreadMixin):
     BALANCE_UPDATE_INTERVAL = 60
+    CLIENT_KEEP_ALIVE_INTERVAL = 60
+    # REST fallback of wait_cancel_order, doubled while the order is unchanged
+    ORDER_POLL_INTERVAL_MIN = 0.5
+    ORDER_POLL_INTERVAL_MAX = 5
+    # time given to the execution stream before the first REST check
+    ORDER_STREAM_GRACE = 0.1
+    # a market task still queued this long after it was put is dropped, its books are too old to trade on
+    MARKET_TASK_TTL = 1.0
 
     def __init__(self, exchange: str, data_provider: DataProvider, *, interval: float = 0.5, debug: bool = False, **__):
         self.name = exchange
@@ -29,35 +47,82 @@ class Agent(LoggerMixin, ThreadMixin):
         self._data_provider = data_provider
         self.interval = interval
         self.is_debug = debug
-        self.order_books = {}
+        self._book_store = data_provider.book_store
         self.config = CONFIG[exchange]
+        self.specs = {instrument: spec for (_exchange, instrument), spec in compile_specs(CONFIG).items()
+                      if _exchange == exchange}  # type: Dict[str, InstrumentSpec]
         self._client_cls = getattr(coinlib, exchange).StreamClient  # type: Type[coinlib.StreamClient]
         self.agents = {}  # type: Dict[str, Agent]
         self.fund_manager = FundManager(exchange)
-        self._credential_pool = CredentialPool(self.config['credentials'])
-        self._task_q = Queue()
+        self._credential_pool = CredentialPool(self.config['credentials'],
+                                               client_factory=self._make_client,
+                                               health_check=self.check_client,
+                                               keep_alive_interval=self.CLIENT_KEEP_ALIVE_INTERVAL)
+        self._task_q = PriorityTaskQueue()
         self._order_q = deque()
         self._is_balance_updated = threading.Event()
+        self.task_started_at = 0.0
+        self.order_tracker = OrderTracker()
+        # stream client of the account's own messages, see open_stream
+        self.client = None  # type: coinlib.StreamClient
+        self._loop = None  # type: asyncio.AbstractEventLoop
+        self._task_wakeup = None  # type: asyncio.Event
 
         data_provider.register_callback(self.on_data)
 
         if debug:
             self.logger.info('DEBUG MODE')
 
+    def _make_client(self, credential: dict) -> coinlib.StreamClient:
+        return self._client_cls(credential['api_key'], credential['api_secret'])
+
+    def open_stream(self) -> coinlib.StreamClient:
+        """
+        a client of its own for the subscriptions of the account. it is never leased, a subscription lives as
+        long as the agent; the credential is only borrowed from the pool to make it. closed by stop()
+        """
+        with self._credential_pool.get() as credential:
+            self.client = self._make_client(credential)
+        self.client.open()
+        return self.client
+
+    def stop(self):
+        super().stop()
+        client, self.client = self.client, None
+        if client is not None:
+            client.close()
+
+    def check_client(self, client: coinlib.StreamClient):
+        client.get_balances()
+
     @contextlib.contextmanager
     def get_client(self) -> coinlib.StreamClient:
-        with self._credential_pool.get() as credential:
-            yield self._client_cls(credential['api_key'], credential['api_secret'])
+        with self._credential_pool.lease() as client:
+            yield client
 
     def sleep(self, seconds: float):
         _ = self
         time.sleep(seconds)
 
-    def start_interval_task(self, interval: float, func, *args, **kwargs):
+    def start_interval_task(self, interval: float, func, *args, priority: int = ROUTINE, ttl: float = None,
+                            **kwargs):
+        if self._loop:
+            def on_timer():
+                if not self.is_active():
+                    return
+                try:
+                    self.put_task(func, *args, priority=priority, ttl=ttl, **kwargs)
+                except Exception as e:
+                    self.logger.exception(e)
+                self._loop.call_later(interval, on_timer)
+
+            self._loop.call_soon(on_timer)
+            return
+
         def run():
             while self.is_active():
                 try:
-                    self.put_task(func, *args, **kwargs)
+                    self.put_task(func, *args, priority=priority, ttl=ttl, **kwargs)
                 except Exception as e:
                     self.logger.exception(e)
                 self.sleep(interval)
@@ -68,18 +133,62 @@ class Agent(LoggerMixin, ThreadMixin):
         self.update_balances()
         self.init()
         self.activate()
-        self.start_interval_task(self.interval, self.main)
-        self.start_interval_task(self.BALANCE_UPDATE_INTERVAL, self.update_balances)
-        while self.is_active():
-            try:
-                self.consume_tasks()
-            except InsufficientFund as e:
-                self.logger.warning(e)
-                self._is_balance_updated.clear()
-            except TaskEmtpy:
-                pass
-            except Exception as e:
-                self.logger.exception(e)
+        # a main run the next one already replaces is not worth running late
+        self.start_interval_task(self.interval, self.main, ttl=self.interval)
+        self.start_interval_task(self.BALANCE_UPDATE_INTERVAL, self.update_balances, priority=BACKGROUND)
+        self._credential_pool.start_keep_alive()
+        try:
+            while self.is_active():
+                try:
+                    self.consume_tasks()
+                except InsufficientFund as e:
+                    self.logger.warning(e)
+                    self._is_balance_updated.clear()
+                except TaskEmtpy:
+                    pass
+                except Exception as e:
+                    self.logger.exception(e)
+        finally:
+            self._credential_pool.close()
+
+    async def run_async(self):
+        """
+        run on the current event loop instead of own threads. tasks are taken on the loop; coroutine tasks
+        run on it, the others (REST calls, order waits) on one worker thread of this agent, so they never
+        block the loop and still run one at a time.
+        """
+        loop = asyncio.get_event_loop()
+        self._task_wakeup = asyncio.Event()
+        self._loop = loop
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='agent-{}'.format(self.name))
+        await self.update_balances_async()
+        await loop.run_in_executor(executor, self.init)
+        self.activate()
+        self.start_interval_task(self.interval, self.main, ttl=self.interval)
+        self.start_interval_task(self.BALANCE_UPDATE_INTERVAL, self.update_balances_async, priority=BACKGROUND)
+        self._credential_pool.start_keep_alive()
+        try:
+            while self.is_active():
+                try:
+                    task = self._take_task()
+                except Empty:
+                    # put_task sets it from the loop, never between this check and the wait
+                    self._task_wakeup.clear()
+                    await self._task_wakeup.wait()
+                    continue
+                try:
+                    if asyncio.iscoroutinefunction(task[0]):
+                        await self.run_task(task)
+                    else:
+                        await loop.run_in_executor(executor, functools.partial(self.run_task, task))
+                except InsufficientFund as e:
+                    self.logger.warning(e)
+                    self._is_balance_updated.clear()
+                except Exception as e:
+                    self.logger.exception(e)
+        finally:
+            self._credential_pool.close()
+            executor.shutdown(wait=False)
 
     def init(self):
         pass
@@ -90,20 +199,71 @@ class Agent(LoggerMixin, ThreadMixin):
     def consume_tasks(self):
         while True:
             try:
-                task = self._task_q.get(timeout=0.5)
-                task[0](*task[1], **task[2])
+                task = self._take_task(timeout=0.5)
+                self.run_task(task)
             except Empty:
                 return
 
-    def put_task(self, func, *args, **kwargs):
-        self._task_q.put((func, args, kwargs))
+    def _take_task(self, timeout: float = None) -> tuple:
+        """the next task to run, waiting up to timeout. None does not wait"""
+        if timeout is None:
+            priority, task = self._task_q.get_nowait()
+        else:
+            priority, task = self._task_q.get(timeout=timeout)
+        # the wait of each priority class, its depth is in task_stats
+        self.task_started_at = latency.recorder.record_since(latency.QUEUE, self.name, PRIORITY_NAMES[priority],
+                                                             task[3])
+        return task
+
+    def run_task(self, task: tuple):
+        func, args, kwargs, _ = task
+        return func(*args, **kwargs)
+
+    def run_pending_tasks(self):
+        """run queued tasks on the caller's thread until the queue is empty"""
+        while True:
+            try:
+                task = self._take_task()
+            except Empty:
+                return
+            try:
+                self.run_task(task)
+            except InsufficientFund as e:
+                self.logger.warning(e)
+            except Exception as e:
+                self.logger.exception(e)
+
+    def put_task(self, func, *args, priority: int = ROUTINE, ttl: float = None, on_expired=None, **kwargs) -> int:
+        """
+        queue func(*args, **kwargs) in its priority class. if it is still queued ttl seconds later it is dropped
+        and on_expired is called instead. MARKET tasks are given MARKET_TASK_TTL. returns the depth of the queue.
+        """
+        put_at = time.time()
+        if priority == MARKET and ttl is None:
+            ttl = self.MARKET_TASK_TTL
+        depth = self._task_q.put((func, args, kwargs, put_at), priority,
+                                 deadline=put_at + ttl if ttl is not None else None, on_expired=on_expired)
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._task_wakeup.set)
+        return depth
+
+    def task_stats(self) -> dict:
+        return self._task_q.stats()
 
-    def get_order_books_snapshot(self):
-        return self.order_books.copy()
+    @property
+    def order_books(self) -> Snapshot:
+        return self._book_store.snapshot()
+
+    def get_order_books_snapshot(self) -> Snapshot:
+        """books of every venue as of one version of the data provider's store, nothing is copied"""
+        return self._book_store.snapshot()
+
+    def is_snapshot_stale(self, snapshot: Snapshot, keys=None) -> bool:
+        return self._book_store.is_stale(snapshot, keys)
 
     def on_data(self, exchange: str, key: Tuple[str, Hashable], data: Any):
-        if key[0] == 'order_book':
-            self.order_books[(exchange, key[1])] = data
+        # books are kept by the data provider's store
+        _ = exchange, key, data
 
     def register_agent(self, agent: 'Agent'):
         self.agents[agent.name] = agent
@@ -114,31 +274,29 @@ class Agent(LoggerMixin, ThreadMixin):
         self.fund_manager.update_balances(balances)
         self._is_balance_updated.set()
 
+    async def update_balances_async(self):
+        # the REST call must not block the event loop
+        await asyncio.get_event_loop().run_in_executor(None, self.update_balances)
+
+    def get_fee(self, liquidity: str = 'taker') -> float:
+        return self.config.get('fees', {}).get(liquidity, 0)
+
+    def get_spec(self, instrument: str) -> InstrumentSpec:
+        spec = self.specs.get(instrument)
+        assert spec, (self.name, instrument)
+        return spec
+
     def round_price(self, instrument: str, price: float) -> float:
-        precisions = self.config['precisions']
-        assert instrument in precisions, (self.name, instrument)
-        precision = precisions[instrument]['price']
-        return int(price * 10 ** precision) / (10 ** precision)
+        return self.get_spec(instrument).round_price(price)
 
     def inc_dec_price(self, instrument: str, price: float, inc_dec: int) -> float:
-        precisions = self.config['precisions']
-        assert instrument in precisions, (self.name, instrument)
-        precision = precisions[instrument]['price']
-        price += inc_dec / (10 ** precision)
-        return self.round_price(instrument, price)
+        return self.get_spec(instrument).inc_dec_price(price, inc_dec)
 
     def round_qty(self, instrument: str, qty: float) -> float:
-        precisions = self.config['precisions']
-        assert instrument in precisions, (self.name, instrument)
-        precision = precisions[instrument]['qty']
-        return int(qty * 10 ** precision) / (10 ** precision)
+        return self.get_spec(instrument).round_qty(qty)
 
     def inc_dec_qty(self, instrument: str, qty: float, inc_dec: int) -> float:
-        precisions = self.config['precisions']
-        assert instrument in precisions, (self.name, instrument)
-        precision = precisions[instrument]['qty']
-        qty += inc_dec / (10 ** precision)
-        return self.round_qty(instrument, qty)
+        return self.get_spec(instrument).inc_dec_qty(qty, inc_dec)
 
     def create_order_fak(self, instrument: str, order_type: str, side: str, price: float, qty: float,
                          *, fund: Fund) -> dict:
@@ -147,10 +305,9 @@ class Agent(LoggerMixin, ThreadMixin):
 
         price = self.inc_dec_price(instrument, price, 1 if side == 'BUY' else -1)
         qty = self.round_qty(instrument, qty)
-        self.logger.info(
-            'submit_order instrument={} order_type={} side={} price={} qty={} fund={}'.format(
-                instrument, order_type, side, price, qty, fund
-            ))
+        eventlog.info(self.logger, 'submit_order', instrument=instrument, order_type=order_type, side=side,
+                      price=price, qty=qty, currency=fund.currency, fund_qty=fund.qty)
+        submitted_at = time.time()
         if self.is_debug:
             order = dict(price_executed_average=price, qty_executed=qty, debug=True)
         else:
@@ -163,14 +320,49 @@ class Agent(LoggerMixin, ThreadMixin):
                 else:
                     assert False, order_type
 
-            order = self.wait_cancel_order(order, timeout=300)
+            try:
+                order = self.wait_cancel_order(order, timeout=300)
+            except Exception as e:
+                # the order exists, whoever handles this can still ask the venue what it filled
+                raise OrderStateUnknown(order) from e
+            latency.recorder.record_since(latency.FILL, self.name, instrument, submitted_at)
         self.fund_manager.apply_fund(fund)
-        self.logger.info('submit_order executed price={price_executed_average} qty={qty_executed}'.format(**order))
+        eventlog.info(self.logger, 'submit_order_executed', price=order['price_executed_average'],
+                      qty=order['qty_executed'])
         return order
 
+    def submit_order(self, instrument: str, order_type: str, side: str, price: float, qty: float,
+                     *, condition: str = 'fak', fund: Fund) -> dict:
+        assert condition == 'fak', condition
+        order = self.create_order_fak(instrument, order_type, side, price, qty, fund=fund)
+        order['qty'] = order['qty_executed']
+        return order
+
+    def get_order(self, order: dict) -> dict:
+        with self.get_client() as client:
+            return client.get_order(**order)
+
+    def on_order_update(self, order: dict):
+        """order updates of the execution stream, a final state completes wait_cancel_order without polling"""
+        self.order_tracker.notify(order)
+
     def wait_cancel_order(self, order: dict, timeout: float) -> dict:
+        order_id = order.get('id')
+        # updates the stream delivered before the order was returned are applied here
+        self.order_tracker.track(order_id, order.get('qty', order.get('quantity')))
+        try:
+            return self._wait_cancel_order(order, timeout)
+        finally:
+            self.order_tracker.untrack(order_id)
+
+    def _wait_cancel_order(self, order: dict, timeout: float) -> dict:
+        order_id = order.get('id')
         expired = time.time() + timeout
+        interval = self.ORDER_POLL_INTERVAL_MIN
+        _, completed = self.order_tracker.wait(order_id, self.ORDER_STREAM_GRACE)
         while time.time() < expired:
+            if completed:
+                return completed
             try:
                 with self.get_client() as client:
                     order = client.get_order(**order)
@@ -183,8 +375,14 @@ class Agent(LoggerMixin, ThreadMixin):
                             pass
                     else:
                         return order
+                interval = min(interval * 2, self.ORDER_POLL_INTERVAL_MAX)
             except Exception as e:
                 self.logger.exception(str(e))
-                time.sleep(5)
-            time.sleep(0.5)
+                interval = self.ORDER_POLL_INTERVAL_MAX
+            woken, completed = self.order_tracker.wait(order_id, min(interval, max(0, expired - time.time())))
+            if woken:
+                # the order changed, check it again soon
+                interval = self.ORDER_POLL_INTERVAL_MIN
+        if completed:
+            return completed
         raise Exception('order not completed order={}'.format(order))
@@ -1,8 +1,17 @@
-import json
-import threading
-from typing import Hashable, Tuple, Any
-
-from coinarb import utils
+import contextlib
+import time
+from typing import Hashable, Tuple, Any, Dict
+
+from coinarb import latency
+from coinarb.bookstore import Snapshot
+from coinarb.conflation import Conflator
+from coinarb.cycles import CycleDetector
+from coinarb.depthindex import DepthIndex, optimal_size, required_fund
+from coinarb.eventlog import eventlog
+from coinarb.execution import FUND_BUFFERS, Leg, TwoLegExecutor
+from coinarb.fundmanager import reserve_funds
+from coinarb.scanner import Scanner
+from coinarb.taskqueue import MARKET
 from . import agent
 from ..arbconfig import CONFIG
 
@@ -12,10 +21,16 @@ class Agent(agent.Agent):
         super().__init__('quoinex', *args, **kwargs)
 
         self.user_id = CONFIG['quoinex']['user_id']
-        self._order_book_updated = threading.Event()
+        self._conflator = Conflator()
+        self._scanners = {}  # type: Dict[str, Scanner]
+        self._two_leg_executor = TwoLegExecutor(logger=self.logger)
+        cycles_config = dict(CONFIG['cycles'])
+        self._cycle_instruments = frozenset(cycles_config.pop('instruments'))
+        self._cycle_detector = CycleDetector(**cycles_config)
+        self._cycle_conflator = Conflator(group_of=lambda key: 'cycles')
 
     def init(self):
-        self.client.open()
+        self.open_stream()
         subscriptions = [
             ('execution', ('XRP_JPY', self.user_id)),
             ('execution', ('QASH_JPY', self.user_id)),
@@ -28,88 +43,191 @@ class Agent(agent.Agent):
 
     def on_data(self, exchange: str, key: Tuple[str, Hashable], on_data: Any):
         super().on_data(exchange, key, on_data)
-        if key[0] == 'order_book':
-            if exchange in ('quoinex',):
-                if not self._order_book_updated.is_set():
-                    self._order_book_updated.set()
-                    self.put_task(self.try_arbitrage_xrp_jpy)
+        if key[0] == 'order_book' and key[1] == 'XRP_JPY':
+            if self._conflator.update((exchange, key[1]), on_data) is not None:
+                latency.recorder.record_since(latency.DISPATCH, exchange, key[1], on_data.get('received_at'))
+                self.put_task(self.try_arbitrage_xrp_jpy, priority=MARKET,
+                              on_expired=lambda: self.drop_updates(self._conflator, 'XRP_JPY'))
+        if key[0] == 'order_book' and key[1] in self._cycle_instruments:
+            if self._cycle_conflator.update((exchange, key[1]), on_data) is not None:
+                self.put_task(self.try_cycles, priority=MARKET,
+                              on_expired=lambda: self.drop_updates(self._cycle_conflator, 'cycles'))
+
+    def drop_updates(self, conflator: Conflator, group: str):
+        """
+        an expired evaluation releases its group. the changed books stay in the conflator, so the evaluation
+        scheduled by the next update of any venue still gives them to the scanner
+        """
+        conflator.release(group)
+        eventlog.warning(self.logger, 'task_expired', group=group)
 
     def on_execution(self, key: Tuple[str, Hashable], data: dict):
-        pass
+        # an execution refers to its order by order_id
+        order_id = data.get('order_id', data.get('id'))
+        if 'state' in data:
+            self.on_order_update(dict(data, id=order_id))
+            return
+        if 'quantity' not in data or 'price' not in data:
+            self.logger.warning('execution without state or fill {}'.format(data))
+            return
+        # a fill without the order's state, the tracker adds them up to the qty of the order
+        self.on_order_update(dict(id=order_id, fill_qty=float(data['quantity']), fill_price=float(data['price'])))
 
     def try_arbitrage_xrp_jpy(self):
-        try:
-            self._try_arbitrage_xrp_jpy()
-        finally:
-            self._order_book_updated.clear()
+        self._try_arbitrage_xrp_jpy()
+
+    def get_scanner(self, instrument: str) -> Scanner:
+        if instrument not in self._scanners:
+            config = CONFIG[instrument]
+            # the execution threshold and any extra tiers come from the walk of the signal
+            self._scanners[instrument] = Scanner(instrument, config['diff_signal'],
+                                                 max_candidates=config.get('max_candidates'),
+                                                 tiers=[config['diff_execute']] + config.get('diff_tiers', []),
+                                                 cache=self._data_provider.opportunity_cache)
+        return self._scanners[instrument]
 
     def _try_arbitrage_xrp_jpy(self):
-        snapshot = self.get_order_books_snapshot()
         instrument = 'XRP_JPY'
-        if not {('quoinex', instrument), ('bitbankcc', instrument)}.issubset(snapshot):
+        _, updates = self._conflator.take(instrument)
+        if not updates:
+            # a task queued earlier already evaluated these books
+            return
+        # the store already holds these updates or newer books
+        snapshot = self.get_order_books_snapshot()
+        scanner = self.get_scanner(instrument)
+        max_book_age = CONFIG[instrument].get('max_book_age')
+        opportunities = {}
+        for exchange, _ in updates:
+            if exchange not in self.agents:
+                continue
+            # later updates evaluate against the newer books, so the last result of a pair wins
+            for result in scanner.update(exchange, snapshot[(exchange, instrument)]):
+                opportunities[(result['sell_exchange'], result['buy_exchange'])] = result
+
+        for result_signal in sorted(opportunities.values(), key=lambda x: -x['diff'] * x['qty']):
+            sell_exchange = result_signal['sell_exchange']
+            buy_exchange = result_signal['buy_exchange']
+            if self.name not in (sell_exchange, buy_exchange):
+                continue
+            if self.is_snapshot_stale(snapshot, [(sell_exchange, instrument), (buy_exchange, instrument)]):
+                # newer books of the pair are queued for the next evaluation
+                continue
+            if max_book_age is not None:
+                received_at = min(snapshot[(sell_exchange, instrument)].get('received_at', 0),
+                                  snapshot[(buy_exchange, instrument)].get('received_at', 0))
+                if time.time() - received_at > max_book_age:
+                    # a feed stopped updating, or its worker died
+                    eventlog.warning(self.logger, 'book_too_old', instrument=instrument, sell_exchange=sell_exchange,
+                                     buy_exchange=buy_exchange, received_at=received_at)
+                    continue
+            my_side = 'SELL' if sell_exchange == self.name else 'BUY'
+            self.try_arb(snapshot, instrument, result_signal, my_side)
+
+    def try_cycles(self):
+        _, updates = self._cycle_conflator.take('cycles')
+        opportunities = {}
+        for (exchange, _), order_book in updates.items():
+            for opportunity in self._cycle_detector.update(exchange, order_book):
+                opportunities[tuple((leg['exchange'], leg['instrument'], leg['side'])
+                                    for leg in opportunity['legs'])] = opportunity
+        for opportunity in sorted(opportunities.values(), key=lambda x: -x['profit']):
+            exchanges = {leg['exchange'] for leg in opportunity['legs']}
+            if self.name not in exchanges or not exchanges.issubset(self.agents):
+                continue
+            self.try_cycle(opportunity)
+            # the books changed by the first execution are evaluated again with the next updates
             return
 
-        config = CONFIG['XRP_JPY']
+    def try_cycle(self, opportunity: dict):
+        eventlog.info(self.logger, 'cycle', **opportunity)
+        legs = opportunity['legs']
+        funds = reserve_funds([(self.agents[leg['exchange']].fund_manager, leg['source'],
+                                leg['amount_in'] * FUND_BUFFERS[leg['side']]) for leg in legs])
+        with contextlib.ExitStack() as stack:
+            for fund in funds:
+                stack.enter_context(fund)
+            for leg, fund in zip(legs, funds):
+                leg_agent = self.agents[leg['exchange']]
+                qty = leg_agent.round_qty(leg['instrument'], leg['qty'])
+                execution = leg_agent.submit_order(leg['instrument'], 'limit', leg['side'], leg['price'], qty,
+                                               condition='fak', fund=fund)
+                if execution['qty'] < qty:
+                    # the rest of the cycle would trade an amount that is not there
+                    eventlog.warning(self.logger, 'cycle_incomplete', leg=leg, **execution)
+                    return
+
+    def try_arb(self, snapshot: Snapshot, instrument: str, result_signal: dict, my_side: str):
+        config = CONFIG[instrument]
         qty_min = config['qty_min']
         qty_max = config['qty_max']
-
-        def try_arb(sell_exchange, buy_exchange, my_side):
-            sell_order_book = snapshot[(sell_exchange, instrument)]
-            buy_order_book = snapshot[(buy_exchange, instrument)]
-
-            diff = config['diff_signal']
-            result_signal = utils.calculate_diff(sell_order_book, buy_order_book, diff)
-            if not result_signal or result_signal['diff'] < diff:
-                return
-            self.logger.info('signal={}'.format(json.dumps(result_signal, sort_keys=True)))
-            diff = config['diff_execute']
-            result = utils.calculate_diff(sell_order_book, buy_order_book, diff)
-            if not result or result['diff'] < diff:
-                return
-            qty = result['qty']
-            if qty < qty_min:
-                return
-            qty = min([qty, qty_max])
-            assert {sell_exchange, buy_exchange}.issubset(set(self.agents)), set(self.agents)
-            self.logger.info('execute={}'.format(json.dumps(result, sort_keys=True)))
-
-            exchange_map = dict(SELL=sell_exchange, BUY=buy_exchange)
-            currency_map = dict(SELL='XRP', BUY='JPY')
-            reverse_side_map = dict(SELL='BUY', BUY='SELL')
-            other_side = reverse_side_map[my_side]
-            my_agent = self.agents[exchange_map[my_side]]
-            other_agent = self.agents[exchange_map[other_side]]
-            fund_qty_map = {
-                'XRP': qty,
-                'JPY': qty * result['buy_jpy'],
-            }
-            my_fund_qty = fund_qty_map[currency_map[my_side]]
-            my_fund = my_agent.fund_manager.reserve_fund(currency_map[my_side],
-                                                         my_fund_qty * 1.005)
-            with my_fund:
-                other_fund_qty = fund_qty_map[currency_map[other_side]]
-                other_fund = other_agent.fund_manager.reserve_fund(currency_map[other_side],
-                                                                   other_fund_qty * 1.02)
-                with other_fund:
-                    execution = my_agent.submit_order(instrument, 'limit',
-                                                      my_side,
-                                                      result['{}_price'.format(my_side.lower())],
-                                                      qty,
-                                                      condition='fak',
-                                                      fund=my_fund)
-                    if execution['qty'] <= 0:
-                        self.logger.warning(
-                            'order not filled execution={}'.format(json.dumps(execution, sort_keys=True)))
-                        return
-                    my_agent.fund_manager.apply_fund(my_fund)
-
-                    other_agent.submit_order(instrument,
-                                             'market',
-                                             other_side,
-                                             result['{}_price'.format(other_side.lower())],
-                                             execution['qty'],
-                                             fund=other_fund)
+        sell_exchange = result_signal['sell_exchange']
+        buy_exchange = result_signal['buy_exchange']
+        sell_order_book = snapshot[(sell_exchange, instrument)]
+        buy_order_book = snapshot[(buy_exchange, instrument)]
+
+        decided_at = latency.recorder.record_since(latency.DECISION, self.name, instrument, self.task_started_at)
+        eventlog.info(self.logger, 'signal', **result_signal)
+        execute_tier = result_signal['tiers'][0]
+        if not execute_tier or execute_tier['diff'] < config['diff_execute']:
             return
-
-        try_arb(sell_exchange='quoinex', buy_exchange='bitbankcc', my_side='SELL')
-        try_arb(sell_exchange='bitbankcc', buy_exchange='quoinex', my_side='BUY')
+        assert {sell_exchange, buy_exchange}.issubset(set(self.agents)), set(self.agents)
+        fee_map = dict(SELL=self.agents[sell_exchange].get_fee('taker'), BUY=self.agents[buy_exchange].get_fee('taker'))
+        result = optimal_size(DepthIndex.of(sell_order_book).bids, DepthIndex.of(buy_order_book).asks,
+                              sell_fee=fee_map['SELL'], buy_fee=fee_map['BUY'], diff_min=config['diff_execute'],
+                              qty_max=qty_max)
+        if not result:
+            return
+        qty = result['qty']
+        if qty < qty_min:
+            return
+        eventlog.info(self.logger, 'execute', **result)
+
+        exchange_map = dict(SELL=sell_exchange, BUY=buy_exchange)
+        base, quote = instrument.split('_')
+        # what each side spends
+        currency_map = dict(SELL=base, BUY=quote)
+        reverse_side_map = dict(SELL='BUY', BUY='SELL')
+        other_side = reverse_side_map[my_side]
+        my_agent = self.agents[exchange_map[my_side]]
+        other_agent = self.agents[exchange_map[other_side]]
+        # a BUY limit is placed one tick above the worst level it has to reach
+        limit_price_map = dict(SELL=result['sell_price'],
+                               BUY=self.agents[buy_exchange].inc_dec_price(instrument, result['buy_price'], 1))
+        # the other leg is a market order, it keeps the slippage allowance of the executors on top
+        my_fund, other_fund = reserve_funds([
+            (my_agent.fund_manager, currency_map[my_side],
+             required_fund(my_side, qty, limit_price_map[my_side], fee_map[my_side])),
+            (other_agent.fund_manager, currency_map[other_side],
+             required_fund(other_side, qty, limit_price_map[other_side], fee_map[other_side])
+             * FUND_BUFFERS[other_side]),
+        ])
+        with my_fund:
+            with other_fund:
+                latency.recorder.record_since(latency.SUBMIT, self.name, instrument, decided_at)
+                received_at = max(sell_order_book.get('received_at', 0), buy_order_book.get('received_at', 0))
+                latency.recorder.record_since(latency.TICK_TO_TRADE, self.name, instrument, received_at)
+                if config.get('execution') == 'concurrent':
+                    self._two_leg_executor.execute([
+                        Leg(my_agent, instrument, 'limit', my_side, result['{}_price'.format(my_side.lower())], qty,
+                            my_fund),
+                        Leg(other_agent, instrument, 'market', other_side,
+                            result['{}_price'.format(other_side.lower())], qty, other_fund),
+                    ])
+                    return
+                execution = my_agent.submit_order(instrument, 'limit',
+                                                  my_side,
+                                                  result['{}_price'.format(my_side.lower())],
+                                                  qty,
+                                                  condition='fak',
+                                                  fund=my_fund)
+                if execution['qty'] <= 0:
+                    eventlog.warning(self.logger, 'order_not_filled', **execution)
+                    return
+                my_agent.fund_manager.apply_fund(my_fund)
+
+                other_agent.submit_order(instrument,
+                                         'market',
+                                         other_side,
+                                         result['{}_price'.format(other_side.lower())],
+                                         execution['qty'],
+                                         fund=other_fund)
@@ -0,0 +1,59 @@
+import asyncio
+from typing import List
+
+from coinlib.utils.mixins import LoggerMixin
+
+from .agents.agent import Agent
+from .dataprovider import DataProvider
+from .fxprovider import FxProvider
+
+
+class AsyncRuntime(LoggerMixin):
+    """
+    runs providers and agents as coroutines on one event loop instead of one thread (or more) each.
+    feed callbacks wake the agents through their task queues, periodic jobs are loop timers.
+    blocking task bodies run on one worker thread per agent, never on the loop.
+    """
+
+    def __init__(self, fx_provider: FxProvider, data_provider: DataProvider, agents: List[Agent]):
+        self._logger = self._make_logger()
+        self.fx_provider = fx_provider
+        self.data_provider = data_provider
+        self.agents = agents
+        self._loop = None  # type: asyncio.AbstractEventLoop
+        self._main_task = None  # type: asyncio.Future
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._main_task = asyncio.ensure_future(self.run_async())
+        try:
+            self._loop.run_until_complete(self._main_task)
+        except KeyboardInterrupt:
+            # let run_async stop everything before the loop is closed
+            self._main_task.cancel()
+            self._loop.run_until_complete(asyncio.gather(self._main_task, return_exceptions=True))
+            raise
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def stop(self):
+        if self._loop and self._main_task:
+            self._loop.call_soon_threadsafe(self._main_task.cancel)
+
+    async def run_async(self):
+        members = [self.fx_provider, self.data_provider] + list(self.agents)
+        tasks = [asyncio.ensure_future(member.run_async()) for member in members]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception():
+                    self.logger.error('{} stopped with {!r}'.format(task, task.exception()))
+        finally:
+            for member in reversed(members):
+                member.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,5 +1,7 @@
 CONFIG = {
     'bitbankcc': {
+        # rates of the traded notional, negative is a rebate
+        'fees': dict(taker=0.0015, maker=-0.0005),
         'funds': {
             'JPY': dict(locked=0),
             'XRP': dict(locked=0),
@@ -10,6 +12,7 @@ CONFIG = {
     },
     'quoinex': {
         'user_id': 0,
+        'fees': dict(taker=0.001, maker=0),
         'funds': {
             'JPY': dict(locked=10000000),
             'XRP': dict(locked=5000),
@@ -33,9 +36,43 @@ CONFIG = {
     'XRP_JPY': {
         'diff_signal': 1.01,
         'diff_execute': 1,
+        # more thresholds evaluated in the same walk, e.g. staged sizes or alerts
+        'diff_tiers': [],
+        # pairs walked in depth per update, ranked by their top of book diff
+        'max_candidates': 3,
+        # seconds since a book was received after which its pairs are not traded, None to trade any book
+        'max_book_age': 1.0,
         'qty_min': 1,
         'qty_max': 1,
-    }
+        'execution': 'sequential',  # or 'concurrent'
+    },
+    # venues of main.py --simulate
+    'simulation': {
+        'mids': {
+            'XRP_JPY': 60.0,
+            'QASH_JPY': 100.0,
+            'QASH_USD': 0.9,
+        },
+        'balances': {
+            'JPY': 10000000,
+            'USD': 100000,
+            'XRP': 100000,
+            'QASH': 100000,
+        },
+        'options': dict(latency=0.05, stream_latency=0.01, update_interval=0.1, fill_ratio=0.8),
+    },
+    # cycles across instruments and venues, their instruments need precisions of every venue
+    'cycles': {
+        'instruments': [
+            #            'QASH_JPY',
+            #            'QASH_USD',
+        ],
+        'profit_min': 0.003,
+        'max_length': 3,
+        'amount_max': {
+            'JPY': 100000,
+        },
+    },
 }
 
 try:
@@ -0,0 +1,129 @@
+import math
+from typing import Optional, Tuple, List, Iterable, Sequence
+
+import numpy as np
+
+from . import utils
+
+# column layout of a converted book, same order as the (jpy, qty, price) tuples of utils
+JPY = 0
+QTY = 1
+PRICE = 2
+
+
+def empty_levels() -> np.ndarray:
+    return np.empty((0, 3), dtype=np.float64)
+
+
+def to_levels(levels: Iterable[Sequence[float]], rate: float = 1) -> np.ndarray:
+    """(price, qty) pairs -> contiguous float64 array of (jpy, qty, price)"""
+    raw = np.asarray(list(levels), dtype=np.float64)
+    if not raw.size:
+        return empty_levels()
+    converted = np.empty((raw.shape[0], 3), dtype=np.float64)
+    converted[:, JPY] = raw[:, 0] * rate
+    converted[:, QTY] = raw[:, 1]
+    converted[:, PRICE] = raw[:, 0]
+    return converted
+
+
+def to_list(levels: np.ndarray) -> List[Tuple[float, float, float]]:
+    return [(jpy, qty, price) for jpy, qty, price in levels.tolist()]
+
+
+def net_crossed(asks: np.ndarray, bids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    remove crossed quantities (ask price <= bid price) from the top of both sides.
+    asks ascending, bids descending, both as (jpy, qty, price) arrays.
+    """
+    if not len(asks) or not len(bids):
+        return asks, bids
+    if asks[0, PRICE] > bids[0, PRICE]:
+        return asks, bids
+    cum_asks = np.cumsum(asks[:, QTY])
+    cum_bids = np.cumsum(bids[:, QTY])
+    # every point where one of the top levels changes, in netted quantity
+    breaks = np.union1d(cum_asks, cum_bids)
+    breaks = np.concatenate(([0.], breaks[breaks < min(cum_asks[-1], cum_bids[-1])]))
+    ask_i = np.searchsorted(cum_asks, breaks, 'right')
+    bid_i = np.searchsorted(cum_bids, breaks, 'right')
+    uncrossed = np.flatnonzero(asks[ask_i, PRICE] > bids[bid_i, PRICE])
+    if len(uncrossed):
+        k = uncrossed[0]
+        netted = breaks[k]
+        ask_i, bid_i = ask_i[k], bid_i[k]
+    else:
+        # one side is consumed completely
+        netted = min(cum_asks[-1], cum_bids[-1])
+        ask_i = np.searchsorted(cum_asks, netted, 'right')
+        bid_i = np.searchsorted(cum_bids, netted, 'right')
+    asks = asks[ask_i:].copy()
+    bids = bids[bid_i:].copy()
+    if len(asks):
+        asks[0, QTY] = cum_asks[ask_i] - netted
+    if len(bids):
+        bids[0, QTY] = cum_bids[bid_i] - netted
+    return asks, bids
+
+
+def adjust_asks_bids(asks: Iterable[Tuple[float, float]], bids: Iterable[Tuple[float, float]],
+                     rate: float) -> Tuple[np.ndarray, np.ndarray]:
+    return net_crossed(to_levels(asks, rate), to_levels(bids, rate))
+
+
+def calculate_diff(order_book_for_sell: dict,
+                   order_book_for_buy: dict,
+                   diff_min: float,
+                   sell_qty_adjustment: float = 0,
+                   buy_qty_adjustment: float = 0) -> Optional[dict]:
+    """
+    same result as utils.calculate_diff for books holding (jpy, qty, price) arrays.
+
+    utils.calculate_diff advances the side with the smaller cumulative qty, so the order in which
+    levels are taken is the merge of both cumulative qty arrays, and the diff only shrinks along it.
+    the taken levels are therefore exactly the ones whose diff against the other side is >= diff_min.
+    a qty adjustment is subtracted again on every step of that walk, which depends on the path taken,
+    so books with an adjustment are walked by utils.calculate_diff itself.
+    """
+    if 'bids' not in order_book_for_sell:
+        raise Exception('{}'.format(order_book_for_sell))
+    if 'asks' not in order_book_for_buy:
+        raise Exception('{}'.format(order_book_for_buy))
+    sells = np.asarray(order_book_for_sell['bids'], dtype=np.float64)
+    buys = np.asarray(order_book_for_buy['asks'], dtype=np.float64)
+    if not len(sells) or not len(buys):
+        return None
+    if sell_qty_adjustment or buy_qty_adjustment:
+        return utils.calculate_diff(dict(bids=to_list(sells)), dict(asks=to_list(buys)), diff_min,
+                                    sell_qty_adjustment, buy_qty_adjustment)
+
+    sell_jpy = sells[:, JPY]
+    buy_jpy = buys[:, JPY]
+    sell_cum = np.cumsum(sells[:, QTY])
+    buy_cum = np.cumsum(buys[:, QTY])
+    n_sell = len(sells)
+    n_buy = len(buys)
+
+    # taking sell level k happens at sell_cum[k - 1], buy level k at buy_cum[k - 1]; on a tie buy goes first.
+    # k == n is the exhausted side, which stops the walk.
+    buy_i = np.searchsorted(buy_cum, sell_cum, 'right')
+    sell_i = np.searchsorted(sell_cum, buy_cum, 'left')
+    sell_diffs = np.full(n_sell, -math.inf)
+    buy_diffs = np.full(n_buy, -math.inf)
+    valid = (buy_i[:-1] < n_buy)
+    sell_diffs[:-1][valid] = sell_jpy[1:][valid] - buy_jpy[buy_i[:-1][valid]]
+    valid = (sell_i[:-1] < n_sell)
+    buy_diffs[:-1][valid] = sell_jpy[sell_i[:-1][valid]] - buy_jpy[1:][valid]
+
+    i = int(np.count_nonzero(sell_diffs >= diff_min))
+    j = int(np.count_nonzero(buy_diffs >= diff_min))
+    sell_jpy, buy_jpy = float(sell_jpy[i]), float(buy_jpy[j])
+    if math.isnan(sell_jpy) or math.isnan(buy_jpy):
+        return None
+    return dict(sell_jpy=sell_jpy,
+                sell_price=float(sells[i, PRICE]),
+                buy_jpy=buy_jpy,
+                buy_price=float(buys[j, PRICE]),
+                qty=float(min(sell_cum[i], buy_cum[j])),
+                diff=sell_jpy - buy_jpy,
+                diff_rate=(sell_jpy - buy_jpy) / buy_jpy)
@@ -0,0 +1,73 @@
+import threading
+from collections.abc import Mapping
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+Key = Tuple[str, Hashable]  # (exchange, instrument)
+
+
+class Snapshot(Mapping):
+    """
+    immutable {(exchange, instrument): converted order book} as of one version of the store.
+    the books are shared with every reader and must not be modified; the age of a book is its own received_at.
+    """
+    __slots__ = ('version', '_books', '_versions')
+
+    def __init__(self, books: Dict[Key, dict], versions: Dict[Key, int], version: int):
+        self.version = version
+        self._books = books
+        self._versions = versions
+
+    def __getitem__(self, key: Key) -> dict:
+        return self._books[key]
+
+    def __iter__(self):
+        return iter(self._books)
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def version_of(self, key: Key) -> int:
+        """version of the store that published the book of key, 0 if never"""
+        return self._versions.get(key, 0)
+
+
+class BookStore:
+    """
+    one store of converted order books shared by every agent.
+    a publish copies the small key map and swaps in a new Snapshot, so snapshot() is a single reference read
+    and a reader sees every venue as of the same version however the feed threads interleave.
+    a book carrying a version is dropped if the stored book of its key is as new, so a feed thread and the fx
+    thread converting the same book never make the store go back.
+    """
+
+    def __init__(self):
+        self._snapshot = Snapshot({}, {}, 0)
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def publish(self, key: Key, order_book: dict) -> Optional[Snapshot]:
+        """the new snapshot, None if the book was dropped"""
+        version = order_book.get('version')
+        with self._lock:
+            current = self._snapshot
+            stored = current._books.get(key)
+            if version is not None and stored is not None and (stored.get('version') or 0) >= version:
+                return None
+            version = current.version + 1
+            books = current._books.copy()
+            books[key] = order_book
+            versions = current._versions.copy()
+            versions[key] = version
+            self._snapshot = Snapshot(books, versions, version)
+            return self._snapshot
+
+    def is_stale(self, snapshot: Snapshot, keys: Iterable[Key] = None) -> bool:
+        """a book (only of keys if given) was published after snapshot"""
+        current = self._snapshot
+        if current.version == snapshot.version:
+            return False
+        if keys is None:
+            keys = current
+        return any(current.version_of(key) != snapshot.version_of(key) for key in keys)
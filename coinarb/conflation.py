@@ -0,0 +1,69 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+Key = Tuple[str, Hashable]  # (exchange, instrument)
+
+
+class Conflator:
+    """
+    latest-wins slots keyed by (exchange, instrument) with a monotonic sequence number per update.
+    at most one evaluation per group (the instrument by default) is pending; it takes every slot that
+    changed since the previous evaluation, so a burst of updates is evaluated once on the freshest data.
+    """
+
+    def __init__(self, group_of: Callable[[Key], Hashable] = lambda key: key[1]):
+        self._group_of = group_of
+        self._seq = 0
+        self._slots = {}  # type: Dict[Key, Tuple[int, Any]]
+        self._changed = {}  # type: Dict[Hashable, Dict[Key, Tuple[int, Any]]]
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.conflated = 0
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def update(self, key: Key, data: Any) -> Optional[int]:
+        """the sequence number if an evaluation of the group has to be scheduled, None if one is pending"""
+        group = self._group_of(key)
+        with self._lock:
+            self._seq += 1
+            self.updates += 1
+            entry = (self._seq, data)
+            self._slots[key] = entry
+            changed = self._changed.setdefault(group, {})
+            if key in changed:
+                self.conflated += 1
+            changed[key] = entry
+            if group in self._pending:
+                return None
+            self._pending.add(group)
+            return self._seq
+
+    def get(self, key: Key) -> Optional[Tuple[int, Any]]:
+        return self._slots.get(key)
+
+    def take(self, group: Hashable) -> Tuple[int, Dict[Key, Any]]:
+        """(latest sequence number, {key: data} changed since the last take) and clears the pending evaluation"""
+        with self._lock:
+            self._pending.discard(group)
+            changed = self._changed.pop(group, {})
+            return self._seq, {key: data for key, (_, data) in changed.items()}
+
+    def release(self, group: Hashable):
+        """
+        clears the pending evaluation of an expired task but keeps the changed slots,
+        the evaluation scheduled by the next update takes them too
+        """
+        with self._lock:
+            self._pending.discard(group)
+
+    def is_stale(self, group: Hashable, seq: int, keys: Iterable[Key] = None) -> bool:
+        """an update of the group (only of keys if given) arrived after seq"""
+        with self._lock:
+            changed = self._changed.get(group, {})
+            if keys is not None:
+                changed = {key: changed[key] for key in keys if key in changed}
+            return any(s > seq for s, _ in changed.values())
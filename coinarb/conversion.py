@@ -0,0 +1,93 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+class ConversionGraph:
+    """
+    currencies as nodes, fx and crypto mid rates as edges, and a table of every reachable currency
+    to the base currency along the shortest path. an edge update only recomputes the currencies
+    below it in the path tree, so looking up a conversion is a single dict read.
+    """
+
+    def __init__(self, base: str = 'JPY', *, max_age: float = 30, clock: Callable[[], float] = time.time):
+        self.base = base
+        self.max_age = max_age
+        self.clock = clock
+        self._edges = defaultdict(dict)  # type: Dict[str, Dict[str, Tuple[float, float]]]
+        self._table = {base: (1.0, math.inf)}  # type: Dict[str, Tuple[float, float]]
+        self._parents = {}  # type: Dict[str, str]
+        self._children = defaultdict(set)  # type: Dict[str, Set[str]]
+        self._lock = threading.Lock()
+
+    def update(self, instrument: str, rate: float, timestamp: float) -> Set[str]:
+        """1 A = rate B of instrument 'A_B'; returns the currencies whose conversion changed"""
+        a, b = instrument.split('_')
+        if not rate or rate <= 0:
+            return set()
+        with self._lock:
+            is_new = b not in self._edges[a]
+            self._edges[a][b] = (rate, timestamp)
+            self._edges[b][a] = (1 / rate, timestamp)
+            if is_new:
+                return self._rebuild()
+            if self._parents.get(a) == b:
+                return self._propagate(a)
+            if self._parents.get(b) == a:
+                return self._propagate(b)
+            return set()
+
+    def _entry(self, currency: str) -> Tuple[float, float]:
+        parent = self._parents[currency]
+        rate, timestamp = self._edges[currency][parent]
+        parent_rate, parent_timestamp = self._table[parent]
+        return parent_rate * rate, min(parent_timestamp, timestamp)
+
+    def _rebuild(self) -> Set[str]:
+        parents = {}
+        q = deque([self.base])
+        seen = {self.base}
+        while q:
+            currency = q.popleft()
+            for neighbor in self._edges[currency]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    parents[neighbor] = currency
+                    q.append(neighbor)
+        self._parents = parents
+        self._children = defaultdict(set)
+        for child, parent in parents.items():
+            self._children[parent].add(child)
+        old = self._table
+        table = {self.base: old[self.base]}
+        self._table = table
+        q = deque(self._children[self.base])
+        while q:
+            currency = q.popleft()
+            table[currency] = self._entry(currency)
+            q.extend(self._children[currency])
+        return {currency for currency in old.keys() | table.keys() if old.get(currency) != table.get(currency)}
+
+    def _propagate(self, currency: str) -> Set[str]:
+        changed = set()
+        stack = [currency]
+        while stack:
+            currency = stack.pop()
+            entry = self._entry(currency)
+            if entry != self._table.get(currency):
+                self._table[currency] = entry
+                changed.add(currency)
+            stack.extend(self._children[currency])
+        return changed
+
+    def get_rate(self, currency: str) -> Optional[float]:
+        """1 currency in the base currency, None if unreachable or an edge on the path is older than max_age"""
+        entry = self._table.get(currency)
+        if entry is None:
+            return None
+        rate, timestamp = entry
+        if timestamp < self.clock() - self.max_age:
+            return None
+        return rate
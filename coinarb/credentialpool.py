@@ -1,25 +1,157 @@
 import contextlib
 import logging
-from queue import Queue
-from typing import Iterable
+import threading
+import time
+from typing import Iterable, Callable, Any, List, Optional
 
 from coinlib.utils.mixins import LoggerMixin
 
 
+class _Slot:
+    def __init__(self, credential: dict):
+        self.credential = credential
+        self.client = None
+        self.last_used = 0.0
+
+
 class CredentialPool(LoggerMixin):
-    def __init__(self, credentials: Iterable[dict] = None, logger: logging.Logger = None):
-        self._q = Queue()
+    """
+    one long-lived client per credential, leased exclusively so nonces of a key stay ordered.
+    free slots are kept LIFO so a lease takes the most recently used (warm) client.
+    """
+
+    def __init__(self, credentials: Iterable[dict] = None, logger: logging.Logger = None, *,
+                 client_factory: Callable[[dict], Any] = None,
+                 health_check: Callable[[Any], None] = None,
+                 keep_alive_interval: float = 60):
+        self._free = []  # type: List[_Slot]  # most recently used last
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self._slots = []  # type: List[_Slot]
         self._logger = self._make_logger(logger)
+        self._client_factory = client_factory
+        self._health_check = health_check
+        self.keep_alive_interval = keep_alive_interval
+        self._timer = None  # type: threading.Timer
         self.add_credentials(credentials or [])
 
     def add_credentials(self, credentials: Iterable[dict]):
         for credential in credentials:
-            self._q.put(credential)
+            slot = _Slot(credential)
+            self._slots.append(slot)
+            self._release(slot)
+
+    def _release(self, slot: _Slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify()
 
     @contextlib.contextmanager
-    def get(self) -> dict:
-        credential = self._q.get()
+    def _lease_slot(self) -> _Slot:
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._free:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            slot = self._free.pop()
         try:
-            yield credential
+            yield slot
         finally:
-            self._q.put(credential)
+            self._release(slot)
+
+    @contextlib.contextmanager
+    def get(self) -> dict:
+        with self._lease_slot() as slot:
+            yield slot.credential
+
+    def _connect(self, slot: _Slot):
+        self._disconnect(slot)
+        slot.client = self._client_factory(slot.credential)
+        slot.last_used = time.time()
+
+    def _disconnect(self, slot: _Slot):
+        client, slot.client = slot.client, None
+        if client is not None and hasattr(client, 'close'):
+            try:
+                client.close()
+            except Exception as e:
+                self.logger.warning('close failed {!r}'.format(e))
+
+    @contextlib.contextmanager
+    def lease(self):
+        """yield the client of a free credential. a connection error drops the client, the next lease reconnects"""
+        assert self._client_factory, 'no client_factory'
+        with self._lease_slot() as slot:
+            if slot.client is None:
+                self._connect(slot)
+            try:
+                yield slot.client
+            except OSError:
+                self._disconnect(slot)
+                raise
+            finally:
+                slot.last_used = time.time()
+
+    def _take_idle(self, idle_before: float) -> Optional[_Slot]:
+        """
+        the least recently used idle client, unless a lease could need it: never while a lease waits, and
+        never the last free slot, a lease would then wait on the network call of its health check
+        """
+        with self._cond:
+            if self._waiting or len(self._free) < 2:
+                return None
+            for slot in self._free:
+                if slot.client is not None and slot.last_used < idle_before:
+                    self._free.remove(slot)
+                    return slot
+            return None
+
+    def keep_alive(self):
+        """
+        health check clients idle longer than keep_alive_interval, one at a time, and reconnect the failed ones.
+        a client that is never checked because it is the only one free is reconnected by lease on a failure
+        """
+        idle_before = time.time() - self.keep_alive_interval
+        while True:
+            slot = self._take_idle(idle_before)
+            if slot is None:
+                return
+            try:
+                if self._health_check:
+                    self._health_check(slot.client)
+                slot.last_used = time.time()
+            except Exception as e:
+                self.logger.warning('health check failed, reconnect {!r}'.format(e))
+                try:
+                    self._connect(slot)
+                except Exception as e:
+                    self.logger.exception(e)
+                    self._disconnect(slot)
+            finally:
+                self._release(slot)
+
+    def start_keep_alive(self):
+        def run():
+            try:
+                self.keep_alive()
+            except Exception as e:
+                self.logger.exception(e)
+            finally:
+                if self._timer:
+                    self.start_keep_alive()
+
+        self._timer = threading.Timer(self.keep_alive_interval, run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_keep_alive(self):
+        timer, self._timer = self._timer, None
+        if timer:
+            timer.cancel()
+
+    def close(self):
+        self.stop_keep_alive()
+        for slot in self._slots:
+            self._disconnect(slot)
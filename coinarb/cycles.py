@@ -0,0 +1,169 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+Level = Tuple[float, float, float]  # (jpy, qty, price)
+EdgeKey = Tuple[str, str, str]  # (exchange, instrument, side)
+
+
+class Edge:
+    """
+    one side of a book as a conversion: SELL turns the base currency into the quote currency on the bids,
+    BUY turns the quote currency into the base currency on the asks.
+    """
+    __slots__ = ('exchange', 'instrument', 'side', 'source', 'target', 'levels', 'rate')
+
+    def __init__(self, exchange: str, instrument: str, side: str, levels: List[Level]):
+        base, quote = instrument.split('_')
+        self.exchange = exchange
+        self.instrument = instrument
+        self.side = side
+        self.source, self.target = (base, quote) if side == 'SELL' else (quote, base)
+        self.levels = levels
+        price = levels[0][2]
+        self.rate = price if side == 'SELL' else 1 / price
+
+    @property
+    def key(self) -> EdgeKey:
+        return self.exchange, self.instrument, self.side
+
+    def capacity(self) -> float:
+        """the most of the source currency the levels take"""
+        if self.side == 'SELL':
+            return sum(qty for _, qty, _ in self.levels)
+        return sum(qty * price for _, qty, price in self.levels)
+
+    def convert(self, amount: float) -> Optional[Tuple[float, float, float]]:
+        """(amount of the target currency, order qty, worst price) or None if the levels are too thin"""
+        remaining = amount
+        output = 0.0
+        price = self.levels[0][2]
+        for _, qty, price in self.levels:
+            if self.side == 'SELL':
+                take = min(remaining, qty)
+                output += take * price
+            else:
+                take = min(remaining, qty * price)
+                output += take / price
+            remaining -= take
+            if remaining <= amount * 1e-12:
+                return output, amount if self.side == 'SELL' else output, price
+        return None
+
+
+class CycleDetector:
+    """
+    cycles of conversions across instruments and venues whose top of book rates multiply to more than
+    1 + profit_min. an update of one book only searches the cycles through its two edges, and a profitable
+    cycle is sized on the book depth by bisecting the start amount until the deepest level touched stops paying.
+    """
+    SIZE_STEPS = 30
+
+    def __init__(self, profit_min: float = 0.0, *, min_length: int = 3, max_length: int = 3, base: str = 'JPY',
+                 amount_max: Dict[str, float] = None):
+        self.profit_min = profit_min
+        self.min_length = min_length
+        self.max_length = max_length
+        self.base = base
+        self.amount_max = amount_max or {}
+        self._edges = defaultdict(dict)  # type: Dict[str, Dict[EdgeKey, Edge]]
+
+    def _set_edge(self, exchange: str, instrument: str, side: str, levels: List[Level]) -> Optional[Edge]:
+        base, quote = instrument.split('_')
+        source = base if side == 'SELL' else quote
+        key = (exchange, instrument, side)
+        if not levels:
+            self._edges[source].pop(key, None)
+            return None
+        edge = self._edges[source][key] = Edge(exchange, instrument, side, levels)
+        return edge
+
+    def remove(self, exchange: str, instrument: str):
+        self._set_edge(exchange, instrument, 'SELL', [])
+        self._set_edge(exchange, instrument, 'BUY', [])
+
+    def update(self, exchange: str, order_book: dict) -> List[dict]:
+        """replace the book and return the profitable cycles through it, best first"""
+        instrument = order_book['instrument']
+        changed = [self._set_edge(exchange, instrument, 'SELL', order_book.get('bids')),
+                   self._set_edge(exchange, instrument, 'BUY', order_book.get('asks'))]
+        opportunities = {}
+        for edge in changed:
+            if edge is None:
+                continue
+            for cycle in self._cycles_through(edge):
+                cycle = self._rotate(cycle)
+                key = tuple(e.key for e in cycle)
+                if key in opportunities:
+                    continue
+                opportunity = self.evaluate(cycle)
+                if opportunity:
+                    opportunities[key] = opportunity
+        return sorted(opportunities.values(), key=lambda x: -x['profit_rate'])
+
+    def _cycles_through(self, edge: Edge) -> List[List[Edge]]:
+        """simple cycles starting with edge, found by a depth first search back to its source"""
+        cycles = []
+        stack = [(edge.target, [edge], {edge.source, edge.target})]
+        while stack:
+            currency, path, seen = stack.pop()
+            for e in self._edges[currency].values():
+                if e.target == edge.source:
+                    if len(path) + 1 >= self.min_length:
+                        cycles.append(path + [e])
+                elif e.target not in seen and len(path) + 1 < self.max_length:
+                    stack.append((e.target, path + [e], seen | {e.target}))
+        return cycles
+
+    def _rotate(self, cycle: List[Edge]) -> List[Edge]:
+        """start at the base currency if the cycle passes it, so the same cycle is always the same list"""
+        sources = [e.source for e in cycle]
+        i = sources.index(self.base) if self.base in sources else sources.index(min(sources))
+        return cycle[i:] + cycle[:i]
+
+    def _simulate(self, cycle: List[Edge], amount: float) -> Optional[List[dict]]:
+        legs = []
+        for e in cycle:
+            converted = e.convert(amount)
+            if converted is None:
+                return None
+            output, qty, price = converted
+            legs.append(dict(exchange=e.exchange, instrument=e.instrument, side=e.side, source=e.source,
+                             target=e.target, amount_in=amount, amount_out=output, qty=qty, price=price))
+            amount = output
+        return legs
+
+    def _simulate_profitable(self, cycle: List[Edge], amount: float) -> Optional[List[dict]]:
+        """the legs of amount if the last unit of it still earns profit_min at the worst levels touched"""
+        legs = self._simulate(cycle, amount)
+        if not legs:
+            return None
+        marginal_rate = math.prod(leg['price'] if leg['side'] == 'SELL' else 1 / leg['price'] for leg in legs)
+        if marginal_rate <= 1 + self.profit_min:
+            return None
+        return legs
+
+    def evaluate(self, cycle: List[Edge]) -> Optional[dict]:
+        rate = math.prod(e.rate for e in cycle)
+        if rate <= 1 + self.profit_min:
+            return None
+        currency = cycle[0].source
+        high = min(cycle[0].capacity(), self.amount_max.get(currency, math.inf))
+        best = self._simulate_profitable(cycle, high)
+        if not best:
+            # the marginal rate only gets worse with the amount, so bisect the largest amount it still pays
+            low = 0.0
+            for _ in range(self.SIZE_STEPS):
+                amount = (low + high) / 2
+                legs = self._simulate_profitable(cycle, amount)
+                if legs:
+                    best = legs
+                    low = amount
+                else:
+                    high = amount
+        if not best:
+            return None
+        amount = best[0]['amount_in']
+        output = best[-1]['amount_out']
+        return dict(currency=currency, amount=amount, output=output, profit=output - amount,
+                    profit_rate=output / amount - 1, top_rate=rate, legs=best)
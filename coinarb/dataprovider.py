@@ -1,17 +1,26 @@
+import asyncio
 import functools
 import time
 from collections import defaultdict
-from typing import List, Tuple, Any, Hashable
+from typing import List, Tuple, Any, Hashable, Dict, Optional, Iterable
 
 import coinlib
 from coinlib.utils.mixins import LoggerMixin, ThreadMixin
 
-from . import utils
+from . import latency
+from .arbconfig import CONFIG
+from .bookstore import BookStore
+from .conversion import ConversionGraph
 from .fxprovider import FxProvider
+from .instrumentspec import compile_specs
+from .opportunitycache import OpportunityCache
+from .orderbook import OrderBook
+from .subscribers import QueuedSubscriber, Subscriber
 
 
 class DataProvider(LoggerMixin, ThreadMixin):
-    def __init__(self, order_books: List[Tuple[str, str]] = None, *, fx_provider: FxProvider):
+    def __init__(self, order_books: List[Tuple[str, str]] = None, *, fx_provider: FxProvider,
+                 subscriber_queue_size: int = 0):
         order_book_subscriptions = defaultdict(list)
         for exchange, instrument in order_books:
             order_book_subscriptions[exchange].append(instrument)
@@ -19,11 +28,25 @@ class DataProvider(LoggerMixin, ThreadMixin):
         self.clients = {}
         for exchange in self._order_book_subscriptions:
             self.clients[exchange] = getattr(coinlib, exchange).StreamClient()
-        self._callbacks = set()
+        self._callbacks = []  # type: List[Subscriber]
+        self._raw_callbacks = []
+        self.subscriber_queue_size = subscriber_queue_size
+        self.dispatched = 0
         self._logger = self._make_logger()
         self._thread_data = self._make_thread_data()
 
-        self._fx_rates = {}
+        self._books = {}  # type: Dict[Tuple[str, str], OrderBook]
+        self._books_by_quote = defaultdict(list)  # type: Dict[str, List[Tuple[str, OrderBook]]]
+        # currencies some book is quoted in, only crypto mids of these are conversion edges
+        self._quotes = {instrument.split('_')[1] for _, instrument in order_books}
+        self._specs = compile_specs(CONFIG)
+        self.clock = time.time
+        self.book_store = BookStore()
+        # evaluations of pairs of this provider's book versions, shared by its agents
+        self.opportunity_cache = OpportunityCache()
+        self.conversion = ConversionGraph(max_age=30, clock=lambda: self.clock())
+        self._loop = None  # type: asyncio.AbstractEventLoop
+        self._stopped = None  # type: asyncio.Event
         fx_provider.register_callback(self.on_fx_data)
 
     def start(self, *_, **__):
@@ -34,6 +57,9 @@ class DataProvider(LoggerMixin, ThreadMixin):
         super().stop()
         for client in self.clients.values():
             client.close()
+        self.stop_subscribers()
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stopped.set)
 
     def _subscribe_all(self):
         for exchange, instruments in self._order_book_subscriptions.items():
@@ -43,40 +69,89 @@ class DataProvider(LoggerMixin, ThreadMixin):
             on_data = functools.partial(self.on_order_book, exchange)
             client.subscribe(*subscriptions, on_data=on_data)
 
-    def adjust_order_book(self, order_book: dict):
-        converted_order_book = order_book.copy()
-        instrument = order_book['instrument']
+    def get_rate(self, instrument: str) -> Optional[float]:
         try:
-            if instrument.endswith('_JPY'):
-                rate = 1
-            elif instrument.endswith('_USD'):
-                data = self._fx_rates['USD_JPY']
-                if data['timestamp'] < time.time() - 30:
-                    return None
-                rate = data['mid']
-            else:
-                raise IndexError('not supported currency {}'.format(instrument))
+            return self.conversion.get_rate(instrument.split('_')[1])
         except IndexError:
             return None
 
-        asks, bids = utils.adjust_asks_bids(order_book['asks'], order_book['bids'], rate)
-        converted_order_book['asks'] = asks
-        converted_order_book['bids'] = bids
-        return converted_order_book
+    def get_book(self, exchange: str, instrument: str) -> OrderBook:
+        book = self._books.get((exchange, instrument))
+        if book is None:
+            new = OrderBook(exchange, instrument, spec=self._specs.get((exchange, instrument)))
+            book = self._books.setdefault((exchange, instrument), new)
+            if book is new:
+                quote = instrument.split('_')[1]
+                self._quotes.add(quote)
+                self._books_by_quote[quote].append((exchange, book))
+        return book
+
+    def update_order_book(self, exchange: str, order_book: dict) -> Optional[dict]:
+        """
+        apply only the changed levels to the kept book and return the converted book with its version.
+        a message marked delta=True carries (price, qty) level updates as they are, qty 0 removes a level;
+        any other message is a full book and is diffed against the kept one.
+        """
+        instrument = order_book['instrument']
+        book = self.get_book(exchange, instrument)
+        book.apply(order_book)
+        self.update_conversion(instrument, book.mid())
+        rate = self.get_rate(instrument)
+        if rate is None:
+            return None
+        book.set_rate(rate)
+        return book.to_dict()
 
     def on_order_book(self, exchange: str, key: Tuple[str, Hashable], order_book: Any):
-        order_book = self.adjust_order_book(order_book)
-        if not order_book:
-            return
-        for callback in self._callbacks:
+        received_at = time.time()
+        for callback in self._raw_callbacks:
             try:
                 callback(exchange, key, order_book)
             except Exception as e:
                 self.logger.exception(e)
+        if order_book.get('timestamp'):
+            latency.recorder.record(latency.FEED, exchange, key[1], received_at - order_book['timestamp'])
+        order_book = self.update_order_book(exchange, order_book)
+        if not order_book:
+            return
+        order_book['received_at'] = received_at
+        self.dispatch_order_book(exchange, key, order_book)
+
+    def dispatch_order_book(self, exchange: str, key: Tuple[str, Hashable], order_book: dict):
+        if self.book_store.publish((exchange, key[1]), order_book) is None:
+            # the other thread converting this book already published a newer version
+            return
+        self.dispatched += 1
+        for subscriber in self._callbacks:
+            subscriber(exchange, key, order_book)
+
+    def update_conversion(self, instrument: str, mid: Optional[float]):
+        """the mid of a crypto book is an edge of the conversion graph too, if some book is quoted in its base"""
+        if mid is None or instrument.split('_')[0] not in self._quotes:
+            return
+        changed = self.conversion.update(instrument, mid, self.clock())
+        if changed:
+            self.reconvert_order_books(changed)
 
     def on_fx_data(self, exchange: str, key: Tuple[str, Hashable], data: dict):
         _, _ = exchange, key
-        self._fx_rates[data['instrument']] = data
+        changed = self.conversion.update(data['instrument'], data['mid'], data['timestamp'])
+        if changed:
+            self.reconvert_order_books(changed)
+
+    def reconvert_order_books(self, currencies: Iterable[str]):
+        """convert the books quoted in currencies again and dispatch them as updates"""
+        received_at = time.time()
+        for currency in set(currencies):
+            # a copy, a feed thread may add a book meanwhile
+            for exchange, book in list(self._books_by_quote.get(currency, ())):
+                rate = self.get_rate(book.instrument)
+                if rate is None or rate == book.rate:
+                    continue
+                book.set_rate(rate)
+                order_book = book.to_dict()
+                order_book['received_at'] = received_at
+                self.dispatch_order_book(exchange, ('order_book', book.instrument), order_book)
 
     def sleep(self, seconds: float):
         _ = self
@@ -87,5 +162,35 @@ class DataProvider(LoggerMixin, ThreadMixin):
         while self.is_active():
             self.sleep(0.1)
 
-    def register_callback(self, on_data):
-        self._callbacks.add(on_data)
+    async def run_async(self):
+        """feed callbacks run on the client threads, so there is nothing to poll; just wait for stop()"""
+        self._loop = asyncio.get_event_loop()
+        self._stopped = asyncio.Event()
+        self._subscribe_all()
+        self.activate()
+        await self._stopped.wait()
+
+    def register_callback(self, on_data, *, queue_size: int = None):
+        """
+        queue_size (subscriber_queue_size if None) bounds the queue of a subscriber called on its own thread,
+        0 calls it on the feed thread
+        """
+        if queue_size is None:
+            queue_size = self.subscriber_queue_size
+        if queue_size:
+            subscriber = QueuedSubscriber(on_data, self.logger, queue_size)
+            subscriber.start()
+        else:
+            subscriber = Subscriber(on_data, self.logger)
+        self._callbacks.append(subscriber)
+
+    def register_raw_callback(self, on_data):
+        """called on the feed thread with every book message as received, before it is applied or converted"""
+        self._raw_callbacks.append(on_data)
+
+    def stop_subscribers(self):
+        for subscriber in self._callbacks:
+            subscriber.stop()
+
+    def subscriber_stats(self) -> dict:
+        return {subscriber.name: subscriber.stats() for subscriber in self._callbacks}
@@ -0,0 +1,145 @@
+import bisect
+import math
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+Level = Tuple[float, float, float]  # (jpy, qty, price)
+
+
+class SideDepth:
+    """
+    cumulative qty and jpy notional of converted levels, best first.
+    built on first use, most published books are never sized
+    """
+    __slots__ = ('levels', '_jpys', '_cum_qty', '_cum_notional')
+
+    def __init__(self, levels: List[Level]):
+        self.levels = levels
+        self._jpys = None  # type: List[float]
+        self._cum_qty = None  # type: List[float]
+        self._cum_notional = None  # type: List[float]
+
+    def _build(self):
+        levels = self.levels
+        self._cum_qty = list(accumulate(qty for _, qty, _ in levels))
+        self._cum_notional = list(accumulate(jpy * qty for jpy, qty, _ in levels))
+        self._jpys = [jpy for jpy, _, _ in levels]
+
+    @property
+    def jpys(self) -> List[float]:
+        if self._jpys is None:
+            self._build()
+        return self._jpys
+
+    @property
+    def cum_qty(self) -> List[float]:
+        if self._jpys is None:
+            self._build()
+        return self._cum_qty
+
+    @property
+    def cum_notional(self) -> List[float]:
+        if self._jpys is None:
+            self._build()
+        return self._cum_notional
+
+    @property
+    def qty(self) -> float:
+        return self.cum_qty[-1] if self.cum_qty else 0
+
+    def level_of(self, qty: float) -> int:
+        """index of the level that fills the last unit of qty"""
+        return min(bisect.bisect_left(self.cum_qty, qty), len(self.levels) - 1)
+
+    def level_after(self, qty: float) -> int:
+        """index of the level that fills the next unit after qty"""
+        return bisect.bisect_right(self.cum_qty, qty)
+
+    def notional(self, qty: float) -> float:
+        i = self.level_of(qty)
+        filled_qty = self.cum_qty[i - 1] if i else 0
+        filled_notional = self.cum_notional[i - 1] if i else 0
+        return filled_notional + (qty - filled_qty) * self.levels[i][0]
+
+
+class DepthIndex:
+    __slots__ = ('asks', 'bids')
+
+    def __init__(self, asks: List[Level], bids: List[Level]):
+        self.asks = SideDepth(asks)
+        self.bids = SideDepth(bids)
+
+    @classmethod
+    def of_sides(cls, asks: SideDepth, bids: SideDepth) -> 'DepthIndex':
+        """an index sharing the depths of sides that did not change"""
+        index = cls.__new__(cls)
+        index.asks = asks
+        index.bids = bids
+        return index
+
+    @classmethod
+    def of(cls, order_book: dict) -> 'DepthIndex':
+        """the index published with the book, or a new one"""
+        index = order_book.get('depth')
+        if index is None:
+            index = cls(order_book['asks'], order_book['bids'])
+        return index
+
+
+def optimal_size(sell: SideDepth, buy: SideDepth, *, sell_fee: float = 0, buy_fee: float = 0,
+                 diff_min: float = 0, qty_max: float = math.inf) -> Optional[dict]:
+    """
+    the qty that maximizes the profit of selling on the bids of sell and buying on the asks of buy after fees:
+    the last unit still earns diff_min jpy, as marginal sell values only fall and marginal buy costs only rise.
+    the sell level is found by a binary search over the start of each level, the buy level inside it by another.
+    keys of calculate_diff plus the average prices, fees and profit.
+    """
+    if not sell.levels or not buy.levels:
+        return None
+    qty_max = min(sell.qty, buy.qty, qty_max)
+    sell_keep = 1 - sell_fee
+    buy_keep = 1 + buy_fee
+
+    def pays(i: int) -> bool:
+        qty = sell.cum_qty[i - 1] if i else 0
+        if qty >= qty_max:
+            return False
+        j = buy.level_after(qty)
+        return sell.jpys[i] * sell_keep - buy.jpys[j] * buy_keep >= diff_min
+
+    if not pays(0):
+        return None
+    lo, hi = 0, len(sell.levels) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if pays(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    # buy levels still paying against the value of sell level lo
+    k = bisect.bisect_right(buy.jpys, (sell.jpys[lo] * sell_keep - diff_min) / buy_keep)
+    qty = min(sell.cum_qty[lo], buy.cum_qty[k - 1], qty_max)
+
+    sell_level = sell.levels[sell.level_of(qty)]
+    buy_level = buy.levels[buy.level_of(qty)]
+    sell_notional = sell.notional(qty)
+    buy_notional = buy.notional(qty)
+    fees = sell_notional * sell_fee + buy_notional * buy_fee
+    return dict(sell_jpy=sell_level[0],
+                sell_price=sell_level[2],
+                buy_jpy=buy_level[0],
+                buy_price=buy_level[2],
+                qty=qty,
+                diff=sell_level[0] - buy_level[0],
+                diff_rate=(sell_level[0] - buy_level[0]) / buy_level[0],
+                sell_average=sell_notional / qty,
+                buy_average=buy_notional / qty,
+                fees=fees,
+                profit=sell_notional - buy_notional - fees)
+
+
+def required_fund(side: str, qty: float, price: float, fee: float = 0) -> float:
+    """what a leg can spend at most: the qty it sells, or qty at its limit price plus the fee"""
+    if side == 'SELL':
+        return qty
+    return qty * price * (1 + fee)
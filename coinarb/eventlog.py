@@ -0,0 +1,106 @@
+import json
+import logging
+import threading
+import time
+from queue import Queue, Empty
+from typing import IO, Any, List, Optional, Tuple
+
+Record = Tuple[float, logging.Logger, int, str, dict]
+
+# keys of every JSON line; caller fields of the same name are written as data_<name>
+RESERVED = frozenset(('timestamp', 'logger', 'level', 'event'))
+
+
+def _copy(value: Any) -> Any:
+    """containers copied down to their leaves, so later changes of shared results do not reach the log"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy(v) for v in value]
+    return value
+
+
+class EventLog:
+    """
+    hot path logging: the caller only checks the level and queues (time, logger, level, event, fields)
+    with the containers of fields copied. a writer thread serializes batches, either as JSON lines to the
+    file given to open() or as 'event {json}' lines to the logger.
+    """
+    BATCH_SIZE = 256
+
+    def __init__(self):
+        self._q = Queue()
+        self._thread = None  # type: threading.Thread
+        self._thread_lock = threading.Lock()
+        self._file = None  # type: Optional[IO[str]]
+
+    def open(self, path: str):
+        self.close()
+        with self._thread_lock:
+            self._file = open(path, 'a')
+
+    def close(self):
+        """write everything queued so far and stop the writer"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread:
+                self._q.put(None)
+                thread.join()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def log(self, logger: logging.Logger, level: int, event: str, fields: dict, /):
+        if not logger.isEnabledFor(level):
+            return
+        fields = _copy(fields)
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='eventlog', daemon=True)
+                    self._thread.start()
+        self._q.put((time.time(), logger, level, event, fields))
+
+    def debug(self, logger: logging.Logger, event: str, /, **fields):
+        self.log(logger, logging.DEBUG, event, fields)
+
+    def info(self, logger: logging.Logger, event: str, /, **fields):
+        self.log(logger, logging.INFO, event, fields)
+
+    def warning(self, logger: logging.Logger, event: str, /, **fields):
+        self.log(logger, logging.WARNING, event, fields)
+
+    def error(self, logger: logging.Logger, event: str, /, **fields):
+        self.log(logger, logging.ERROR, event, fields)
+
+    def _run(self):
+        while True:
+            records = [self._q.get()]
+            while len(records) < self.BATCH_SIZE:
+                try:
+                    records.append(self._q.get_nowait())
+                except Empty:
+                    break
+            stop = None in records
+            try:
+                self._write([record for record in records if record is not None])
+            except Exception as e:
+                logging.getLogger(__name__).exception(e)
+            if stop:
+                return
+
+    def _write(self, records: List[Record]):
+        if self._file:
+            lines = []
+            for timestamp, logger, level, event, fields in records:
+                line = {('data_' + k if k in RESERVED else k): v for k, v in fields.items()}
+                line.update(timestamp=timestamp, logger=logger.name, level=logging.getLevelName(level), event=event)
+                lines.append(json.dumps(line, sort_keys=True, default=str))
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+        else:
+            for _, logger, level, event, fields in records:
+                logger.log(level, '{} {}'.format(event, json.dumps(fields, sort_keys=True, default=str)))
+
+
+eventlog = EventLog()
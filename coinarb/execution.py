@@ -0,0 +1,116 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .eventlog import eventlog
+from .fundmanager import Fund
+
+# same buffers as the sequential execution
+FUND_BUFFERS = dict(SELL=1.005, BUY=1.02)
+
+
+class OrderStateUnknown(Exception):
+    """an order was submitted but its final state could not be confirmed, order holds at least its id"""
+
+    def __init__(self, order: dict, message: str = None):
+        super().__init__(message or 'order state unknown order={}'.format(order))
+        self.order = order
+
+
+class ExecutionHalted(Exception):
+    pass
+
+
+class Leg(dict):
+    def __init__(self, agent, instrument: str, order_type: str, side: str, price: float, qty: float, fund: Fund):
+        super().__init__(exchange=agent.name, instrument=instrument, order_type=order_type, side=side,
+                         price=price, qty=qty)
+        self.agent = agent
+        self.fund = fund
+
+
+class TwoLegExecutor:
+    """
+    submits both legs of an arbitrage at the same time and hedges the difference of their fills afterwards.
+    only known fills are hedged: a leg that failed is queried by its order id, and if its fill still cannot
+    be known the executor alerts and halts until resume(), a hedge could fill the same qty twice.
+    """
+
+    def __init__(self, max_workers: int = 4, logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.halted = None  # type: Optional[dict]
+
+    def resume(self):
+        """after the positions of a halt were checked by hand"""
+        self.halted = None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _submit(leg: Leg) -> dict:
+        start = time.time()
+        execution = leg.agent.submit_order(leg['instrument'], leg['order_type'], leg['side'], leg['price'],
+                                           leg['qty'], condition='fak', fund=leg.fund)
+        return dict(exchange=leg['exchange'], side=leg['side'], qty=execution['qty'],
+                    price=execution.get('price_executed_average'), latency=time.time() - start)
+
+    def _failed(self, leg: Leg, error: Exception) -> dict:
+        """the result of a leg that raised, qty None if its fill is not known"""
+        result = dict(exchange=leg['exchange'], side=leg['side'], qty=None, price=None, latency=None,
+                      error=str(error))
+        if not isinstance(error, OrderStateUnknown):
+            # it may have failed after the order reached the venue, without an id there is nothing to query
+            return result
+        try:
+            order = leg.agent.get_order(error.order)
+        except Exception as e:
+            self.logger.exception(e)
+            return result
+        if order.get('state', 'ACTIVE') != 'ACTIVE':
+            result.update(qty=order['qty_executed'], price=order.get('price_executed_average'))
+        return result
+
+    def execute(self, legs: List[Leg]) -> dict:
+        assert len(legs) == 2, legs
+        if self.halted:
+            raise ExecutionHalted('execution halted by {}'.format(self.halted))
+        futures = [self._executor.submit(self._submit, leg) for leg in legs]
+        results = []
+        for leg, future in zip(legs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                self.logger.exception(e)
+                results.append(self._failed(leg, e))
+        if any(result['qty'] is None for result in results):
+            self.halted = dict(legs=results)
+            eventlog.error(self.logger, 'execution_unknown_fill', legs=results)
+            return dict(legs=results, hedge=None)
+        hedge = self.reconcile(legs, results)
+        report = dict(legs=results, hedge=hedge)
+        eventlog.info(self.logger, 'execution', **report)
+        return report
+
+    def reconcile(self, legs: List[Leg], results: List[dict]):
+        """market order on the venue of the leg filled less, for the difference of two known fills"""
+        short_i = 0 if results[0]['qty'] < results[1]['qty'] else 1
+        qty = results[1 - short_i]['qty'] - results[short_i]['qty']
+        if qty <= 0:
+            return None
+        leg = legs[short_i]
+        agent = leg.agent
+        qty = agent.round_qty(leg['instrument'], qty)
+        if qty <= 0:
+            return None
+        currency, quote = leg['instrument'].split('_')
+        fund_qty = qty if leg['side'] == 'SELL' else qty * results[1 - short_i]['price']
+        fund_currency = currency if leg['side'] == 'SELL' else quote
+        start = time.time()
+        with agent.fund_manager.reserve_fund(fund_currency, fund_qty * FUND_BUFFERS[leg['side']]) as fund:
+            execution = agent.submit_order(leg['instrument'], 'market', leg['side'], leg['price'], qty,
+                                           fund=fund)
+        return dict(exchange=leg['exchange'], side=leg['side'], qty=execution['qty'],
+                    price=execution.get('price_executed_average'), latency=time.time() - start)
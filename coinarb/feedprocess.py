@@ -0,0 +1,266 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from coinlib.utils.mixins import LoggerMixin, ThreadMixin
+
+from . import latency
+from .bookstore import BookStore
+from .dataprovider import DataProvider
+from .fxprovider import FxProvider
+from .opportunitycache import OpportunityCache
+from .shmbook import SharedBookStore
+
+
+class SharedBookPublisher:
+    """DataProvider and FxProvider callback writing into the store, setting updated after every book"""
+
+    def __init__(self, store: SharedBookStore, updated: multiprocessing.Event = None):
+        self.store = store
+        self.updated = updated
+
+    def on_data(self, exchange: str, key: Tuple[str, Hashable], order_book: dict):
+        self.store.write((exchange, key[1]), order_book)
+        if self.updated is not None:
+            self.updated.set()
+
+    def on_fx_data(self, exchange: str, key: Tuple[str, Hashable], data: dict):
+        _, _ = exchange, key
+        self.store.write_rate(data['instrument'], data['mid'], data['timestamp'])
+
+
+class SharedRateReader(LoggerMixin, ThreadMixin):
+    """FxProvider of a process that is not the fx worker: dispatches rates published in the store"""
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, store: SharedBookStore):
+        self.store = store
+        self._callbacks = set()
+        self._timestamps = {}  # type: Dict[str, float]
+        self._logger = self._make_logger()
+        self._thread_data = self._make_thread_data()
+
+    def register_callback(self, on_data):
+        self._callbacks.add(on_data)
+
+    def poll(self):
+        for instrument in self.store.rate_keys:
+            data = self.store.read_rate(instrument)
+            if not data or self._timestamps.get(instrument) == data['timestamp']:
+                continue
+            self._timestamps[instrument] = data['timestamp']
+            for callback in self._callbacks:
+                try:
+                    callback('oanda', ('tick', instrument), data)
+                except Exception as e:
+                    self.logger.exception(e)
+
+    def run(self):
+        self.activate()
+        while self.is_active():
+            self.poll()
+            time.sleep(self.POLL_INTERVAL)
+
+    async def run_async(self):
+        self.activate()
+        while self.is_active():
+            self.poll()
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+
+class SharedBookProvider(LoggerMixin, ThreadMixin):
+    """
+    DataProvider of the strategy process: polls the versions of the store and dispatches changed books
+    to the callbacks exactly like DataProvider does with the books it converts itself.
+    with updated it sleeps until a worker wrote a book instead of polling every POLL_INTERVAL.
+    dead_keys returns the books whose worker died; each is dispatched once as an empty stale book,
+    so no venue trades against a book that stopped updating.
+    """
+    POLL_INTERVAL = 0.0005
+    WAIT_TIMEOUT = 0.1
+    WATCHDOG_INTERVAL = 1.0
+
+    def __init__(self, store: SharedBookStore, *, updated: multiprocessing.Event = None,
+                 dead_keys: Callable[[], List[Tuple[str, Hashable]]] = None):
+        self.store = store
+        self.updated = updated
+        self.dead_keys = dead_keys
+        self._callbacks = set()
+        self._versions = {}  # type: Dict[Tuple[str, Hashable], int]
+        self._stale = set()
+        self._watched_at = 0.0
+        self.book_store = BookStore()
+        self.opportunity_cache = OpportunityCache()
+        self._logger = self._make_logger()
+        self._thread_data = self._make_thread_data()
+
+    def register_callback(self, on_data):
+        self._callbacks.add(on_data)
+
+    def _dispatch(self, key: Tuple[str, Hashable], order_book: dict):
+        if self.book_store.publish(key, order_book) is None:
+            return
+        exchange, instrument = key
+        for callback in self._callbacks:
+            try:
+                callback(exchange, ('order_book', instrument), order_book)
+            except Exception as e:
+                self.logger.exception(e)
+
+    def poll(self) -> int:
+        """number of changed books dispatched"""
+        if self.updated is not None:
+            # cleared before reading, a book written from now on sets it again
+            self.updated.clear()
+        n = 0
+        for key in self.store.keys:
+            if key in self._stale:
+                continue
+            order_book = self.store.read(key, self._versions.get(key))
+            if order_book is None:
+                continue
+            self._versions[key] = order_book['version']
+            n += 1
+            self._dispatch(key, order_book)
+        return n
+
+    def watch(self):
+        """dispatch an empty book, once, for every book of a dead worker"""
+        self._watched_at = time.time()
+        if self.dead_keys is None:
+            return
+        for key in self.dead_keys():
+            if key in self._stale:
+                continue
+            self._stale.add(key)
+            self.logger.error('feed worker of {} is dead, its book is stale'.format(key))
+            self._dispatch(key, dict(instrument=key[1], version=None, timestamp=0.0, received_at=0.0,
+                                     asks=[], bids=[], stale=True))
+
+    def _wait(self):
+        if self.updated is not None:
+            self.updated.wait(self.WAIT_TIMEOUT)
+        else:
+            time.sleep(self.POLL_INTERVAL)
+
+    def run(self):
+        self.activate()
+        while self.is_active():
+            if time.time() - self._watched_at >= self.WATCHDOG_INTERVAL:
+                self.watch()
+            if not self.poll():
+                self._wait()
+
+    async def run_async(self):
+        self.activate()
+        loop = asyncio.get_event_loop()
+        while self.is_active():
+            if time.time() - self._watched_at >= self.WATCHDOG_INTERVAL:
+                self.watch()
+            if not self.poll():
+                await loop.run_in_executor(None, self._wait)
+
+
+def _run_members(store: SharedBookStore, latency_log_interval: float, *members):
+    signal.signal(signal.SIGTERM, lambda *_: [member.stop() for member in members])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # the FEED histograms of this worker, FeedProcesses.dump_latency() forwards SIGUSR1 here
+    signal.signal(signal.SIGUSR1, lambda *_: latency.recorder.log())
+    if latency_log_interval:
+        latency.recorder.start_logging(latency_log_interval)
+    try:
+        for member in members:
+            member.start()
+        while all(member.is_active() for member in members):
+            time.sleep(0.5)
+    finally:
+        latency.recorder.stop_logging()
+        latency.recorder.log()
+        for member in reversed(members):
+            member.stop()
+        for member in reversed(members):
+            member.join()
+        store.close()
+
+
+def run_feed_worker(store_spec: dict, exchange: str, instruments: List[str], updated: multiprocessing.Event,
+                    latency_log_interval: float):
+    """process target: StreamClient of one exchange and the DataProvider conversion of its books"""
+    store = SharedBookStore(**store_spec)
+    rate_reader = SharedRateReader(store)
+    data_provider = DataProvider([(exchange, instrument) for instrument in instruments], fx_provider=rate_reader)
+    data_provider.register_callback(SharedBookPublisher(store, updated).on_data)
+    _run_members(store, latency_log_interval, rate_reader, data_provider)
+
+
+def run_fx_worker(store_spec: dict, instruments: List[str], fx_options: dict, latency_log_interval: float):
+    """process target: FxProvider publishing its rates"""
+    store = SharedBookStore(**store_spec)
+    fx_provider = FxProvider(instruments, **fx_options)
+    fx_provider.register_callback(SharedBookPublisher(store).on_fx_data)
+    _run_members(store, latency_log_interval, fx_provider)
+
+
+class FeedProcesses(LoggerMixin):
+    """
+    owns the shared store and one worker process per exchange plus one for fx.
+    the strategy process reads the store with SharedBookProvider and SharedRateReader.
+    the books of a dead worker are given by dead_keys(): those of its exchange, or those not quoted in JPY
+    for the fx worker. every worker logs its own latency histograms each latency_log_interval.
+    """
+
+    def __init__(self, order_books: List[Tuple[str, str]], fx_instruments: List[str], *, depth: int = 50,
+                 fx_options: dict = None, latency_log_interval: float = None):
+        self._logger = self._make_logger()
+        self.store = SharedBookStore(order_books, fx_instruments, depth=depth)
+        self.updated = multiprocessing.Event()
+        subscriptions = defaultdict(list)
+        for exchange, instrument in order_books:
+            subscriptions[exchange].append(instrument)
+        spec = self.store.spec()
+        fx_process = multiprocessing.Process(target=run_fx_worker,
+                                             args=(spec, list(fx_instruments), fx_options or {},
+                                                   latency_log_interval),
+                                             name='feed-fx', daemon=True)
+        self._processes = [fx_process]
+        self._keys = {fx_process: [(exchange, instrument) for exchange, instrument in order_books
+                                   if instrument.split('_')[1] != 'JPY']}  # type: Dict[multiprocessing.Process, list]
+        for exchange, instruments in subscriptions.items():
+            process = multiprocessing.Process(target=run_feed_worker,
+                                              args=(spec, exchange, instruments, self.updated, latency_log_interval),
+                                              name='feed-{}'.format(exchange), daemon=True)
+            self._processes.append(process)
+            self._keys[process] = [(exchange, instrument) for instrument in instruments]
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+            self.logger.info('started {} pid={}'.format(process.name, process.pid))
+
+    def is_alive(self) -> bool:
+        return all(process.is_alive() for process in self._processes)
+
+    def dead_keys(self) -> List[Tuple[str, str]]:
+        """books of the workers that were started and exited"""
+        return [key for process in self._processes if process.pid is not None and not process.is_alive()
+                for key in self._keys[process]]
+
+    def dump_latency(self):
+        """every worker logs its histograms"""
+        for process in self._processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGUSR1)
+
+    def stop(self, timeout: float = 5):
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            if process.pid is not None:
+                process.join(timeout)
+        self.store.close()
+        self.store.unlink()
@@ -2,9 +2,10 @@ import logging
 import math
 import threading
 from collections import defaultdict
-from typing import Callable, Set, Dict
+from typing import Callable, Set, Dict, List, Tuple
 
 from coinarb.arbconfig import CONFIG
+from coinarb.eventlog import eventlog
 
 
 class InsufficientFund(Exception):
@@ -68,6 +69,7 @@ class FundManager:
         self.balances = defaultdict(Balance)  # type: Dict[str, Balance]
         self._reserved_funds = set()  # type: Set[Fund]
         self._fund_lock = threading.RLock()
+        self._currency_locks = {}  # type: Dict[str, threading.RLock]
 
         for currency, v in self._funds_config.items():
             self.balances[currency].locked = v['locked']
@@ -75,12 +77,20 @@ class FundManager:
     def has(self, fund: Fund):
         return fund in self._reserved_funds
 
-    def get_lock(self) -> threading.RLock:
-        return self._fund_lock
+    def get_lock(self, currency: str = None) -> threading.RLock:
+        """the lock of currency, or of the whole manager without currency"""
+        if currency is None:
+            return self._fund_lock
+        lock = self._currency_locks.get(currency)
+        if lock is None:
+            with self._fund_lock:
+                _ = self.balances[currency]
+                lock = self._currency_locks.setdefault(currency, threading.RLock())
+        return lock
 
     def update_balances(self, balances: dict):
-        with self.get_lock():
-            for currency, balance in balances.items():
+        for currency, balance in balances.items():
+            with self.get_lock(currency):
                 self.balances[currency].total = balance['total']
                 used = balance['used']
                 if math.isnan(used):
@@ -90,41 +100,67 @@ class FundManager:
 
     def log_balance(self, currency: str):
         balance = self.balances[currency]
-        self.logger.info('balance {} total={} locked={} used={} reserved={} free={}'.format(
-            currency, balance.total, balance.locked, balance.used, balance.reserved, balance.free
-        ))
+        eventlog.info(self.logger, 'balance', currency=currency, total=balance.total, locked=balance.locked,
+                      used=balance.used, reserved=balance.reserved, free=balance.free)
+
+    def _reserve(self, currency: str, qty: float) -> Fund:
+        """with the lock of currency held"""
+        self.balances[currency].reserved += qty
+        fund = Fund(self, currency, qty, self.release_fund)
+        self._reserved_funds.add(fund)
+        eventlog.info(self.logger, 'reserved', currency=fund.currency, qty=fund.qty)
+        self.log_balance(currency)
+        return fund
 
     def reserve_fund(self, currency: str, qty: float) -> Fund:
-        with self.get_lock():
+        with self.get_lock(currency):
             free = self.balances[currency].free
             if free < qty:
                 raise InsufficientFund('currency={} qty={} > free={}'.format(currency, qty, free))
-            self.balances[currency].reserved += qty
-            fund = Fund(self, currency, qty, self.release_fund)
-            self._reserved_funds.add(fund)
-            self.logger.info('reserved {} {}'.format(fund.currency, fund.qty))
-            self.log_balance(currency)
-            return fund
+            return self._reserve(currency, qty)
 
     def release_fund(self, fund: Fund):
-        with self.get_lock():
+        with self.get_lock(fund.currency):
             if self.has(fund):
-                self._reserved_funds.difference_update([fund])
+                self._reserved_funds.discard(fund)
                 self.balances[fund.currency].reserved -= fund.qty
-                self.logger.info('released {} {}'.format(fund.currency, fund.qty))
+                eventlog.info(self.logger, 'released', currency=fund.currency, qty=fund.qty)
                 self.log_balance(fund.currency)
 
     def renew_fund(self, fund: Fund) -> Fund:
-        with self.get_lock():
+        with self.get_lock(fund.currency):
             assert self.has(fund), 'fund={} not in {}'.format(fund, self._reserved_funds)
-            self.logger.info('renew fund {} {}'.format(fund.currency, fund.qty))
+            eventlog.info(self.logger, 'renew_fund', currency=fund.currency, qty=fund.qty)
             fund.release()
             return self.reserve_fund(fund.currency, fund.qty)
 
     def apply_fund(self, fund: Fund):
-        with self.get_lock():
+        with self.get_lock(fund.currency):
             if self.has(fund):
-                self.logger.info('apply fund {} {}'.format(fund.currency, fund.qty))
+                eventlog.info(self.logger, 'apply_fund', currency=fund.currency, qty=fund.qty)
                 fund.release()
                 self.balances[fund.currency].total -= fund.qty
                 self.log_balance(fund.currency)
+
+
+def reserve_funds(requests: List[Tuple[FundManager, str, float]]) -> List[Fund]:
+    """reserve all of (fund_manager, currency, qty) or none of them"""
+    # a fixed lock order across managers avoids deadlocks between concurrent batches
+    keys = sorted({(fund_manager.exchange, currency, id(fund_manager)): fund_manager.get_lock(currency)
+                   for fund_manager, currency, _ in requests}.items(), key=lambda x: x[0])
+    locks = [lock for _, lock in keys]
+    for lock in locks:
+        lock.acquire()
+    try:
+        needed = defaultdict(float)
+        for fund_manager, currency, qty in requests:
+            needed[(fund_manager, currency)] += qty
+        for (fund_manager, currency), qty in needed.items():
+            free = fund_manager.balances[currency].free
+            if free < qty:
+                raise InsufficientFund('exchange={} currency={} qty={} > free={}'.format(
+                    fund_manager.exchange, currency, qty, free))
+        return [fund_manager._reserve(currency, qty) for fund_manager, currency, qty in requests]
+    finally:
+        for lock in reversed(locks):
+            lock.release()
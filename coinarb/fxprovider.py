@@ -1,16 +1,40 @@
+import asyncio
+import functools
 import time
 from typing import List
 
-import dateutil.parser
-import dateutil.parser
 import oandapy
 from coinlib.utils.config import Config
 from coinlib.utils.mixins import LoggerMixin, ThreadMixin
 
+from .isotime import parse_timestamp
+
+
+class _PriceStreamer(oandapy.Streamer):
+    def __init__(self, on_tick, on_error, **kwargs):
+        super().__init__(**kwargs)
+        self._on_tick = on_tick
+        self._on_error = on_error
+
+    def on_success(self, data: dict):
+        if 'tick' in data:
+            self._on_tick(data['tick'])
+
+    def on_error(self, data):
+        self._on_error(data)
+        self.disconnect()
+
 
 class FxProvider(LoggerMixin, ThreadMixin):
-    def __init__(self, instruments: List[str]):
+    POLL_INTERVAL = 10
+    STREAM_RECONNECT_INTERVAL = 1
+
+    def __init__(self, instruments: List[str], *, stream: bool = False, api_url: str = None):
+        """stream prices instead of polling them; api_url replaces the oanda hosts, e.g. with an FxStandIn"""
         self.instruments = frozenset(instruments)
+        self.stream = stream
+        self.api_url = api_url
+        self._streamer = None  # type: _PriceStreamer
         self._callbacks = set()
         self._logger = self._make_logger()
         self._thread_data = self._make_thread_data()
@@ -32,7 +56,7 @@ class FxProvider(LoggerMixin, ThreadMixin):
         }
         """
         price['mid'] = (price['ask'] + price['bid']) / 2
-        price['timestamp'] = dateutil.parser.parse(price['time']).timestamp()
+        price['timestamp'] = parse_timestamp(price['time'])
         self.dispatch_data(('tick', price['instrument']), price)
 
     def dispatch_data(self, key, data):
@@ -42,19 +66,75 @@ class FxProvider(LoggerMixin, ThreadMixin):
             except Exception as e:
                 self.logger.exception(e)
 
-    def run(self):
-        config = Config().load()
-        credential = config.get_credential('oanda', 'live')
-        oanda = oandapy.API(environment='live', access_token=credential['access_token'])
-        self.activate()
+    def _get_credential(self) -> dict:
+        _ = self
+        return Config().load().get_credential('oanda', 'live')
+
+    def _make_api(self) -> oandapy.API:
+        api = oandapy.API(environment='live', access_token=self._get_credential()['access_token'])
+        if self.api_url:
+            api.api_url = self.api_url
+        return api
+
+    def _make_streamer(self) -> _PriceStreamer:
+        streamer = _PriceStreamer(self.dispatch_price, lambda data: self.logger.error('stream error {}'.format(data)),
+                                  environment='live', access_token=self._get_credential()['access_token'])
+        if self.api_url:
+            streamer.api_url = self.api_url
+        return streamer
+
+    def stream_prices(self):
+        """dispatch every tick of the price stream until it disconnects"""
+        account_id = self._get_credential()['account_id']
+        self._streamer = self._make_streamer()
+        try:
+            self._streamer.rates(account_id, instruments=','.join(self.instruments))
+        finally:
+            self._streamer = None
+
+    def run_stream(self):
         while self.is_active():
             try:
-                res = oanda.get_prices(instruments=','.join(self.instruments))
-                for price in res['prices']:
-                    self.dispatch_price(price)
+                self.stream_prices()
             except Exception as e:
                 self.logger.exception(e)
-            for _ in range(100):
+            if self.is_active():
+                time.sleep(self.STREAM_RECONNECT_INTERVAL)
+
+    def stop(self):
+        super().stop()
+        streamer = self._streamer
+        if streamer:
+            streamer.disconnect()
+
+    def poll(self, oanda: oandapy.API):
+        try:
+            res = oanda.get_prices(instruments=','.join(self.instruments))
+            for price in res['prices']:
+                self.dispatch_price(price)
+        except Exception as e:
+            self.logger.exception(e)
+
+    def run(self):
+        self.activate()
+        if self.stream:
+            self.run_stream()
+            return
+        oanda = self._make_api()
+        while self.is_active():
+            self.poll(oanda)
+            for _ in range(int(self.POLL_INTERVAL / 0.1)):
                 time.sleep(0.1)
                 if not self.is_active():
                     break
+
+    async def run_async(self):
+        loop = asyncio.get_event_loop()
+        self.activate()
+        if self.stream:
+            await loop.run_in_executor(None, self.run_stream)
+            return
+        oanda = self._make_api()
+        while self.is_active():
+            await loop.run_in_executor(None, functools.partial(self.poll, oanda))
+            await asyncio.sleep(self.POLL_INTERVAL)
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .isotime import format_timestamp
+
+
+class FxStandIn:
+    """
+    local stand-in of the oanda v1 price endpoints for tests and dry runs.
+    GET /v1/prices answers like the rest api, with accountId it streams ticks (and heartbeats) like the stream api,
+    so FxProvider can point either mode at url.
+    """
+    HEARTBEAT_INTERVAL = 5
+
+    def __init__(self, prices: Dict[str, Tuple[float, float]], *, host: str = '127.0.0.1', port: int = 0,
+                 interval: float = 0.1):
+        self.interval = interval
+        self._prices = dict(prices)  # type: Dict[str, Tuple[float, float]]
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None  # type: threading.Thread
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def set_price(self, instrument: str, bid: float, ask: float):
+        with self._lock:
+            self._prices[instrument] = (bid, ask)
+
+    def get_prices(self, instruments: List[str]) -> List[dict]:
+        now = format_timestamp(time.time())
+        with self._lock:
+            return [dict(instrument=instrument, time=now, bid=self._prices[instrument][0],
+                         ask=self._prices[instrument][1])
+                    for instrument in instruments if instrument in self._prices]
+
+    def start(self) -> 'FxStandIn':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _stream(self, write, instruments: List[str]):
+        heartbeat_at = 0
+        while not self._stopped.is_set():
+            lines = [dict(tick=price) for price in self.get_prices(instruments)]
+            now = time.time()
+            if now - heartbeat_at >= self.HEARTBEAT_INTERVAL:
+                heartbeat_at = now
+                lines.append(dict(heartbeat=dict(time=format_timestamp(now))))
+            write(''.join(json.dumps(line) + '\r\n' for line in lines).encode())
+            self._stopped.wait(self.interval)
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path != '/v1/prices':
+                    self.send_error(404)
+                    return
+                instruments = ','.join(query.get('instruments', [])).split(',')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if 'accountId' not in query:
+                    body = json.dumps(dict(prices=stand_in.get_prices(instruments))).encode()
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                # the body of a stream ends with the connection
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                try:
+                    stand_in._stream(self._write, instruments)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _write(self, data: bytes):
+                self.wfile.write(data)
+                self.wfile.flush()
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
@@ -0,0 +1,99 @@
+import math
+from typing import Dict, Iterable, List, Tuple
+
+# relative slack against binary float error: 0.29 * 100 must truncate to 29 ticks, not 28
+_EPSILON = 1e-12
+# decimals of feed prices and quantities when the config does not give them, finer than any order precision
+FEED_PRECISION = 8
+
+
+def _truncate(value: float) -> int:
+    if value >= 0:
+        return math.floor(value * (1 + _EPSILON))
+    return -math.floor(-value * (1 + _EPSILON))
+
+
+class InstrumentSpec:
+    """
+    price and qty precisions of one (exchange, instrument) as integer tick and lot scales.
+    orders are truncated to ticks and lots; feed levels are only rounded to the feed's own, finer precision,
+    so a level smaller than a lot is kept and no price moves across the other side.
+    """
+    __slots__ = ('exchange', 'instrument', 'price_precision', 'qty_precision', 'price_scale', 'qty_scale',
+                 'tick', 'lot', 'feed_price_scale', 'feed_qty_scale')
+
+    def __init__(self, exchange: str, instrument: str, price_precision: int, qty_precision: int, *,
+                 feed_price_precision: int = None, feed_qty_precision: int = None):
+        self.exchange = exchange
+        self.instrument = instrument
+        self.price_precision = price_precision
+        self.qty_precision = qty_precision
+        self.price_scale = 10 ** price_precision
+        self.qty_scale = 10 ** qty_precision
+        self.tick = 1 / self.price_scale
+        self.lot = 1 / self.qty_scale
+        self.feed_price_scale = 10 ** max(price_precision, FEED_PRECISION if feed_price_precision is None
+                                          else feed_price_precision)
+        self.feed_qty_scale = 10 ** max(qty_precision, FEED_PRECISION if feed_qty_precision is None
+                                        else feed_qty_precision)
+
+    def to_ticks(self, price: float) -> int:
+        return _truncate(price * self.price_scale)
+
+    def from_ticks(self, ticks: int) -> float:
+        return ticks / self.price_scale
+
+    def to_lots(self, qty: float) -> int:
+        return _truncate(qty * self.qty_scale)
+
+    def from_lots(self, lots: int) -> float:
+        return lots / self.qty_scale
+
+    def to_feed_price(self, price: float) -> int:
+        return round(price * self.feed_price_scale)
+
+    def from_feed_price(self, key: int) -> float:
+        return key / self.feed_price_scale
+
+    def to_feed_qty(self, qty: float) -> int:
+        return round(qty * self.feed_qty_scale)
+
+    def from_feed_qty(self, key: int) -> float:
+        return key / self.feed_qty_scale
+
+    def to_feed_levels(self, levels: Iterable[Tuple[float, float]]) -> List[Tuple[int, int, float, float]]:
+        """(price key, qty key, price, qty) of every (price, qty), the same rounding as to_feed_price and to_feed_qty"""
+        price_scale = self.feed_price_scale
+        qty_scale = self.feed_qty_scale
+        keys = [(round(price * price_scale), round(qty * qty_scale)) for price, qty in levels]
+        return [(price_key, qty_key, price_key / price_scale, qty_key / qty_scale) for price_key, qty_key in keys]
+
+    def round_price(self, price: float) -> float:
+        return self.to_ticks(price) / self.price_scale
+
+    def inc_dec_price(self, price: float, inc_dec: int) -> float:
+        return (self.to_ticks(price) + inc_dec) / self.price_scale
+
+    def round_qty(self, qty: float) -> float:
+        return self.to_lots(qty) / self.qty_scale
+
+    def inc_dec_qty(self, qty: float, inc_dec: int) -> float:
+        return (self.to_lots(qty) + inc_dec) / self.qty_scale
+
+    def __repr__(self):
+        return 'InstrumentSpec({!r}, {!r}, {}, {})'.format(self.exchange, self.instrument, self.price_precision,
+                                                           self.qty_precision)
+
+
+def compile_specs(config: dict) -> Dict[Tuple[str, str], InstrumentSpec]:
+    """InstrumentSpec of every config[exchange]['precisions'] entry, feed_price and feed_qty are optional"""
+    specs = {}
+    for exchange, exchange_config in config.items():
+        if not isinstance(exchange_config, dict):
+            continue
+        for instrument, precisions in exchange_config.get('precisions', {}).items():
+            specs[(exchange, instrument)] = InstrumentSpec(exchange, instrument,
+                                                           precisions['price'], precisions['qty'],
+                                                           feed_price_precision=precisions.get('feed_price'),
+                                                           feed_qty_precision=precisions.get('feed_qty'))
+    return specs
@@ -0,0 +1,54 @@
+import datetime
+from typing import Dict
+
+_EPOCH = datetime.date(1970, 1, 1)
+_epoch_days = {}  # type: Dict[str, int]
+
+
+def _days(date: str) -> int:
+    """'YYYY-MM-DD' to days since the epoch, cached since every tick of a day repeats it"""
+    days = _epoch_days.get(date)
+    if days is None:
+        if date[4] != '-' or date[7] != '-':
+            raise ValueError(date)
+        days = (datetime.date(int(date[:4]), int(date[5:7]), int(date[8:10])) - _EPOCH).days
+        if len(_epoch_days) > 1024:
+            _epoch_days.clear()
+        _epoch_days[date] = days
+    return days
+
+
+def _parse_fixed(s: str) -> float:
+    if len(s) < 20 or s[10] != 'T' or s[13] != ':' or s[16] != ':':
+        raise ValueError(s)
+    if s[-1] == 'Z':
+        fraction = s[19:-1]
+    elif s.endswith('+00:00'):
+        fraction = s[19:-6]
+    else:
+        raise ValueError(s)
+    seconds = _days(s[:10]) * 86400 + int(s[11:13]) * 3600 + int(s[14:16]) * 60 + int(s[17:19])
+    if not fraction:
+        return float(seconds)
+    if fraction[0] != '.' or not fraction[1:].isdigit():
+        raise ValueError(s)
+    return seconds + int(fraction[1:]) / 10 ** (len(fraction) - 1)
+
+
+def parse_timestamp(s: str) -> float:
+    """
+    unix timestamp of an ISO-8601 time like oanda's '2013-09-16T18:59:03.687308Z'.
+    the UTC fixed format is sliced directly, anything else goes through datetime (naive means UTC).
+    """
+    try:
+        return _parse_fixed(s)
+    except (IndexError, ValueError):
+        pass
+    dt = datetime.datetime.fromisoformat(s.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def format_timestamp(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
@@ -0,0 +1,127 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# stages of tick-to-trade, each one measured from the previous timestamp
+FEED = 'feed'  # exchange timestamp -> DataProvider.on_order_book
+DISPATCH = 'dispatch'  # DataProvider.on_order_book -> Agent.put_task
+QUEUE = 'queue'  # Agent.put_task -> task start, by priority class instead of instrument
+DECISION = 'decision'  # task start -> signal decision
+SUBMIT = 'submit'  # signal decision -> order submit
+FILL = 'fill'  # order submit -> fill
+TICK_TO_TRADE = 'tick_to_trade'  # DataProvider.on_order_book -> order submit
+
+
+class Histogram:
+    """
+    HDR-style histogram of microseconds: buckets are exact below 2 ** SUB_BUCKET_BITS and keep
+    SUB_BUCKET_BITS significant bits above, so every recorded value is within 1% of its bucket.
+    """
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self.counts = defaultdict(int)  # type: Dict[int, int]
+        self.count = 0
+        self.total = 0
+        self.min = math.inf
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        shift = max(0, value.bit_length() - cls.SUB_BUCKET_BITS)
+        return (shift << cls.SUB_BUCKET_BITS) | (value >> shift)
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        shift = index >> cls.SUB_BUCKET_BITS
+        lowest = (index & ((1 << cls.SUB_BUCKET_BITS) - 1)) << shift
+        return lowest + ((1 << shift) >> 1)
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1e6))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """in seconds"""
+        if not self.count:
+            return math.nan
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def to_dict(self) -> dict:
+        if not self.count:
+            return dict(count=0)
+        return dict(count=self.count,
+                    min=self.min / 1e6,
+                    mean=self.total / self.count / 1e6,
+                    p50=self.percentile(50),
+                    p90=self.percentile(90),
+                    p99=self.percentile(99),
+                    p999=self.percentile(99.9),
+                    max=self.max / 1e6)
+
+
+class LatencyRecorder:
+    def __init__(self, logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.histograms = defaultdict(Histogram)  # type: Dict[Tuple[str, str, str], Histogram]
+        self._lock = threading.Lock()
+        self._timer = None  # type: threading.Timer
+        self._logging = False
+
+    def record(self, stage: str, exchange: str, instrument: str, seconds: float):
+        with self._lock:
+            self.histograms[(stage, exchange, instrument)].record(seconds)
+
+    def record_since(self, stage: str, exchange: str, instrument: str, since: float) -> float:
+        now = time.time()
+        if since:
+            self.record(stage, exchange, instrument, now - since)
+        return now
+
+    def dump(self, reset: bool = False) -> dict:
+        with self._lock:
+            histograms = self.histograms
+            if reset:
+                self.histograms = defaultdict(Histogram)
+            return {'{}|{}|{}'.format(*key): histogram.to_dict() for key, histogram in sorted(histograms.items())}
+
+    def log(self, reset: bool = False):
+        self.logger.info('latency={}'.format(json.dumps(self.dump(reset=reset), sort_keys=True)))
+
+    def start_logging(self, interval: float):
+        self._logging = True
+
+        def run():
+            if not self._logging:
+                return
+            try:
+                self.log(reset=True)
+            finally:
+                if self._logging:
+                    self.start_logging(interval)
+
+        self._timer = threading.Timer(interval, run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_logging(self):
+        self._logging = False
+        if self._timer:
+            self._timer.cancel()
+
+
+recorder = LatencyRecorder()
@@ -0,0 +1,97 @@
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from coinlib.utils.mixins import LoggerMixin
+
+from .dataprovider import DataProvider
+from .simclient import install
+from .simexchange import SimulatedExchange
+
+
+class FeedLoadGenerator(LoggerMixin):
+    """
+    pushes synthetic books of pairs into DataProvider.on_order_book at rate books per second,
+    one feed thread per exchange like the stream clients, and reports what the provider sustained.
+    """
+
+    def __init__(self, data_provider: DataProvider, pairs: List[Tuple[str, str]], rate: float, *,
+                 mids: Dict[str, float] = None, depth: int = 20, seed: int = None):
+        self._logger = self._make_logger()
+        self.data_provider = data_provider
+        self.pairs = list(pairs)
+        self.rate = rate
+        self.depth = depth
+        self._mids = {pair: (mids or {}).get(pair[1], 100.0) for pair in self.pairs}
+        self._random = random.Random(seed)
+
+    def make_order_book(self, exchange: str, instrument: str, r: random.Random) -> dict:
+        mid = self._mids[(exchange, instrument)] * math.exp(r.gauss(0, 0.0005))
+        self._mids[(exchange, instrument)] = mid
+        tick = mid * 1e-4
+        asks = [(mid + tick * (i + 1), r.uniform(1, 100)) for i in range(self.depth)]
+        bids = [(mid - tick * (i + 1), r.uniform(1, 100)) for i in range(self.depth)]
+        return dict(instrument=instrument, asks=asks, bids=bids, timestamp=time.time())
+
+    def _feed(self, pairs: List[Tuple[str, str]], rate: float, duration: float, seed: int, result: dict):
+        r = random.Random(seed)
+        interval = 1 / rate
+        start = time.perf_counter()
+        next_at = start
+        sent = 0
+        behind = 0.0
+        while True:
+            now = time.perf_counter()
+            if now - start >= duration:
+                break
+            if next_at > now:
+                time.sleep(next_at - now)
+            else:
+                behind = max(behind, now - next_at)
+            exchange, instrument = pairs[sent % len(pairs)]
+            order_book = self.make_order_book(exchange, instrument, r)
+            self.data_provider.on_order_book(exchange, ('order_book', instrument), order_book)
+            sent += 1
+            next_at += interval
+        result.update(sent=sent, elapsed=time.perf_counter() - start, behind=behind)
+
+    def run(self, duration: float) -> dict:
+        by_exchange = {}  # type: Dict[str, List[Tuple[str, str]]]
+        for exchange, instrument in self.pairs:
+            by_exchange.setdefault(exchange, []).append((exchange, instrument))
+        results = {exchange: {} for exchange in by_exchange}
+        rate = self.rate / len(by_exchange)
+        threads = [threading.Thread(target=self._feed,
+                                    args=(pairs, rate, duration, self._random.getrandbits(32), results[exchange]),
+                                    name='load-{}'.format(exchange), daemon=True)
+                   for exchange, pairs in by_exchange.items()]
+        dispatched = self.data_provider.dispatched
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        sent = sum(result['sent'] for result in results.values())
+        report = dict(pairs=len(self.pairs), target_rate=self.rate, sent=sent, elapsed=elapsed,
+                      throughput=sent / elapsed if elapsed else 0,
+                      dispatched=self.data_provider.dispatched - dispatched,
+                      # how late the slowest feed thread got against its schedule
+                      behind=max(result['behind'] for result in results.values()),
+                      subscribers=self.data_provider.subscriber_stats())
+        self.logger.info('load {}'.format(report))
+        return report
+
+
+def install_load_venues(config: dict, venues: int) -> List[Tuple[str, str]]:
+    """simulated venues load0, load1, ... quoting every configured instrument, so DataProvider can subscribe them"""
+    instruments = sorted({instrument for _, instrument in config['instruments']})
+    mids = {instrument: config['simulation']['mids'][instrument] for instrument in instruments}
+    pairs = []
+    for i in range(venues):
+        name = 'load{}'.format(i)
+        install(SimulatedExchange(name, mids, {}))
+        pairs += [(name, instrument) for instrument in instruments]
+    return pairs
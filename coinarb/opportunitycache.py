@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class OpportunityCache:
+    """
+    bounded LRU of pairwise evaluations keyed by the versions of both books and the strategy parameters.
+    a version only changes with its book, so a hit is exactly the result a new evaluation would return.
+    versions count per data provider, so every provider owns its cache and agents share the one of theirs.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._results = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """the cached result of key, or compute() stored under it. results are shared, callers copy them"""
+        with self._lock:
+            try:
+                result = self._results[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+        # computed outside the lock; two threads missing the same key both compute the same result
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return dict(size=len(self._results), hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    hit_rate=self.hits / total if total else 0)
+
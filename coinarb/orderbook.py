@@ -0,0 +1,260 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .depthindex import DepthIndex, SideDepth
+from .instrumentspec import InstrumentSpec
+
+Level = Tuple[float, float, float]  # (jpy, qty, price)
+
+
+def _changed_window(old: list, new: list) -> Tuple[int, int, int]:
+    """
+    (start, new end, old end) of the part between the common prefix and the common suffix of old and new.
+    slices are compared by binary search, so unchanged levels are only compared at C speed
+    """
+    n = min(len(old), len(new))
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[lo:mid] == new[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    start = lo
+    lo, hi = 0, n - start
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:len(old) - lo] == new[len(new) - mid:len(new) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return start, len(new) - lo, len(old) - lo
+
+
+class _Side:
+    """
+    levels sorted best first. with an InstrumentSpec, prices and quantities are keyed and compared
+    as integers at the feed precision, so float noise of the feed never creates or misses a level.
+    levels is copied on write once published, so a published list never changes and an unchanged side
+    is published again as the same list and depth.
+    a full side is compared with the previous raw one first, so only the levels between their common prefix
+    and suffix are normalized; a side that mostly changed is rebuilt at once instead of level by level.
+    """
+    # changed levels of a full side above this fraction rebuild the side
+    REBUILD_FRACTION = 0.2
+
+    def __init__(self, descending: bool, spec: InstrumentSpec = None):
+        self._sign = -1 if descending else 1
+        self._spec = spec
+        self.keys = []  # type: List[float]
+        self.levels = []  # type: List[Level]
+        self.raw = {}  # type: Dict[float, float]
+        self._last = None  # type: List[Tuple[float, float]]  # raw levels of the last full side
+        self._published = False
+        self._depth = None  # type: SideDepth
+
+    def _own(self):
+        """levels may be changed in place after this"""
+        if self._published:
+            self.levels = self.levels[:]
+            self._published = False
+        self._depth = None
+
+    def publish(self) -> Tuple[List[Level], SideDepth]:
+        self._published = True
+        if self._depth is None:
+            self._depth = SideDepth(self.levels)
+        return self.levels, self._depth
+
+    def _normalize(self, price: float, qty: float) -> Tuple[float, float, float, float]:
+        """(price key, qty key, price, qty)"""
+        spec = self._spec
+        if spec is None:
+            return price, qty, price, qty
+        price_key = spec.to_feed_price(price)
+        qty_key = spec.to_feed_qty(qty)
+        return price_key, qty_key, spec.from_feed_price(price_key), spec.from_feed_qty(qty_key)
+
+    def set(self, price: float, qty: float, rate: float):
+        price_key, qty_key, price, qty = self._normalize(price, qty)
+        key = self._sign * price_key
+        i = bisect.bisect_left(self.keys, key)
+        exists = i < len(self.keys) and self.keys[i] == key
+        if qty_key <= 0:
+            if exists:
+                self._own()
+                del self.keys[i]
+                del self.levels[i]
+                del self.raw[price_key]
+            return
+        if exists and self.raw[price_key] == qty_key:
+            # float noise of the same level
+            return
+        self.raw[price_key] = qty_key
+        self._own()
+        if exists:
+            self.levels[i] = (price * rate, qty, price)
+        else:
+            self.keys.insert(i, key)
+            self.levels.insert(i, (price * rate, qty, price))
+
+    def update(self, levels: Iterable[Tuple[float, float]], rate: float):
+        """(price, qty) level updates, qty 0 removes the level"""
+        for price, qty in levels:
+            # the next full side is compared with the kept levels again
+            self._last = None
+            self.set(price, qty, rate)
+
+    def replace(self, levels: Iterable[Tuple[float, float]], rate: float):
+        """the full side of a feed message"""
+        levels = list(levels)
+        last = self._last
+        self._last = levels
+        if last == levels:
+            return
+        if last is not None:
+            start, end, last_end = _changed_window(last, levels)
+            if max(end, last_end) - start <= len(levels) * self.REBUILD_FRACTION:
+                changed = dict(levels[start:end])
+                # removed first, so a changed level rounding to the key of a removed one is kept
+                for price, _ in last[start:last_end]:
+                    if price not in changed:
+                        self.set(price, 0, rate)
+                for price, qty in changed.items():
+                    self.set(price, qty, rate)
+                return
+        self._rebuild(levels, rate)
+
+    def _rebuild(self, levels: List[Tuple[float, float]], rate: float):
+        if self._spec is None:
+            normalized = [(price, qty, price, qty) for price, qty in levels]
+        else:
+            normalized = self._spec.to_feed_levels(levels)
+        sign = self._sign
+        entries = {}
+        for entry in normalized:
+            if entry[1] > 0:
+                entries[sign * entry[0]] = entry
+            else:
+                entries.pop(sign * entry[0], None)
+        keys = sorted(entries)
+        self.keys = keys
+        self.levels = [(price * rate, qty, price) for _, _, price, qty in map(entries.__getitem__, keys)]
+        self.raw = {price_key: qty_key for price_key, qty_key, _, _ in entries.values()}
+        self._published = False
+        self._depth = None
+
+    def reconvert(self, rate: float):
+        self.levels = [(price * rate, qty, price) for _, qty, price in self.levels]
+        self._published = False
+        self._depth = None
+
+
+def net_crossed(asks: List[Level], bids: List[Level]) -> Tuple[List[Level], List[Level]]:
+    """
+    same netting as utils.adjust_asks_bids on converted levels, touching only the crossed top.
+    uncrossed sides are returned as they are, netted ones as new lists
+    """
+    if not asks or not bids or asks[0][2] > bids[0][2]:
+        return asks, bids
+    i = j = 0
+    ask_qty = asks[0][1]
+    bid_qty = bids[0][1]
+    while i < len(asks) and j < len(bids) and asks[i][2] <= bids[j][2]:
+        qty_diff = ask_qty - bid_qty
+        if qty_diff > 0:
+            ask_qty = qty_diff
+        elif qty_diff < 0:
+            bid_qty = -qty_diff
+        if qty_diff >= 0:
+            j += 1
+            if j < len(bids):
+                bid_qty = bids[j][1]
+        if qty_diff <= 0:
+            i += 1
+            if i < len(asks):
+                ask_qty = asks[i][1]
+    asks = asks[i:]
+    bids = bids[j:]
+    if asks:
+        asks[0] = asks[0][:1] + (ask_qty,) + asks[0][2:]
+    if bids:
+        bids[0] = bids[0][:1] + (bid_qty,) + bids[0][2:]
+    return asks, bids
+
+
+class OrderBook:
+    """
+    converted order book of one (exchange, instrument) maintained by level deltas.
+    only the touched levels are converted again; crossed levels are netted when published.
+    a side the update did not touch is published as the list and depth of the previous version.
+    """
+
+    def __init__(self, exchange: str, instrument: str, rate: float = 1, *, spec: InstrumentSpec = None):
+        self.exchange = exchange
+        self.instrument = instrument
+        self.rate = rate
+        self.spec = spec
+        self.version = 0
+        self.data = {}
+        self._asks = _Side(descending=False, spec=spec)
+        self._bids = _Side(descending=True, spec=spec)
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            if rate == self.rate:
+                return
+            self.rate = rate
+            self._asks.reconvert(rate)
+            self._bids.reconvert(rate)
+            self.version += 1
+
+    def apply_deltas(self, asks: Iterable[Tuple[float, float]] = (), bids: Iterable[Tuple[float, float]] = (),
+                     **data) -> int:
+        """apply (price, qty) level updates, qty 0 removes the level"""
+        with self._lock:
+            self._asks.update(asks, self.rate)
+            self._bids.update(bids, self.rate)
+            self.data.update(data)
+            self.version += 1
+            return self.version
+
+    def apply_snapshot(self, order_book: dict) -> int:
+        """a full book of the feed: only the levels that differ from the kept ones are applied"""
+        data = {k: v for k, v in order_book.items() if k not in ('asks', 'bids', 'delta')}
+        with self._lock:
+            self._asks.replace(order_book['asks'], self.rate)
+            self._bids.replace(order_book['bids'], self.rate)
+            self.data.update(data)
+            self.version += 1
+            return self.version
+
+    def apply(self, order_book: dict) -> int:
+        """a feed message: level deltas if it is marked delta, a full book otherwise"""
+        if not order_book.get('delta'):
+            return self.apply_snapshot(order_book)
+        data = {k: v for k, v in order_book.items() if k not in ('asks', 'bids', 'delta')}
+        return self.apply_deltas(order_book.get('asks', ()), order_book.get('bids', ()), **data)
+
+    def mid(self) -> Optional[float]:
+        """mid of the raw best prices, None if a side is empty"""
+        with self._lock:
+            if not self._asks.levels or not self._bids.levels:
+                return None
+            return (self._asks.levels[0][2] + self._bids.levels[0][2]) / 2
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            asks, ask_depth = self._asks.publish()
+            bids, bid_depth = self._bids.publish()
+            netted_asks, netted_bids = net_crossed(asks, bids)
+            if netted_asks is not asks:
+                ask_depth = SideDepth(netted_asks)
+            if netted_bids is not bids:
+                bid_depth = SideDepth(netted_bids)
+            converted_order_book = self.data.copy()
+            converted_order_book.update(asks=netted_asks, bids=netted_bids, version=self.version,
+                                        depth=DepthIndex.of_sides(ask_depth, bid_depth))
+            return converted_order_book
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# executed qty below this is float noise of summed fills
+_EPSILON = 1e-9
+
+
+class _Entry:
+    def __init__(self, qty: float = None):
+        self.future = Future()
+        self.wake = threading.Event()
+        self.qty = qty
+        self.filled = 0.0
+        self.notional = 0.0
+
+
+class OrderTracker:
+    """
+    futures of submitted orders keyed by order id, resolved by the execution stream.
+    an update is either an order with its state, or a fill (fill_qty, fill_price) of a stream that sends
+    executions only; fills complete the order once they add up to the qty given to track().
+    an update without a final state only wakes the waiter, which then checks the order itself.
+    updates of orders not tracked yet are kept for a while, the stream often reports a fill before
+    the REST call that created the order returns.
+    """
+
+    def __init__(self, max_pending: int = 256, max_updates: int = 64):
+        self._entries = {}  # type: Dict[Hashable, _Entry]
+        self._pending = OrderedDict()  # type: OrderedDict  # order id -> updates, oldest id first
+        self.max_pending = max_pending
+        self.max_updates = max_updates
+        self._lock = threading.Lock()
+
+    def track(self, order_id: Hashable, qty: float = None) -> Future:
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None:
+                entry = self._entries[order_id] = _Entry(qty)
+            updates = self._pending.pop(order_id, [])  # type: List[dict]
+            for order in updates:
+                self._apply(entry, order)
+        if updates:
+            entry.wake.set()
+        return entry.future
+
+    def untrack(self, order_id: Hashable):
+        with self._lock:
+            self._entries.pop(order_id, None)
+
+    @staticmethod
+    def _apply(entry: _Entry, order: dict):
+        if entry.future.done():
+            return
+        if 'fill_qty' in order:
+            entry.filled += order['fill_qty']
+            entry.notional += order['fill_qty'] * order['fill_price']
+            if entry.qty is not None and entry.filled >= entry.qty - _EPSILON:
+                entry.future.set_result(dict(id=order['id'], state='FILLED', qty_executed=entry.filled,
+                                             price_executed_average=entry.notional / entry.filled))
+        elif order.get('state', 'ACTIVE') != 'ACTIVE':
+            entry.future.set_result(order)
+
+    def notify(self, order: dict):
+        order_id = order.get('id')
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None:
+                updates = self._pending.setdefault(order_id, [])
+                if len(updates) < self.max_updates:
+                    updates.append(order)
+                while len(self._pending) > self.max_pending:
+                    self._pending.popitem(last=False)
+                return
+            self._apply(entry, order)
+        entry.wake.set()
+
+    def result(self, order_id: Hashable) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(order_id)
+        if entry is None or not entry.future.done():
+            return None
+        return entry.future.result()
+
+    def wait(self, order_id: Hashable, timeout: float) -> Tuple[bool, Optional[dict]]:
+        """(woken by an update, the final order if the stream resolved it)"""
+        with self._lock:
+            entry = self._entries.get(order_id)
+        if entry is None:
+            return False, None
+        woken = entry.wake.wait(timeout)
+        entry.wake.clear()
+        return woken, self.result(order_id)
@@ -0,0 +1,53 @@
+import time
+from typing import List
+
+from coinlib.utils.mixins import LoggerMixin
+
+from .agents.agent import Agent
+from .dataprovider import DataProvider
+from .tickfile import TickReader, ORDER_BOOK
+
+
+class SimulatedClock:
+    def __init__(self, now: float = 0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class Replay(LoggerMixin):
+    """
+    feeds recorded ticks through DataProvider and runs the agents' tasks after every tick,
+    with the clock of the data provider following the tick timestamps. agents should be in debug mode.
+    """
+
+    def __init__(self, path: str, data_provider: DataProvider, agents: List[Agent], *, balances: dict = None):
+        self._logger = self._make_logger()
+        self.reader = TickReader(path)
+        self.data_provider = data_provider
+        self.agents = agents
+        self.clock = SimulatedClock()
+        data_provider.clock = self.clock.time
+        for agent in agents:
+            if not agent.is_debug:
+                raise Exception('agent {} is not in debug mode'.format(agent.name))
+            if balances:
+                agent.fund_manager.update_balances(balances)
+
+    def run(self) -> dict:
+        ticks = 0
+        start = time.perf_counter()
+        for kind, exchange, data in self.reader:
+            self.clock.now = max(self.clock.now, data['timestamp'])
+            if kind == ORDER_BOOK:
+                self.data_provider.on_order_book(exchange, ('order_book', data['instrument']), data)
+            else:
+                self.data_provider.on_fx_data(exchange, ('tick', data['instrument']), data)
+            for agent in self.agents:
+                agent.run_pending_tasks()
+            ticks += 1
+        elapsed = time.perf_counter() - start
+        stats = dict(ticks=ticks, elapsed=elapsed, ticks_per_second=ticks / elapsed if elapsed else 0)
+        self.logger.info('replay {}'.format(stats))
+        return stats
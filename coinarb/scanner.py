@@ -0,0 +1,123 @@
+import bisect
+import math
+from typing import Dict, List, Optional, Tuple, Callable
+
+from . import utils
+from .opportunitycache import OpportunityCache
+
+
+class Scanner:
+    """
+    arbitrage scanner of one instrument across any number of venues.
+
+    best bids and best asks of all venues are kept sorted, so an update of one venue only looks at the
+    venues whose top of book is already crossed by diff_min against it. the top of book diff is an upper
+    bound of what calculate_diff can return, so candidates are ranked by it and only the best
+    max_candidates pairs are walked in depth. the results of higher or lower tiers come from the same walk
+    as result['tiers']. with a cache, pairs whose two book versions were already evaluated are not walked again.
+    """
+
+    def __init__(self, instrument: str, diff_min: float, *, max_candidates: int = None, tiers: List[float] = (),
+                 calculate_diff: Callable[..., Optional[dict]] = utils.calculate_diff,
+                 calculate_diffs: Callable[..., List[Optional[dict]]] = utils.calculate_diffs,
+                 cache: OpportunityCache = None):
+        self.instrument = instrument
+        self.diff_min = diff_min
+        self.max_candidates = max_candidates
+        self.tiers = list(tiers)
+        self._calculate_diff = calculate_diff
+        self._calculate_diffs = calculate_diffs
+        self._cache = cache
+        self._order_books = {}  # type: Dict[str, dict]
+        self._tops = {}  # type: Dict[str, Tuple[float, float]]
+        self._bids = []  # type: List[Tuple[float, str]]  # (-best bid, exchange)
+        self._asks = []  # type: List[Tuple[float, str]]  # (best ask, exchange)
+
+    @property
+    def exchanges(self) -> List[str]:
+        return list(self._order_books)
+
+    def _remove_top(self, exchange: str):
+        top = self._tops.pop(exchange, None)
+        if top is None:
+            return
+        bid, ask = top
+        if not math.isnan(bid):
+            del self._bids[bisect.bisect_left(self._bids, (-bid, exchange))]
+        if not math.isnan(ask):
+            del self._asks[bisect.bisect_left(self._asks, (ask, exchange))]
+
+    def remove(self, exchange: str):
+        self._remove_top(exchange)
+        self._order_books.pop(exchange, None)
+
+    def update(self, exchange: str, order_book: dict) -> List[dict]:
+        """replace the book of exchange and return the opportunities of the pairs involving it"""
+        self._remove_top(exchange)
+        self._order_books[exchange] = order_book
+        bids = order_book.get('bids')
+        asks = order_book.get('asks')
+        bid = bids[0][0] if bids else math.nan
+        ask = asks[0][0] if asks else math.nan
+        self._tops[exchange] = (bid, ask)
+        if not math.isnan(bid):
+            bisect.insort(self._bids, (-bid, exchange))
+        if not math.isnan(ask):
+            bisect.insort(self._asks, (ask, exchange))
+
+        candidates = []
+        if not math.isnan(bid):
+            # exchange sells to every venue asking at most bid - diff_min
+            end = bisect.bisect_right(self._asks, (bid - self.diff_min, chr(0x10ffff)))
+            candidates += [(bid - other_ask, exchange, other) for other_ask, other in self._asks[:end]
+                           if other != exchange]
+        if not math.isnan(ask):
+            end = bisect.bisect_right(self._bids, (-(ask + self.diff_min), chr(0x10ffff)))
+            candidates += [(-other_bid - ask, other, exchange) for other_bid, other in self._bids[:end]
+                           if other != exchange]
+        return self._evaluate(candidates)
+
+    def scan(self) -> List[dict]:
+        """opportunities of all pairs"""
+        candidates = []
+        for neg_bid, sell_exchange in self._bids:
+            for ask, buy_exchange in self._asks:
+                if -neg_bid - ask < self.diff_min:
+                    break
+                if sell_exchange != buy_exchange:
+                    candidates.append((-neg_bid - ask, sell_exchange, buy_exchange))
+        return self._evaluate(candidates)
+
+    def _calculate(self, sell_order_book: dict, buy_order_book: dict) -> Tuple[Optional[dict], Optional[list]]:
+        if self.tiers:
+            result, *tiers = self._calculate_diffs(sell_order_book, buy_order_book, [self.diff_min] + self.tiers)
+            return result, tiers
+        return self._calculate_diff(sell_order_book, buy_order_book, self.diff_min), None
+
+    def _evaluate_pair(self, sell_exchange: str, buy_exchange: str) -> Tuple[Optional[dict], Optional[list]]:
+        sell_order_book = self._order_books[sell_exchange]
+        buy_order_book = self._order_books[buy_exchange]
+        sell_version = sell_order_book.get('version')
+        buy_version = buy_order_book.get('version')
+        if self._cache is None or sell_version is None or buy_version is None:
+            return self._calculate(sell_order_book, buy_order_book)
+        key = (self.instrument, sell_exchange, sell_version, buy_exchange, buy_version, self.diff_min,
+               tuple(self.tiers), self._calculate_diff, self._calculate_diffs)
+        return self._cache.get_or_compute(key, lambda: self._calculate(sell_order_book, buy_order_book))
+
+    def _evaluate(self, candidates: List[Tuple[float, str, str]]) -> List[dict]:
+        candidates.sort(key=lambda x: -x[0])
+        if self.max_candidates is not None:
+            candidates = candidates[:self.max_candidates]
+        opportunities = []
+        for _, sell_exchange, buy_exchange in candidates:
+            result, tiers = self._evaluate_pair(sell_exchange, buy_exchange)
+            if not result or result['diff'] < self.diff_min:
+                continue
+            result = result.copy()
+            if tiers is not None:
+                result['tiers'] = list(tiers)
+            result.update(instrument=self.instrument, sell_exchange=sell_exchange, buy_exchange=buy_exchange)
+            opportunities.append(result)
+        opportunities.sort(key=lambda x: -x['diff'] * x['qty'])
+        return opportunities
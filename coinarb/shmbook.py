@@ -0,0 +1,135 @@
+import os
+import struct
+from multiprocessing import shared_memory
+from typing import Dict, Hashable, List, Optional, Tuple
+
+Key = Tuple[str, Hashable]  # (exchange, instrument)
+
+# book slot: seq:Q version:Q timestamp:d received_at:d n_asks:I n_bids:I, then depth asks and depth bids
+# of (jpy:d qty:d price:d). rate slot: seq:Q mid:d timestamp:d.
+# seq is a seqlock: odd while the single writer of the slot is writing.
+_SEQ = struct.Struct('<Q')
+_BOOK_HEADER = struct.Struct('<QddII')
+_RATE = struct.Struct('<dd')
+
+
+class ReadRetryExceeded(Exception):
+    pass
+
+
+class SharedBookStore:
+    """
+    fixed-layout converted order books and fx rates in one shared memory region.
+    every slot has one writer process; readers never lock, they retry when the seqlock moved.
+    """
+    READ_RETRIES = 100000
+
+    def __init__(self, keys: List[Key], rate_keys: List[str] = (), *, depth: int = 50, name: str = None,
+                 create: bool = True):
+        self.keys = list(keys)
+        self.rate_keys = list(rate_keys)
+        self.depth = depth
+        self._book_size = _SEQ.size + _BOOK_HEADER.size + depth * 2 * 3 * 8
+        self._rate_size = _SEQ.size + _RATE.size
+        self._book_offsets = {key: i * self._book_size for i, key in enumerate(self.keys)}  # type: Dict[Key, int]
+        rates_offset = len(self.keys) * self._book_size
+        self._rate_offsets = {key: rates_offset + i * self._rate_size
+                              for i, key in enumerate(self.rate_keys)}  # type: Dict[str, int]
+        size = rates_offset + len(self.rate_keys) * self._rate_size
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+            self._shm.buf[:size] = bytes(size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._buf = self._shm.buf
+        self._levels_format = {}  # type: Dict[int, struct.Struct]
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def spec(self) -> dict:
+        """arguments to attach the same store in another process"""
+        return dict(keys=self.keys, rate_keys=self.rate_keys, depth=self.depth, name=self.name, create=False)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+    def _levels_struct(self, n: int) -> struct.Struct:
+        levels_struct = self._levels_format.get(n)
+        if levels_struct is None:
+            levels_struct = self._levels_format[n] = struct.Struct('<{}d'.format(n * 3))
+        return levels_struct
+
+    def write(self, key: Key, order_book: dict):
+        """asks and bids as converted (jpy, qty, price) levels, cut to depth"""
+        offset = self._book_offsets[key]
+        buf = self._buf
+        asks = order_book['asks'][:self.depth]
+        bids = order_book['bids'][:self.depth]
+        seq = _SEQ.unpack_from(buf, offset)[0]
+        _SEQ.pack_into(buf, offset, seq + 1)
+        _BOOK_HEADER.pack_into(buf, offset + _SEQ.size, order_book.get('version', seq // 2 + 1),
+                               order_book.get('timestamp', 0), order_book.get('received_at', 0), len(asks), len(bids))
+        levels_offset = offset + _SEQ.size + _BOOK_HEADER.size
+        self._levels_struct(len(asks)).pack_into(buf, levels_offset, *[x for level in asks for x in level])
+        self._levels_struct(len(bids)).pack_into(buf, levels_offset + self.depth * 3 * 8,
+                                                 *[x for level in bids for x in level])
+        _SEQ.pack_into(buf, offset, seq + 2)
+
+    def version(self, key: Key) -> int:
+        return _BOOK_HEADER.unpack_from(self._buf, self._book_offsets[key] + _SEQ.size)[0]
+
+    def read(self, key: Key, since_version: int = None) -> Optional[dict]:
+        """a consistent copy of the book, None if never written or still at since_version"""
+        offset = self._book_offsets[key]
+        buf = self._buf
+        levels_offset = offset + _SEQ.size + _BOOK_HEADER.size
+        for _ in range(self.READ_RETRIES):
+            seq = _SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                # the writer may have been preempted in the middle of the slot
+                os.sched_yield()
+                continue
+            if seq == 0:
+                return None
+            version, timestamp, received_at, n_asks, n_bids = _BOOK_HEADER.unpack_from(buf, offset + _SEQ.size)
+            if version == since_version:
+                return None
+            asks = self._levels_struct(n_asks).unpack_from(buf, levels_offset)
+            bids = self._levels_struct(n_bids).unpack_from(buf, levels_offset + self.depth * 3 * 8)
+            if _SEQ.unpack_from(buf, offset)[0] != seq:
+                continue
+            exchange, instrument = key
+            return dict(instrument=instrument, version=version, timestamp=timestamp, received_at=received_at,
+                        asks=list(zip(asks[0::3], asks[1::3], asks[2::3])),
+                        bids=list(zip(bids[0::3], bids[1::3], bids[2::3])))
+        raise ReadRetryExceeded('key={}'.format(key))
+
+    def write_rate(self, instrument: str, mid: float, timestamp: float):
+        offset = self._rate_offsets[instrument]
+        buf = self._buf
+        seq = _SEQ.unpack_from(buf, offset)[0]
+        _SEQ.pack_into(buf, offset, seq + 1)
+        _RATE.pack_into(buf, offset + _SEQ.size, mid, timestamp)
+        _SEQ.pack_into(buf, offset, seq + 2)
+
+    def read_rate(self, instrument: str) -> Optional[dict]:
+        offset = self._rate_offsets[instrument]
+        buf = self._buf
+        for _ in range(self.READ_RETRIES):
+            seq = _SEQ.unpack_from(buf, offset)[0]
+            if seq & 1:
+                # the writer may have been preempted in the middle of the slot
+                os.sched_yield()
+                continue
+            if seq == 0:
+                return None
+            mid, timestamp = _RATE.unpack_from(buf, offset + _SEQ.size)
+            if _SEQ.unpack_from(buf, offset)[0] == seq:
+                return dict(instrument=instrument, mid=mid, timestamp=timestamp)
+        raise ReadRetryExceeded('rate={}'.format(instrument))
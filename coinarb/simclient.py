@@ -0,0 +1,93 @@
+import functools
+import time
+import types
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import coinlib
+from coinlib.coinlib.errors import CoinLibError
+
+from .instrumentspec import compile_specs
+from .simexchange import SimulatedExchange, SimulatedExchangeError
+
+
+class SimulatedStreamClient:
+    """the coinlib StreamClient calls the agents and the data provider make, served by a SimulatedExchange"""
+
+    def __init__(self, exchange: SimulatedExchange, api_key: str = None, api_secret: str = None):
+        _ = api_key, api_secret
+        self.exchange = exchange
+        self._subscriptions = []  # type: List[Tuple[Tuple[str, Hashable], Callable]]
+
+    def open(self):
+        pass
+
+    def close(self):
+        for key, callback in self._subscriptions:
+            self.exchange.unsubscribe(key, callback)
+        self._subscriptions = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def subscribe(self, *subscriptions: Tuple[str, Hashable], on_data: Callable[[Tuple[str, Hashable], Any], None],
+                  **kw_subscriptions: Hashable):
+        for key in list(subscriptions) + list(kw_subscriptions.items()):
+            self.exchange.subscribe(key, on_data)
+            self._subscriptions.append((key, on_data))
+
+    def _call(self, method, *args, **kwargs):
+        if self.exchange.latency > 0:
+            time.sleep(self.exchange.latency)
+        try:
+            return method(*args, **kwargs)
+        except SimulatedExchangeError as e:
+            raise CoinLibError(str(e)) from e
+
+    def get_balances(self) -> Dict[str, dict]:
+        return self._call(self.exchange.get_balances)
+
+    def create_limit_order(self, instrument: str, *, side: str, price: float, qty: float, **_) -> dict:
+        return self._call(self.exchange.create_order, instrument, 'limit', side, qty, price)
+
+    def create_market_order(self, instrument: str, *, side: str, qty: float, **_) -> dict:
+        return self._call(self.exchange.create_order, instrument, 'market', side, qty)
+
+    def get_order(self, id: int, **_) -> dict:
+        return self._call(self.exchange.get_order, id)
+
+    def cancel_order(self, id: int, **_) -> dict:
+        return self._call(self.exchange.cancel_order, id)
+
+
+def install(exchange: SimulatedExchange):
+    """serve getattr(coinlib, exchange.name).StreamClient from the simulated venue"""
+    setattr(coinlib, exchange.name, types.SimpleNamespace(StreamClient=functools.partial(SimulatedStreamClient,
+                                                                                         exchange),
+                                                          exchange=exchange))
+
+
+def install_from_config(config: dict) -> List[SimulatedExchange]:
+    """a simulated venue (not started yet) for every exchange of config['instruments'], see config['simulation']"""
+    simulation = config['simulation']
+    specs = compile_specs(config)
+    instruments = defaultdict(list)
+    for exchange, instrument in config['instruments']:
+        instruments[exchange].append(instrument)
+    exchanges = []
+    for i, (name, exchange_instruments) in enumerate(sorted(instruments.items())):
+        ticks = {instrument: specs[(name, instrument)].tick for instrument in exchange_instruments
+                 if (name, instrument) in specs}
+        exchange = SimulatedExchange(name, {instrument: simulation['mids'][instrument]
+                                            for instrument in exchange_instruments},
+                                     simulation['balances'], ticks=ticks,
+                                     fee=config[name].get('fees', {}).get('taker', 0), seed=i,
+                                     **simulation.get('options', {}))
+        config[name].setdefault('credentials', [dict(api_key='simulated', api_secret='simulated')])
+        install(exchange)
+        exchanges.append(exchange)
+    return exchanges
@@ -0,0 +1,317 @@
+import heapq
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+Key = Tuple[str, Hashable]  # ('order_book', instrument) or ('execution', (instrument, user_id))
+
+# remainders below this are float noise of the fills
+_EPSILON = 1e-9
+
+
+class SimulatedExchangeError(Exception):
+    pass
+
+
+class _Side:
+    """levels of one side of a simulated book as [price, qty] lists, best first"""
+
+    def __init__(self, levels: List[List[float]]):
+        self.levels = levels
+
+    def _walk(self, limit: Optional[float], qty: float, is_buy: bool,
+              fill_ratio: float) -> List[Tuple[List[float], float]]:
+        """(level, qty taken from it) up to qty from the levels crossing limit, each gives fill_ratio of its qty"""
+        takes = []
+        for level in self.levels:
+            if qty <= _EPSILON:
+                break
+            price, level_qty = level
+            if limit is not None and (price > limit if is_buy else price < limit):
+                break
+            take = min(qty, level_qty * fill_ratio)
+            if take <= _EPSILON:
+                continue
+            qty -= take
+            takes.append((level, take))
+        return takes
+
+    def fills(self, limit: Optional[float], qty: float, is_buy: bool,
+              fill_ratio: float) -> List[Tuple[float, float]]:
+        """what take() would fill, without consuming the levels"""
+        return [(level[0], take) for level, take in self._walk(limit, qty, is_buy, fill_ratio)]
+
+    def take(self, limit: Optional[float], qty: float, is_buy: bool, fill_ratio: float) -> List[Tuple[float, float]]:
+        """consume up to qty from the levels crossing limit, each level only gives fill_ratio of its qty"""
+        fills = []
+        for level, take in self._walk(limit, qty, is_buy, fill_ratio):
+            level[1] -= take
+            fills.append((level[0], take))
+        self.levels = [level for level in self.levels if level[1] > _EPSILON]
+        return fills
+
+
+class SimulatedExchange:
+    """
+    in-process matching engine of one venue. every step the mid of each instrument walks randomly and the book
+    around it is regenerated; takers consume it (only fill_ratio of each level, so fills can be partial) and
+    limit orders rest until a later book crosses them. rest calls wait latency, stream messages stream_latency.
+    stream messages are queued and delivered by the thread of start() without the lock; without that thread
+    they are delivered when the call that published them releases the lock.
+    """
+
+    def __init__(self, name: str, mids: Dict[str, float], balances: Dict[str, float], *,
+                 ticks: Dict[str, float] = None, depth: int = 20, level_qty: float = 1000, spread_ticks: int = 2,
+                 volatility: float = 0.0005, fill_ratio: float = 1.0, fee: float = 0.0, latency: float = 0.0,
+                 stream_latency: float = 0.0, update_interval: float = 0.1, seed: int = None,
+                 clock: Callable[[], float] = time.time):
+        self.name = name
+        self.mids = dict(mids)
+        self.ticks = {instrument: (ticks or {}).get(instrument, 0.001) for instrument in mids}
+        self.depth = depth
+        self.level_qty = level_qty
+        self.spread_ticks = spread_ticks
+        self.volatility = volatility
+        self.fill_ratio = fill_ratio
+        self.fee = fee
+        self.latency = latency
+        self.stream_latency = stream_latency
+        self.update_interval = update_interval
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._balances = defaultdict(float, balances)  # type: Dict[str, float]
+        self._books = {}  # type: Dict[str, Tuple[_Side, _Side]]  # (asks, bids)
+        self._orders = {}  # type: Dict[int, dict]
+        self._resting = defaultdict(list)  # type: Dict[str, List[int]]
+        self._order_ids = itertools.count(1)
+        self._subscribers = defaultdict(set)  # type: Dict[Key, set]
+        self._lock = threading.RLock()
+        self._deliveries = []  # type: List[Tuple[float, int, Callable, Key, dict]]
+        self._delivery_ids = itertools.count()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None  # type: threading.Thread
+        self._flushing = threading.local()
+        self._stopped = False
+        self.messages = 0
+        for instrument in mids:
+            self._make_book(instrument)
+
+    # book dynamics
+
+    def _make_book(self, instrument: str):
+        tick = self.ticks[instrument]
+        mid = self.mids[instrument]
+        best_bid = math.floor(mid / tick - self.spread_ticks / 2) * tick
+        best_ask = best_bid + self.spread_ticks * tick
+        r = self._random
+        asks = [[round(best_ask + i * tick, 12), self.level_qty * r.uniform(0.5, 1.5)] for i in range(self.depth)]
+        bids = [[round(best_bid - i * tick, 12), self.level_qty * r.uniform(0.5, 1.5)] for i in range(self.depth)]
+        self._books[instrument] = (_Side(asks), _Side(bids))
+
+    def step(self):
+        """move every instrument once, fill the resting orders the new books cross and publish the books"""
+        with self._lock:
+            for instrument in self.mids:
+                self.mids[instrument] *= math.exp(self._random.gauss(0, self.volatility))
+                self._make_book(instrument)
+                for order_id in list(self._resting[instrument]):
+                    self._match(self._orders[order_id])
+                self._publish(('order_book', instrument), self.order_book(instrument))
+        self._flush()
+
+    def order_book(self, instrument: str) -> dict:
+        with self._lock:
+            asks, bids = self._books[instrument]
+            return dict(instrument=instrument, timestamp=self.clock(),
+                        asks=[tuple(level) for level in asks.levels], bids=[tuple(level) for level in bids.levels])
+
+    # streaming
+
+    def subscribe(self, key: Key, callback: Callable[[Key, dict], None]):
+        with self._lock:
+            self._subscribers[key].add(callback)
+
+    def unsubscribe(self, key: Key, callback: Callable[[Key, dict], None]):
+        with self._lock:
+            self._subscribers[key].discard(callback)
+
+    def _publish(self, key: Key, data: dict):
+        """called with the lock held, so the callbacks are only queued"""
+        for callback in list(self._subscribers.get(key, ())):
+            self.messages += 1
+            heapq.heappush(self._deliveries, (self.clock() + max(0.0, self.stream_latency),
+                                              next(self._delivery_ids), callback, key, data))
+            self._wakeup.notify()
+
+    def _flush(self):
+        """
+        without the delivery thread, deliver everything queued; called by the public methods after they
+        released the lock. a callback calling the venue leaves its messages to the flush already running
+        on its thread, so they are delivered in order
+        """
+        if self._thread is not None or getattr(self._flushing, 'active', False):
+            return
+        self._flushing.active = True
+        try:
+            while True:
+                with self._lock:
+                    due, self._deliveries = sorted(self._deliveries), []
+                if not due:
+                    return
+                for _, _, callback, key, data in due:
+                    self._deliver(callback, key, data)
+        finally:
+            self._flushing.active = False
+
+    @staticmethod
+    def _deliver(callback, key: Key, data: dict):
+        try:
+            callback(key, data)
+        except Exception as e:
+            # a subscriber must not stop the venue
+            logging.getLogger(__name__).exception(e)
+
+    def _publish_order(self, order: dict):
+        data = dict(order, order_id=order['id'])
+        for key in list(self._subscribers):
+            if key[0] == 'execution' and key[1][0] == order['instrument']:
+                self._publish(key, data)
+
+    def start(self) -> 'SimulatedExchange':
+        self._stopped = False
+        self._thread = threading.Thread(target=self.run, name='sim-{}'.format(self.name), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        next_step = self.clock()
+        while True:
+            due = []
+            with self._lock:
+                if self._stopped:
+                    return
+                now = self.clock()
+                if now >= next_step:
+                    self.step()
+                    next_step = now + self.update_interval
+                while self._deliveries and self._deliveries[0][0] <= now:
+                    due.append(heapq.heappop(self._deliveries))
+                if not due:
+                    wait_until = min([next_step] + [d[0] for d in self._deliveries[:1]])
+                    self._wakeup.wait(max(0.0, wait_until - now))
+            # callbacks run without the lock, they may call back into the venue
+            for _, _, callback, key, data in due:
+                self._deliver(callback, key, data)
+
+    # account
+
+    def get_balances(self) -> Dict[str, dict]:
+        with self._lock:
+            used = defaultdict(float)
+            for order_ids in self._resting.values():
+                for order_id in order_ids:
+                    currency, qty = self._locked(self._orders[order_id])
+                    used[currency] += qty
+            return {currency: dict(total=total, used=used[currency]) for currency, total in self._balances.items()}
+
+    def _locked(self, order: dict) -> Tuple[str, float]:
+        base, quote = order['instrument'].split('_')
+        remaining = order['qty'] - order['qty_executed']
+        if order['side'] == 'BUY':
+            return quote, remaining * order['price'] * (1 + self.fee)
+        return base, remaining
+
+    # orders
+
+    def create_order(self, instrument: str, order_type: str, side: str, qty: float, price: float = None) -> dict:
+        if instrument not in self._books:
+            raise SimulatedExchangeError('unknown instrument {}'.format(instrument))
+        if side not in ('BUY', 'SELL') or qty <= 0:
+            raise SimulatedExchangeError('invalid order side={} qty={}'.format(side, qty))
+        if order_type == 'limit' and price is None:
+            raise SimulatedExchangeError('limit order without price')
+        with self._lock:
+            base, quote = instrument.split('_')
+            if side == 'SELL':
+                needed, currency = qty, base
+            elif order_type == 'limit':
+                needed, currency = qty * price * (1 + self.fee), quote
+            else:
+                # a market order pays every level it takes, plus the fee
+                asks, _ = self._books[instrument]
+                needed = sum(p * q for p, q in asks.fills(None, qty, True, self.fill_ratio)) * (1 + self.fee)
+                currency = quote
+            balance = self.get_balances().get(currency, dict(total=0, used=0))
+            if balance['total'] - balance['used'] < needed:
+                raise SimulatedExchangeError('insufficient {} for {} {}'.format(currency, side, qty))
+            order = dict(id=next(self._order_ids), instrument=instrument, order_type=order_type, side=side,
+                         price=price, qty=qty, qty_executed=0.0, price_executed_average=math.nan, state='ACTIVE',
+                         created_at=self.clock())
+            self._orders[order['id']] = order
+            self._match(order)
+            if order['state'] == 'ACTIVE':
+                if order_type == 'market':
+                    # what the book could not fill is not kept
+                    order['state'] = 'CANCELED'
+                    self._publish_order(order)
+                else:
+                    self._resting[instrument].append(order['id'])
+            order = dict(order)
+        self._flush()
+        return order
+
+    def _match(self, order: dict):
+        asks, bids = self._books[order['instrument']]
+        is_buy = order['side'] == 'BUY'
+        remaining = order['qty'] - order['qty_executed']
+        limit = order['price'] if order['order_type'] == 'limit' else None
+        fills = (asks if is_buy else bids).take(limit, remaining, is_buy, self.fill_ratio)
+        if not fills:
+            return
+        base, quote = order['instrument'].split('_')
+        qty = sum(q for _, q in fills)
+        notional = sum(p * q for p, q in fills)
+        sign = 1 if is_buy else -1
+        self._balances[base] += sign * qty
+        self._balances[quote] -= sign * notional + notional * self.fee
+        executed = order['qty_executed']
+        average = order['price_executed_average']
+        order['price_executed_average'] = ((average * executed if executed else 0) + notional) / (executed + qty)
+        order['qty_executed'] = executed + qty
+        if order['qty'] - order['qty_executed'] <= _EPSILON:
+            order['state'] = 'FILLED'
+            if order['id'] in self._resting[order['instrument']]:
+                self._resting[order['instrument']].remove(order['id'])
+        self._publish_order(order)
+
+    def get_order(self, order_id: int) -> dict:
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                raise SimulatedExchangeError('unknown order {}'.format(order_id))
+            return dict(order)
+
+    def cancel_order(self, order_id: int) -> dict:
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None or order['state'] != 'ACTIVE':
+                raise SimulatedExchangeError('order {} is not active'.format(order_id))
+            order['state'] = 'CANCELED'
+            self._resting[order['instrument']].remove(order_id)
+            self._publish_order(order)
+            order = dict(order)
+        self._flush()
+        return order
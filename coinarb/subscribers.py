@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+from .latency import Histogram
+
+Callback = Callable[[str, Tuple[str, Hashable], Any], None]
+
+
+def callback_name(callback: Callback) -> str:
+    owner = getattr(callback, '__self__', None)
+    name = getattr(callback, '__name__', type(callback).__name__)
+    if owner is None:
+        return name
+    return '{}.{}'.format(getattr(owner, 'name', type(owner).__name__), name)
+
+
+class Subscriber:
+    """a DataProvider callback called on the feed thread, with its call times"""
+
+    def __init__(self, callback: Callback, logger):
+        self.callback = callback
+        self.name = callback_name(callback)
+        self.logger = logger
+        self.histogram = Histogram()
+        self._stats_lock = threading.Lock()
+
+    def __call__(self, exchange: str, key: Tuple[str, Hashable], data: Any):
+        self.deliver(exchange, key, data)
+
+    def deliver(self, exchange: str, key: Tuple[str, Hashable], data: Any):
+        start = time.perf_counter()
+        try:
+            self.callback(exchange, key, data)
+        except Exception as e:
+            self.logger.exception(e)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.histogram.record(elapsed)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(callback=self.histogram.to_dict())
+
+
+class QueuedSubscriber(Subscriber):
+    """
+    a DataProvider callback called on its own thread from a bounded queue, so a slow consumer never blocks the feed.
+    an update of a (exchange, key) still queued replaces it (conflated); when the queue is full the oldest
+    update is dropped.
+    """
+
+    def __init__(self, callback: Callback, logger, queue_size: int):
+        super().__init__(callback, logger)
+        self.queue_size = queue_size
+        self._queue = OrderedDict()  # type: OrderedDict
+        self._cond = threading.Condition()
+        self._thread = None  # type: threading.Thread
+        self._stopped = False
+        self.queued = 0
+        self.conflated = 0
+        self.dropped = 0
+
+    def __call__(self, exchange: str, key: Tuple[str, Hashable], data: Any):
+        with self._cond:
+            self.queued += 1
+            queue_key = (exchange, key)
+            if queue_key in self._queue:
+                self.conflated += 1
+                # keeps its place in the queue, only the data is newer
+                self._queue[queue_key] = data
+            else:
+                if len(self._queue) >= self.queue_size:
+                    self._queue.popitem(last=False)
+                    self.dropped += 1
+                self._queue[queue_key] = data
+            self._cond.notify()
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self.run, name='subscriber-{}'.format(self.name), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                (exchange, key), data = self._queue.popitem(last=False)
+            self.deliver(exchange, key, data)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._cond:
+            stats.update(queued=self.queued, conflated=self.conflated, dropped=self.dropped, depth=len(self._queue))
+        return stats
@@ -0,0 +1,97 @@
+import heapq
+import itertools
+import threading
+import time
+from queue import Empty
+from typing import Callable, Dict, List, Optional, Tuple
+
+# priority classes of agent tasks, lower runs first
+MARKET = 0  # evaluations of fresh books, worthless once late
+ROUTINE = 1  # the main interval task
+BACKGROUND = 2  # balance updates and other slow REST work
+
+PRIORITY_NAMES = {MARKET: 'market', ROUTINE: 'routine', BACKGROUND: 'background'}
+
+Task = Tuple[Callable, tuple, dict, float]  # (func, args, kwargs, put_at)
+
+
+class PriorityTaskQueue:
+    """
+    task queue ordered by priority class, then by put order. a task may have a deadline: one still queued
+    past it is dropped when it would be taken and its on_expired is called instead, so late work never runs.
+    """
+
+    def __init__(self, *, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._heap = []  # type: List[tuple]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.depths = {priority: 0 for priority in PRIORITY_NAMES}  # type: Dict[int, int]
+        self.max_depth = 0
+        self.put_count = 0
+        self.expired = {priority: 0 for priority in PRIORITY_NAMES}  # type: Dict[int, int]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def put(self, task: Task, priority: int = ROUTINE, deadline: float = None,
+            on_expired: Callable[[], None] = None) -> int:
+        """the depth of the queue with task"""
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._seq), deadline, on_expired, task))
+            self.depths[priority] += 1
+            self.put_count += 1
+            depth = len(self._heap)
+            self.max_depth = max(self.max_depth, depth)
+            self._cond.notify()
+            return depth
+
+    def get(self, timeout: float = None) -> Tuple[int, Task]:
+        """(priority, task) of the first task not expired, raises queue.Empty if there is none within timeout"""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            expired = []
+            with self._cond:
+                entry = self._pop_live(expired)
+                if entry is None and not expired:
+                    remaining = None if end is None else end - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty
+                    self._cond.wait(remaining)
+                    entry = self._pop_live(expired)
+            # called without the lock, they may put tasks again
+            for on_expired in expired:
+                on_expired()
+            if entry is not None:
+                return entry
+            if end is not None and time.monotonic() >= end:
+                raise Empty
+
+    def get_nowait(self) -> Tuple[int, Task]:
+        expired = []
+        with self._cond:
+            entry = self._pop_live(expired)
+        for on_expired in expired:
+            on_expired()
+        if entry is None:
+            raise Empty
+        return entry
+
+    def _pop_live(self, expired: List[Callable[[], None]]) -> Optional[Tuple[int, Task]]:
+        now = self.clock()
+        while self._heap:
+            priority, _, deadline, on_expired, task = heapq.heappop(self._heap)
+            self.depths[priority] -= 1
+            if deadline is not None and now > deadline:
+                self.expired[priority] += 1
+                if on_expired:
+                    expired.append(on_expired)
+                continue
+            return priority, task
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(depth=len(self._heap), max_depth=self.max_depth, put=self.put_count,
+                        depths={PRIORITY_NAMES[p]: n for p, n in self.depths.items()},
+                        expired={PRIORITY_NAMES[p]: n for p, n in self.expired.items()})
@@ -0,0 +1,125 @@
+import mmap
+import struct
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Hashable, Iterator, Tuple
+
+# tick file layout, little endian, after MAGIC:
+#   NAME:       kind:B id:H length:H utf8[length]
+#   ORDER_BOOK: kind:B timestamp:d exchange:H instrument:H n_asks:H n_bids:H (price:d qty:d)[n_asks + n_bids]
+#   FX:         kind:B timestamp:d instrument:H bid:d ask:d
+#   ORDER_BOOK_DELTA: as ORDER_BOOK, the levels are deltas of a delta=True message
+MAGIC = b'COINARB\x01'
+NAME = 0
+ORDER_BOOK = 1
+FX = 2
+ORDER_BOOK_DELTA = 3
+
+_KIND = struct.Struct('<B')
+_NAME = struct.Struct('<BHH')
+_ORDER_BOOK = struct.Struct('<BdHHHH')
+_FX = struct.Struct('<BdHdd')
+
+
+class TickWriter:
+    def __init__(self, path: str):
+        self._f = open(path, 'wb')  # type: BinaryIO
+        self._f.write(MAGIC)
+        self._names = {}  # type: Dict[str, int]
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._f.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _name_id(self, name: str) -> int:
+        name_id = self._names.get(name)
+        if name_id is None:
+            name_id = self._names[name] = len(self._names)
+            encoded = name.encode()
+            self._f.write(_NAME.pack(NAME, name_id, len(encoded)) + encoded)
+        return name_id
+
+    def write_order_book(self, exchange: str, order_book: dict):
+        """
+        asks and bids as (price, qty) or converted (jpy, qty, price) levels.
+        a book without timestamp is stamped with the time it is written
+        """
+        asks = list(order_book.get('asks', ()))
+        bids = list(order_book.get('bids', ()))
+        levels = [tuple(level[-1:]) + tuple(level[1:2]) if len(level) == 3 else level for level in asks + bids]
+        kind = ORDER_BOOK_DELTA if order_book.get('delta') else ORDER_BOOK
+        with self._lock:
+            if self._f.closed:
+                # feed threads may still deliver while the recording is shut down
+                return
+            header = _ORDER_BOOK.pack(kind, order_book.get('timestamp') or time.time(), self._name_id(exchange),
+                                      self._name_id(order_book['instrument']), len(asks), len(bids))
+            values = [x for level in levels for x in level]
+            self._f.write(header + struct.pack('<{}d'.format(len(values)), *values))
+
+    def write_fx(self, price: dict):
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(_FX.pack(FX, price['timestamp'], self._name_id(price['instrument']),
+                                   price['bid'], price['ask']))
+
+    def on_data(self, exchange: str, key: Tuple[str, Hashable], data: Any):
+        if key[0] == 'order_book':
+            self.write_order_book(exchange, data)
+
+    def on_fx_data(self, _: str, __: Tuple[str, Hashable], data: dict):
+        self.write_fx(data)
+
+
+class TickReader:
+    """reads a tick file through mmap, so only the pages being replayed are resident"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[Tuple[int, str, dict]]:
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise Exception('not a tick file {}'.format(self.path))
+            names = {}  # type: Dict[int, str]
+            offset = len(MAGIC)
+            size = len(mm)
+            while offset < size:
+                kind = _KIND.unpack_from(mm, offset)[0]
+                if kind in (ORDER_BOOK, ORDER_BOOK_DELTA):
+                    _, timestamp, exchange, instrument, n_asks, n_bids = _ORDER_BOOK.unpack_from(mm, offset)
+                    offset += _ORDER_BOOK.size
+                    n = (n_asks + n_bids) * 2
+                    values = struct.unpack_from('<{}d'.format(n), mm, offset)
+                    offset += n * 8
+                    levels = list(zip(values[::2], values[1::2]))
+                    order_book = dict(instrument=names[instrument], timestamp=timestamp,
+                                      asks=levels[:n_asks], bids=levels[n_asks:])
+                    if kind == ORDER_BOOK_DELTA:
+                        order_book['delta'] = True
+                    # replay feeds both kinds to DataProvider.on_order_book
+                    yield ORDER_BOOK, names[exchange], order_book
+                elif kind == FX:
+                    _, timestamp, instrument, bid, ask = _FX.unpack_from(mm, offset)
+                    offset += _FX.size
+                    yield FX, 'oanda', dict(instrument=names[instrument], timestamp=timestamp, bid=bid, ask=ask,
+                                            mid=(bid + ask) / 2)
+                elif kind == NAME:
+                    _, name_id, length = _NAME.unpack_from(mm, offset)
+                    offset += _NAME.size
+                    names[name_id] = bytes(mm[offset:offset + length]).decode()
+                    offset += length
+                else:
+                    raise Exception('unknown record kind={} offset={}'.format(kind, offset))
@@ -37,6 +37,19 @@ def calculate_diff(order_book_for_sell: dict,
                    diff_min: float,
                    sell_qty_adjustment:float=0,
                    buy_qty_adjustment:float=0) -> Optional[dict]:
+    return calculate_diffs(order_book_for_sell, order_book_for_buy, [diff_min],
+                           sell_qty_adjustment, buy_qty_adjustment)[0]
+
+
+def calculate_diffs(order_book_for_sell: dict,
+                    order_book_for_buy: dict,
+                    diff_mins: List[float],
+                    sell_qty_adjustment:float=0,
+                    buy_qty_adjustment:float=0) -> List[Optional[dict]]:
+    """
+    calculate_diff of every threshold of diff_mins from one walk, in the order of diff_mins.
+    the walk does not depend on the threshold, a higher one only stops it earlier.
+    """
     if 'bids' not in order_book_for_sell:
         raise Exception('{}'.format(order_book_for_sell))
     if 'asks' not in order_book_for_buy:
@@ -49,18 +62,33 @@ def calculate_diff(order_book_for_sell: dict,
     buy_jpy = math.nan
     buy_qty = math.nan
     buy_price = math.nan
+    # thresholds still walking, highest (first to stop) last
+    pending = sorted(range(len(diff_mins)), key=lambda i: diff_mins[i])
+    results = [None] * len(diff_mins)  # type: List[Optional[dict]]
+
+    def make_result() -> Optional[dict]:
+        if math.isnan(sell_jpy) or math.isnan(buy_jpy):
+            return None
+        return dict(sell_jpy=sell_jpy,
+                    sell_price=sell_price,
+                    buy_jpy=buy_jpy,
+                    buy_price=buy_price,
+                    qty=min([sell_qty, buy_qty]),
+                    diff=sell_jpy - buy_jpy,
+                    diff_rate=(sell_jpy - buy_jpy) / buy_jpy)
 
-    def check_diff(_sell: float, _buy: float) -> bool:
-        if _sell - _buy < diff_min:
-            return True
-        return False
+    def stop(_sell: float, _buy: float) -> bool:
+        """record the thresholds the next level falls below, True if none is left"""
+        while pending and _sell - _buy < diff_mins[pending[-1]]:
+            results[pending.pop()] = make_result()
+        return not pending
 
     try:
         sell_it = iter(bids_for_sell)
         sell_jpy, sell_qty, sell_price = next(sell_it)
         buy_it = iter(asks_for_buy)
         buy_jpy, buy_qty, buy_price = next(buy_it)
-        while True:
+        while pending:
             sell_qty -= sell_qty_adjustment
             if sell_qty < 0:
                 sell_qty_adjustment = abs(sell_qty)
@@ -72,14 +100,14 @@ def calculate_diff(order_book_for_sell: dict,
 
             if sell_qty < buy_qty:
                 jpy, qty, price = next(sell_it)
-                if check_diff(jpy, buy_jpy):
+                if stop(jpy, buy_jpy):
                     break
                 sell_jpy = jpy
                 sell_qty += qty
                 sell_price = price
             else:
                 jpy, qty, price = next(buy_it)
-                if check_diff(sell_jpy, jpy):
+                if stop(sell_jpy, jpy):
                     break
                 buy_jpy = jpy
                 buy_qty += qty
@@ -87,12 +115,6 @@ def calculate_diff(order_book_for_sell: dict,
     except StopIteration:
         pass
 
-    if math.isnan(sell_jpy) or math.isnan(buy_jpy):
-        return None
-    return dict(sell_jpy=sell_jpy,
-                sell_price=sell_price,
-                buy_jpy=buy_jpy,
-                buy_price=buy_price,
-                qty=min([sell_qty, buy_qty]),
-                diff=sell_jpy - buy_jpy,
-                diff_rate=(sell_jpy - buy_jpy) / buy_jpy)
+    for i in pending:
+        results[i] = make_result()
+    return results
@@ -1,7 +1,9 @@
 import itertools
 import logging
+import math
 import pathlib
 import re
+import signal
 import sys
 import threading
 import time
@@ -10,9 +12,17 @@ from pprint import pprint
 from docopt import docopt
 
 from coinarb import agents
+from coinarb import latency
+from coinarb.aioruntime import AsyncRuntime
 from coinarb.arbconfig import CONFIG
 from coinarb.bot import Bot
 from coinarb.dataprovider import DataProvider, FxProvider
+from coinarb.eventlog import eventlog
+from coinarb.loadgen import FeedLoadGenerator, install_load_venues
+from coinarb.feedprocess import FeedProcesses, SharedBookProvider, SharedRateReader
+from coinarb.replay import Replay
+from coinarb.simclient import install_from_config
+from coinarb.tickfile import TickWriter
 
 
 def main():
@@ -22,6 +32,19 @@ def main():
 
     Options:
       --logging_level LEVEL  [default: INFO]
+      --runtime RUNTIME      thread or async [default: thread]
+      --topology TOPOLOGY    thread, or process to run every feed in its own process [default: thread]
+      --record FILE          write received ticks to FILE, as they arrive before any conversion
+      --replay FILE          replay ticks of FILE in debug mode and exit
+      --latency_log_interval SECONDS  [default: 60]
+      --event_log FILE       write hot path events as JSON lines to FILE
+      --fx_stream            stream fx prices instead of polling them
+      --fx_url URL           oanda api url, e.g. of a local FxStandIn
+      --simulate             trade against in-process simulated exchanges
+      --subscriber_queue SIZE  bounded queue and thread per DataProvider subscriber, 0 calls them on the feed thread [default: 0]
+      --load_test RATE       push synthetic books at RATE per second through DataProvider and the agents, report and exit
+      --load_test_venues N   simulated venues quoting every instrument in the load test [default: 8]
+      --load_test_duration SECONDS  [default: 10]
       --debug
 
     """.format(f=pathlib.Path(sys.argv[0]).name))
@@ -42,9 +65,35 @@ def main():
     #params['logging_level'] = 'DEBUG'
     logging.basicConfig(level=getattr(logging, params['logging_level']),
                         format='%(asctime)s|%(name)s|%(levelname)s: %(msg)s')
-    fx_provider = FxProvider(CONFIG['fx_instruments'])
-    data_provider = DataProvider(fx_provider=fx_provider,
-                                 order_books=CONFIG['instruments'])
+    if params['replay'] or params['load_test']:
+        params['debug'] = True
+    if params['event_log']:
+        eventlog.open(params['event_log'])
+    simulated_exchanges = []
+    order_books = CONFIG['instruments']
+    if params['simulate'] or params['load_test']:
+        if params['topology'] != 'thread':
+            sys.exit('--simulate and --load_test need --topology thread')
+        # must be installed before any StreamClient is made
+        simulated_exchanges = install_from_config(CONFIG)
+    if params['load_test']:
+        order_books = order_books + install_load_venues(CONFIG, params['load_test_venues'])
+    fx_options = dict(stream=params['fx_stream'], api_url=params['fx_url'])
+    feed_processes = None
+    if params['topology'] == 'process' and not params['replay']:
+        if params['record']:
+            sys.exit('--record needs --topology thread')
+        # feeds publish converted books into shared memory, this process only reads them
+        feed_processes = FeedProcesses(CONFIG['instruments'], CONFIG['fx_instruments'], fx_options=fx_options,
+                                       latency_log_interval=params['latency_log_interval'])
+        fx_provider = SharedRateReader(feed_processes.store)
+        data_provider = SharedBookProvider(feed_processes.store, updated=feed_processes.updated,
+                                           dead_keys=feed_processes.dead_keys)
+    else:
+        fx_provider = FxProvider(CONFIG['fx_instruments'], **fx_options)
+        data_provider = DataProvider(fx_provider=fx_provider,
+                                     order_books=order_books,
+                                     subscriber_queue_size=params['subscriber_queue'])
     bitbankcc = agents.bitbankcc.Agent(data_provider, **params)
     quoinex = agents.quoinex.Agent(data_provider, **params)
     agent_list = [bitbankcc, quoinex]
@@ -52,6 +101,67 @@ def main():
         for b in agent_list:
             a.register_agent(b)
 
+    # kill -USR1 <pid> dumps the latency histograms, the opportunity cache and task queue counts on demand
+    def dump_stats(*_):
+        latency.recorder.log()
+        if feed_processes:
+            feed_processes.dump_latency()
+        logging.info('opportunity_cache {}'.format(data_provider.opportunity_cache.stats()))
+        for a in agent_list:
+            logging.info('tasks {} {}'.format(a.name, a.task_stats()))
+
+    signal.signal(signal.SIGUSR1, dump_stats)
+    latency.recorder.start_logging(params['latency_log_interval'])
+
+    if params['load_test']:
+        # agents are not started: only the feed path and their callbacks are measured
+        load_generator = FeedLoadGenerator(data_provider, order_books, params['load_test'],
+                                           mids=CONFIG['simulation']['mids'])
+        try:
+            pprint(load_generator.run(params['load_test_duration']))
+        finally:
+            data_provider.stop_subscribers()
+        return
+
+    if params['replay']:
+        currencies = {currency for a in agent_list for currency in a.config['funds']}
+        balances = {currency: dict(total=math.inf, used=0) for currency in currencies}
+        pprint(Replay(params['replay'], data_provider, agent_list, balances=balances).run())
+        return
+
+    tick_writer = None
+    if params['record']:
+        tick_writer = TickWriter(params['record'])
+        fx_provider.register_callback(tick_writer.on_fx_data)
+        # the raw feed, so a replay goes through the same on_order_book, dropped books included
+        data_provider.register_raw_callback(tick_writer.on_data)
+
+    if feed_processes:
+        feed_processes.start()
+    for exchange in simulated_exchanges:
+        exchange.start()
+    try:
+        run(params, fx_provider, data_provider, bitbankcc, quoinex)
+    finally:
+        for exchange in simulated_exchanges:
+            exchange.stop()
+        if feed_processes:
+            feed_processes.stop()
+        if tick_writer:
+            tick_writer.close()
+    return
+    start_wait_bot(**params)
+
+
+def run(params, fx_provider, data_provider, bitbankcc, quoinex):
+    if params['runtime'] == 'async':
+        runtime = AsyncRuntime(fx_provider, data_provider, [bitbankcc, quoinex])
+        try:
+            runtime.run()
+        finally:
+            runtime.stop()
+        return
+
     try:
         fx_provider.start()
         data_provider.start()
@@ -68,8 +178,6 @@ def main():
         bitbankcc.join()
         data_provider.join()
         fx_provider.join()
-    return
-    start_wait_bot(**params)
 
 
 def start_wait_bot(**params):
@@ -87,3 +195,6 @@ if __name__ == '__main__':
         main()
     except KeyboardInterrupt:
         pass
+    finally:
+        # write the events still queued
+        eventlog.close()
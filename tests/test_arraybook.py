@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from coinarb import utils
+
+np = pytest.importorskip('numpy')
+arraybook = pytest.importorskip('coinarb.arraybook')
+
+
+def random_book(rnd: random.Random, mid: float, depth: int):
+    asks = []
+    price = mid + rnd.randint(-3, 3) / 10
+    for _ in range(depth):
+        asks.append((price, float(rnd.randint(1, 20))))
+        price = round(price + rnd.randint(1, 5) / 10, 1)
+    bids = []
+    price = mid - rnd.randint(-3, 3) / 10
+    for _ in range(depth):
+        bids.append((price, float(rnd.randint(1, 20))))
+        price = round(price - rnd.randint(1, 5) / 10, 1)
+    return asks, bids
+
+
+def test_adjust_asks_bids():
+    cases = [
+        ([], [(9, 10), (8, 20)], 1),
+        ([(10, 10), (11, 20)], [], 1),
+        ([(10, 10), (11, 20)], [(9, 10), (8, 20)], 1),
+        ([(10, 10), (11, 20)], [(10, 10), (8, 20)], 1),
+        ([(10, 10), (11, 20)], [(10, 20), (8, 20)], 1),
+        ([(10, 10), (11, 20), (12, 30)], [(11, 20), (8, 20)], 1.5),
+    ]
+    for asks, bids, rate in cases:
+        expected = utils.adjust_asks_bids(asks, bids, rate)
+        result = arraybook.adjust_asks_bids(asks, bids, rate)
+        assert tuple(map(arraybook.to_list, result)) == expected
+
+    rnd = random.Random(0)
+    for _ in range(200):
+        asks, bids = random_book(rnd, 100, 10)
+        expected = utils.adjust_asks_bids(asks, bids, 1.5)
+        result = arraybook.adjust_asks_bids(asks, bids, 1.5)
+        assert tuple(map(arraybook.to_list, result)) == expected
+
+
+def test_adjust_asks_bids_consumed():
+    asks, bids = arraybook.adjust_asks_bids([(10, 10)], [(11, 5), (10, 10)], 1)
+    assert arraybook.to_list(asks) == []
+    assert arraybook.to_list(bids) == [(10, 5, 10)]
+
+
+def test_calculate_diff():
+    sell = dict(bids=arraybook.to_levels([(12, 1), (11.5, 1), (11, 10), (8, 20)], 1.5))
+    buy = dict(asks=arraybook.to_levels([(10, 10), (11, 20)], 1.5))
+    result = arraybook.calculate_diff(sell, buy, 1, sell_qty_adjustment=5)
+    assert result == utils.calculate_diff(dict(bids=arraybook.to_list(sell['bids'])),
+                                          dict(asks=arraybook.to_list(buy['asks'])), 1, sell_qty_adjustment=5)
+    assert result['qty'] == 7
+
+    sell = dict(bids=arraybook.to_levels([(11, 10), (8, 20)], 1.5))
+    buy = dict(asks=arraybook.to_levels([(8, 1), (9, 2), (10, 10), (11, 20)], 1.5))
+    result = arraybook.calculate_diff(sell, buy, 1, buy_qty_adjustment=5)
+    assert result['buy_price'] == 10
+    assert result['qty'] == 8
+
+    assert arraybook.calculate_diff(dict(bids=arraybook.empty_levels()), buy, 1) is None
+
+    rnd = random.Random(1)
+    for _ in range(200):
+        _, bids = random_book(rnd, 101, 10)
+        asks, _ = random_book(rnd, 99, 10)
+        sell = dict(bids=arraybook.to_levels(bids, 1.5))
+        buy = dict(asks=arraybook.to_levels(asks, 1.5))
+        diff_min = rnd.randint(0, 4)
+        expected = utils.calculate_diff(dict(bids=arraybook.to_list(sell['bids'])),
+                                        dict(asks=arraybook.to_list(buy['asks'])), diff_min)
+        assert arraybook.calculate_diff(sell, buy, diff_min) == expected
+
+
+def test_calculate_diff_adjustment():
+    # the adjustment is subtracted on every step of the walk, not once
+    sell = dict(bids=arraybook.to_levels([(105, 5), (103, 4)], 1))
+    buy = dict(asks=arraybook.to_levels([(100, 4), (101, 4)], 1))
+    result = arraybook.calculate_diff(sell, buy, 2, sell_qty_adjustment=3)
+    assert (result['qty'], result['buy_price']) == (3, 100)
+
+    rnd = random.Random(2)
+    for _ in range(500):
+        _, bids = random_book(rnd, 101, 10)
+        asks, _ = random_book(rnd, 99, 10)
+        sell = dict(bids=arraybook.to_levels(bids, 1.5))
+        buy = dict(asks=arraybook.to_levels(asks, 1.5))
+        diff_min = rnd.randint(0, 4)
+        adjustments = dict(sell_qty_adjustment=rnd.choice([0, rnd.randint(1, 10)]),
+                           buy_qty_adjustment=rnd.choice([0, rnd.randint(1, 10)]))
+        expected = utils.calculate_diff(dict(bids=arraybook.to_list(sell['bids'])),
+                                        dict(asks=arraybook.to_list(buy['asks'])), diff_min, **adjustments)
+        assert arraybook.calculate_diff(sell, buy, diff_min, **adjustments) == expected
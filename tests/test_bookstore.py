@@ -0,0 +1,65 @@
+import threading
+
+from coinarb.bookstore import BookStore
+
+
+def test_bookstore():
+    store = BookStore()
+    empty = store.snapshot()
+    assert len(empty) == 0 and empty.version == 0
+
+    a = dict(asks=[(101, 1, 101)], bids=[(100, 1, 100)])
+    b = dict(asks=[(102, 1, 102)], bids=[(99, 1, 99)])
+    snapshot = store.publish(('quoinex', 'XRP_JPY'), a)
+    assert snapshot is store.snapshot()
+    snapshot = store.publish(('bitbankcc', 'XRP_JPY'), b)
+    assert snapshot.version == 2
+    assert dict(snapshot) == {('quoinex', 'XRP_JPY'): a, ('bitbankcc', 'XRP_JPY'): b}
+    assert snapshot.version_of(('quoinex', 'XRP_JPY')) == 1
+    assert not store.is_stale(snapshot)
+
+    a2 = dict(asks=[(103, 1, 103)], bids=[(98, 1, 98)])
+    store.publish(('quoinex', 'XRP_JPY'), a2)
+    # an older snapshot is never changed by a publish
+    assert snapshot[('quoinex', 'XRP_JPY')] is a
+    assert store.snapshot()[('quoinex', 'XRP_JPY')] is a2
+    assert store.is_stale(snapshot)
+    assert store.is_stale(snapshot, [('quoinex', 'XRP_JPY')])
+    assert not store.is_stale(snapshot, [('bitbankcc', 'XRP_JPY')])
+    assert len(empty) == 0
+
+
+def test_publish_never_goes_back():
+    store = BookStore()
+    key = ('quoinex', 'XRP_JPY')
+    assert store.publish(key, dict(version=2)) is not None
+    assert store.publish(key, dict(version=1)) is None
+    assert store.publish(key, dict(version=2)) is None
+    assert store.snapshot()[key]['version'] == 2
+
+    # the feed thread and the fx thread publish versions of the same book in any interleaving
+    store = BookStore()
+    seen = []
+    done = threading.Event()
+
+    def publish(versions):
+        for version in versions:
+            store.publish(key, dict(version=version))
+
+    def read():
+        while not done.is_set():
+            snapshot = store.snapshot()
+            if key in snapshot:
+                seen.append(snapshot[key]['version'])
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    writers = [threading.Thread(target=publish, args=(range(start, 20000, 2),)) for start in (1, 2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    reader.join()
+    assert store.snapshot()[key]['version'] == 19999
+    assert seen == sorted(seen)
@@ -0,0 +1,39 @@
+from coinarb.conflation import Conflator
+from coinarb.scanner import Scanner
+
+
+def test_conflation():
+    conflator = Conflator()
+    assert conflator.update(('quoinex', 'XRP_JPY'), 1) == 1
+    assert conflator.update(('quoinex', 'XRP_JPY'), 2) is None
+    assert conflator.update(('bitbankcc', 'XRP_JPY'), 3) is None
+    assert conflator.update(('quoinex', 'QASH_JPY'), 4) == 4
+    assert conflator.conflated == 1
+
+    seq, updates = conflator.take('XRP_JPY')
+    assert seq == 4
+    assert updates == {('quoinex', 'XRP_JPY'): 2, ('bitbankcc', 'XRP_JPY'): 3}
+    assert conflator.take('XRP_JPY') == (4, {})
+    assert conflator.get(('quoinex', 'XRP_JPY')) == (2, 2)
+
+    assert not conflator.is_stale('XRP_JPY', seq)
+    assert conflator.update(('bitbankcc', 'XRP_JPY'), 5) == 5
+    assert conflator.is_stale('XRP_JPY', seq)
+    assert not conflator.is_stale('XRP_JPY', seq, [('quoinex', 'XRP_JPY')])
+    assert conflator.is_stale('XRP_JPY', seq, [('bitbankcc', 'XRP_JPY')])
+
+
+def test_release_keeps_changed():
+    conflator = Conflator()
+    scanner = Scanner('XRP_JPY', 1)
+    assert conflator.update(('quoinex', 'XRP_JPY'), dict(asks=[(13, 1, 13)], bids=[(12, 2, 12)])) == 1
+    # the only update of quoinex expires in the queue
+    conflator.release('XRP_JPY')
+    assert conflator.update(('bitbankcc', 'XRP_JPY'), dict(asks=[(10, 5, 10)], bids=[(9, 5, 9)])) == 2
+    _, updates = conflator.take('XRP_JPY')
+    assert list(updates) == [('quoinex', 'XRP_JPY'), ('bitbankcc', 'XRP_JPY')]
+    results = []
+    for (exchange, _), order_book in updates.items():
+        results = scanner.update(exchange, order_book)
+    # bitbankcc is scanned against the newest book of quoinex
+    assert [(x['sell_exchange'], x['buy_exchange']) for x in results] == [('quoinex', 'bitbankcc')]
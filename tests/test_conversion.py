@@ -0,0 +1,31 @@
+from coinarb.conversion import ConversionGraph
+
+
+def test_conversion_graph():
+    now = [100.0]
+    graph = ConversionGraph('JPY', max_age=30, clock=lambda: now[0])
+    assert graph.get_rate('JPY') == 1
+    assert graph.get_rate('USD') is None
+
+    assert graph.update('USD_JPY', 110.0, 100.0) == {'USD'}
+    assert graph.get_rate('USD') == 110.0
+    assert graph.update('EUR_USD', 1.2, 100.0) == {'EUR'}
+    assert graph.get_rate('EUR') == 110.0 * 1.2
+    assert graph.update('QASH_USD', 2.0, 100.0) == {'QASH'}
+    assert graph.update('BTC_JPY', 1000000.0, 100.0) == {'BTC'}
+    # QASH already reaches JPY through USD in as many hops, the new edge changes nothing
+    assert graph.update('QASH_BTC', 0.0002, 100.0) == set()
+    assert graph.get_rate('QASH') == 220.0
+
+    # only the currencies below the edge are recomputed
+    assert graph.update('USD_JPY', 111.0, 101.0) == {'USD', 'EUR', 'QASH'}
+    assert graph.get_rate('EUR') == 111.0 * 1.2
+    assert graph.get_rate('BTC') == 1000000.0
+    assert graph.update('QASH_BTC', 0.0003, 101.0) == set()
+
+    now[0] = 130.5
+    assert graph.get_rate('BTC') is None
+    assert graph.get_rate('USD') == 111.0
+    assert graph.get_rate('EUR') is None
+    assert graph.update('EUR_USD', 1.2, 130.0) == {'EUR'}
+    assert graph.get_rate('EUR') == 111.0 * 1.2
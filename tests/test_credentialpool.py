@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('coinlib')
+from coinarb.credentialpool import CredentialPool  # noqa: E402
+
+
+class Client:
+    def __init__(self, credential: dict):
+        self.credential = credential
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(n: int, **kwargs) -> CredentialPool:
+    return CredentialPool([dict(api_key=str(i)) for i in range(n)], client_factory=Client, **kwargs)
+
+
+def test_lease_takes_warm_client():
+    pool = make_pool(2)
+    with pool.lease() as client:
+        first = client
+    with pool.lease() as client:
+        # the most recently used client, not a new connection
+        assert client is first
+        with pool.lease() as other:
+            assert other is not first
+            assert other.credential != first.credential
+
+
+def test_lease_reconnects_after_connection_error():
+    pool = make_pool(1)
+    with pool.lease() as client:
+        first = client
+    with pytest.raises(OSError):
+        with pool.lease():
+            raise OSError('connection reset')
+    assert first.closed
+    with pool.lease() as client:
+        assert client is not first
+        assert not client.closed
+
+
+def test_keep_alive_reconnects_failed_clients():
+    checked = []
+
+    def health_check(client):
+        checked.append(client.credential['api_key'])
+        if client.credential['api_key'] == '0':
+            raise OSError('stale')
+
+    pool = make_pool(2, health_check=health_check, keep_alive_interval=0)
+    with pool.lease() as client_a:
+        with pool.lease() as client_b:
+            pass
+    clients = {client_a.credential['api_key']: client_a, client_b.credential['api_key']: client_b}
+    time.sleep(0.01)
+    pool.keep_alive()
+    assert sorted(checked) == ['0', '1']
+    assert clients['0'].closed
+    assert not clients['1'].closed
+
+
+def test_keep_alive_never_blocks_lease():
+    checking = threading.Event()
+    release = threading.Event()
+
+    def health_check(_):
+        checking.set()
+        release.wait(5)
+
+    # a single idle client is the last free one, it is not taken for a health check
+    pool = make_pool(1, health_check=health_check, keep_alive_interval=0)
+    with pool.lease():
+        pass
+    time.sleep(0.01)
+    pool.keep_alive()
+    assert not checking.is_set()
+
+    # with two, one is checked while a lease still gets the other at once
+    pool = make_pool(2, health_check=health_check, keep_alive_interval=0)
+    with pool.lease():
+        with pool.lease():
+            pass
+    time.sleep(0.01)
+    thread = threading.Thread(target=pool.keep_alive)
+    thread.start()
+    assert checking.wait(5)
+    start = time.time()
+    with pool.lease() as client:
+        assert client is not None
+    assert time.time() - start < 1
+    release.set()
+    thread.join()
@@ -0,0 +1,41 @@
+import pytest
+
+from coinarb.cycles import CycleDetector
+
+
+def book(instrument, asks, bids):
+    return dict(instrument=instrument, asks=[(price, qty, price) for price, qty in asks],
+                bids=[(price, qty, price) for price, qty in bids])
+
+
+def test_cycles():
+    detector = CycleDetector(0.001)
+    assert detector.update('quoinex', book('QASH_JPY', [(101, 100)], [(100, 100)])) == []
+    assert detector.update('quoinex', book('QASH_USD', [(0.95, 100)], [(0.94, 100)])) == []
+    # JPY -> QASH -> USD -> JPY = 1 / 101 * 0.94 * 110 = 1.0238
+    opportunities = detector.update('oanda', book('USD_JPY', [(110.1, 10)], [(110, 10)]))
+    assert len(opportunities) == 1
+    opportunity = opportunities[0]
+    assert opportunity['currency'] == 'JPY'
+    assert [(leg['instrument'], leg['side']) for leg in opportunity['legs']] == [
+        ('QASH_JPY', 'BUY'), ('QASH_USD', 'SELL'), ('USD_JPY', 'SELL')]
+    # depth: 10 USD on the USD_JPY bids is the bottleneck, 10 / 0.94 QASH at 101 JPY
+    assert opportunity['amount'] == pytest.approx(10 / 0.94 * 101, rel=1e-6)
+    assert opportunity['output'] == pytest.approx(1100, rel=1e-6)
+    assert opportunity['profit_rate'] == pytest.approx(110 * 0.94 / 101 - 1, rel=1e-6)
+
+    # a deeper second level that is not profitable does not change the size
+    opportunities = detector.update('oanda', book('USD_JPY', [(110.1, 10)], [(110, 10), (100, 1000)]))
+    assert opportunities[0]['output'] == pytest.approx(1100, rel=1e-4)
+
+    detector.remove('oanda', 'USD_JPY')
+    assert detector.update('quoinex', book('QASH_JPY', [(101, 100)], [(100, 100)])) == []
+
+
+def test_cycles_amount_max():
+    detector = CycleDetector(0.001, amount_max=dict(JPY=101))
+    detector.update('quoinex', book('QASH_JPY', [(101, 100)], [(100, 100)]))
+    detector.update('quoinex', book('QASH_USD', [(0.95, 100)], [(0.94, 100)]))
+    opportunity = detector.update('oanda', book('USD_JPY', [(110.1, 10)], [(110, 10)]))[0]
+    assert opportunity['amount'] == 101
+    assert [leg['qty'] for leg in opportunity['legs']] == pytest.approx([1, 1, 0.94])
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip('coinlib')
+from coinarb.dataprovider import DataProvider  # noqa: E402
+from coinarb.fxprovider import FxProvider  # noqa: E402
+
+
+def test_conversion_edges_and_reconvert():
+    data_provider = DataProvider([('quoinex', 'XRP_JPY'), ('quoinex', 'QASH_USD')], fx_provider=FxProvider([]))
+    dispatched = []
+    data_provider.register_callback(lambda exchange, key, order_book: dispatched.append((key[1], order_book)))
+    key = ('order_book', 'XRP_JPY')
+    data_provider.on_order_book('quoinex', key, dict(instrument='XRP_JPY', asks=[(101, 1)], bids=[(99, 1)]))
+    # no book is quoted in XRP, its mid is not an edge
+    assert data_provider.conversion.get_rate('XRP') is None
+    assert [instrument for instrument, _ in dispatched] == ['XRP_JPY']
+
+    data_provider.on_order_book('quoinex', ('order_book', 'QASH_USD'),
+                                dict(instrument='QASH_USD', asks=[(1.1, 1)], bids=[(0.9, 1)]))
+    assert len(dispatched) == 1
+    # a USD rate converts and dispatches only the books quoted in USD
+    data_provider.on_fx_data('oanda', ('tick', 'USD_JPY'), dict(instrument='USD_JPY', mid=110.0,
+                                                               timestamp=data_provider.clock()))
+    assert [instrument for instrument, _ in dispatched] == ['XRP_JPY', 'QASH_USD']
+    assert dispatched[-1][1]['asks'] == [(1.1 * 110, 1, 1.1)]
+
+
+def test_opportunity_cache_per_provider():
+    # book versions restart at 1 in every provider, their evaluations must not meet
+    first = DataProvider([], fx_provider=FxProvider([]))
+    second = DataProvider([], fx_provider=FxProvider([]))
+    assert first.opportunity_cache is not second.opportunity_cache
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from coinarb.depthindex import DepthIndex, optimal_size, required_fund
+
+
+def levels(prices_qtys):
+    return [(price, qty, price) for price, qty in prices_qtys]
+
+
+def brute_force(bids, asks, sell_fee, buy_fee, diff_min):
+    """walk one unit at a time while the unit still earns diff_min"""
+    units = []
+    for sell_jpy, sell_qty, _ in bids:
+        units += [sell_jpy] * int(sell_qty)
+    buys = []
+    for buy_jpy, buy_qty, _ in asks:
+        buys += [buy_jpy] * int(buy_qty)
+    qty = 0
+    profit = 0
+    for sell_jpy, buy_jpy in zip(units, buys):
+        if sell_jpy * (1 - sell_fee) - buy_jpy * (1 + buy_fee) < diff_min:
+            break
+        qty += 1
+        profit += sell_jpy * (1 - sell_fee) - buy_jpy * (1 + buy_fee)
+    return qty, profit
+
+
+def test_optimal_size():
+    bids = levels([(105, 2), (104, 3), (101, 5)])
+    asks = levels([(100, 1), (102, 4), (104.5, 10)])
+    index = DepthIndex(levels([(106, 1)]), bids)
+    assert index.bids.notional(3.5) == 105 * 2 + 104 * 1.5
+    result = optimal_size(index.bids, DepthIndex(asks, []).asks)
+    # units: 105/100, 105/102, 104/102, 104/102, 104/102, then 101/104.5 loses
+    assert result['qty'] == 5
+    assert result['sell_price'] == 104 and result['buy_price'] == 102
+    assert result['profit'] == pytest.approx(105 * 2 + 104 * 3 - 100 - 102 * 4)
+    assert result['sell_average'] == pytest.approx((105 * 2 + 104 * 3) / 5)
+
+    result = optimal_size(index.bids, DepthIndex(asks, []).asks, diff_min=2.5)
+    assert result['qty'] == 2
+    result = optimal_size(index.bids, DepthIndex(asks, []).asks, sell_fee=0.01, buy_fee=0.01)
+    # 105 * 0.99 - 102 * 1.01 = 0.93, 104 * 0.99 - 102 * 1.01 = -0.06
+    assert result['qty'] == 2
+    assert result['fees'] == pytest.approx((105 * 2) * 0.01 + (100 + 102) * 0.01)
+    assert optimal_size(index.bids, DepthIndex(asks, []).asks, qty_max=1.5)['qty'] == 1.5
+    assert optimal_size(index.bids, DepthIndex(levels([(106, 1)]), []).asks) is None
+    assert required_fund('SELL', 2, 100, 0.01) == 2
+    assert required_fund('BUY', 2, 100, 0.01) == pytest.approx(202)
+
+
+def test_optimal_size_random():
+    r = random.Random(0)
+    for _ in range(200):
+        bids = levels(sorted([(r.randint(90, 110), r.randint(1, 5)) for _ in range(r.randint(1, 8))],
+                             reverse=True))
+        asks = levels(sorted([(r.randint(90, 110), r.randint(1, 5)) for _ in range(r.randint(1, 8))]))
+        fee = r.choice([0, 0.001, 0.01])
+        diff_min = r.choice([0, 1, 3])
+        qty, profit = brute_force(bids, asks, fee, fee, diff_min)
+        result = optimal_size(DepthIndex([], bids).bids, DepthIndex(asks, []).asks, sell_fee=fee, buy_fee=fee,
+                              diff_min=diff_min)
+        if not qty:
+            assert result is None
+            continue
+        assert result['qty'] == qty
+        assert result['profit'] == pytest.approx(profit)
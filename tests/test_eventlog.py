@@ -0,0 +1,57 @@
+import json
+import logging
+
+from coinarb.eventlog import EventLog
+
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError('formatted')
+
+
+def test_json_lines(tmpdir):
+    path = str(tmpdir.join('events.jsonl'))
+    logger = logging.getLogger('test_eventlog')
+    logger.setLevel(logging.INFO)
+    eventlog = EventLog()
+    eventlog.open(path)
+    eventlog.info(logger, 'signal', diff=1.5, qty=10)
+    eventlog.debug(logger, 'ignored', value=Unformattable())
+    eventlog.close()
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 1
+    assert lines[0]['event'] == 'signal'
+    assert lines[0]['level'] == 'INFO'
+    assert lines[0]['logger'] == 'test_eventlog'
+    assert (lines[0]['diff'], lines[0]['qty']) == (1.5, 10)
+
+
+def test_logger(caplog):
+    logger = logging.getLogger('test_eventlog')
+    logger.setLevel(logging.INFO)
+    eventlog = EventLog()
+    with caplog.at_level(logging.INFO, 'test_eventlog'):
+        eventlog.info(logger, 'reserved', currency='JPY', qty=1)
+        eventlog.close()
+    assert caplog.messages == ['reserved {"currency": "JPY", "qty": 1}']
+
+
+def test_reserved_and_shared_fields(tmpdir):
+    path = str(tmpdir.join('events.jsonl'))
+    logger = logging.getLogger('test_eventlog')
+    logger.setLevel(logging.INFO)
+    eventlog = EventLog()
+    eventlog.open(path)
+    execution = dict(timestamp=1.0, event='fill', logger='venue', tiers=[dict(diff=1)])
+    # fields named like the keys of the line neither raise nor overwrite them
+    eventlog.info(logger, 'execution', **execution)
+    # a result shared with a cache changes after it was logged
+    execution['tiers'][0]['diff'] = 2
+    eventlog.close()
+    with open(path) as f:
+        line = json.loads(f.readline())
+    assert (line['event'], line['logger']) == ('execution', 'test_eventlog')
+    assert line['timestamp'] != 1.0
+    assert (line['data_timestamp'], line['data_event'], line['data_logger']) == (1.0, 'fill', 'venue')
+    assert line['tiers'] == [dict(diff=1)]
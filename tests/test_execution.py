@@ -0,0 +1,90 @@
+import pytest
+
+from coinarb.execution import ExecutionHalted, Leg, OrderStateUnknown, TwoLegExecutor
+from coinarb.fundmanager import FundManager
+
+
+class FakeAgent:
+    def __init__(self, name: str, fill_ratio: float):
+        self.name = name
+        self.fill_ratio = fill_ratio
+        self.fund_manager = FundManager(name)
+        self.fund_manager.update_balances(dict(JPY=dict(total=10 ** 9, used=0), XRP=dict(total=10 ** 6, used=0)))
+        self.orders = []
+
+    def round_qty(self, _: str, qty: float) -> float:
+        return round(qty, 4)
+
+    def submit_order(self, instrument, order_type, side, price, qty, *, condition='fak', fund):
+        qty = qty * self.fill_ratio if order_type == 'limit' else qty
+        self.orders.append((instrument, order_type, side, price, qty))
+        self.fund_manager.apply_fund(fund)
+        return dict(qty=qty, price_executed_average=price)
+
+
+def test_execute():
+    seller = FakeAgent('quoinex', 0.5)
+    buyer = FakeAgent('bitbankcc', 1)
+    executor = TwoLegExecutor()
+    with seller.fund_manager.reserve_fund('XRP', 10) as sell_fund:
+        with buyer.fund_manager.reserve_fund('JPY', 1000) as buy_fund:
+            report = executor.execute([Leg(seller, 'XRP_JPY', 'limit', 'SELL', 51, 10, sell_fund),
+                                       Leg(buyer, 'XRP_JPY', 'market', 'BUY', 50, 10, buy_fund)])
+    executor.shutdown()
+    assert [leg['qty'] for leg in report['legs']] == [5, 10]
+    assert all(leg['latency'] >= 0 for leg in report['legs'])
+    assert report['hedge']['exchange'] == 'quoinex'
+    assert report['hedge']['side'] == 'SELL'
+    assert report['hedge']['qty'] == 5
+    assert seller.orders[-1] == ('XRP_JPY', 'market', 'SELL', 51, 5)
+
+
+class FailingAgent(FakeAgent):
+    def __init__(self, name: str, error: Exception, order: dict = None):
+        super().__init__(name, 1)
+        self.error = error
+        self.order = order
+
+    def submit_order(self, instrument, order_type, side, price, qty, *, condition='fak', fund):
+        self.orders.append((instrument, order_type, side, price, qty))
+        raise self.error
+
+    def get_order(self, order: dict) -> dict:
+        assert order['id'] == self.order['id']
+        return self.order
+
+
+def execute(seller, buyer, executor):
+    with seller.fund_manager.reserve_fund('XRP', 10) as sell_fund:
+        with buyer.fund_manager.reserve_fund('JPY', 1000) as buy_fund:
+            return executor.execute([Leg(seller, 'XRP_JPY', 'limit', 'SELL', 51, 10, sell_fund),
+                                     Leg(buyer, 'XRP_JPY', 'market', 'BUY', 50, 10, buy_fund)])
+
+
+def test_failed_leg_is_queried():
+    # the wait failed but the order had filled 10 of 10, nothing is left to hedge
+    seller = FailingAgent('quoinex', OrderStateUnknown(dict(id=7)),
+                          dict(id=7, state='FILLED', qty_executed=10, price_executed_average=51))
+    buyer = FakeAgent('bitbankcc', 1)
+    executor = TwoLegExecutor()
+    report = execute(seller, buyer, executor)
+    executor.shutdown()
+    assert report['legs'][0]['qty'] == 10
+    assert report['hedge'] is None
+    assert len(seller.orders) == 1
+
+
+def test_unknown_fill_halts():
+    seller = FailingAgent('quoinex', ConnectionError('timeout'))
+    buyer = FakeAgent('bitbankcc', 1)
+    executor = TwoLegExecutor()
+    report = execute(seller, buyer, executor)
+    # the seller may have filled: no market order for the full qty on the same venue
+    assert report['hedge'] is None
+    assert len(seller.orders) == 1
+    assert executor.halted
+    with pytest.raises(ExecutionHalted):
+        execute(seller, buyer, executor)
+    executor.resume()
+    assert not executor.halted
+    executor.shutdown()
@@ -0,0 +1,41 @@
+import multiprocessing
+
+import pytest
+
+pytest.importorskip('coinlib')
+from coinarb.feedprocess import SharedBookProvider, SharedBookPublisher  # noqa: E402
+from coinarb.shmbook import SharedBookStore  # noqa: E402
+
+
+def test_dead_worker_marks_books_stale():
+    keys = [('quoinex', 'XRP_JPY'), ('bitbankcc', 'XRP_JPY')]
+    store = SharedBookStore(keys, depth=2)
+    try:
+        updated = multiprocessing.Event()
+        dead = []
+        provider = SharedBookProvider(store, updated=updated, dead_keys=lambda: dead)
+        books = []
+        provider.register_callback(lambda exchange, key, order_book: books.append((exchange, order_book)))
+        publisher = SharedBookPublisher(store, updated)
+
+        publisher.on_data('quoinex', ('order_book', 'XRP_JPY'),
+                          dict(version=1, asks=[(101.0, 1.0, 101.0)], bids=[(100.0, 1.0, 100.0)]))
+        assert updated.is_set()
+        assert provider.poll() == 1
+        assert not updated.is_set()
+        assert provider.poll() == 0
+
+        dead.append(('quoinex', 'XRP_JPY'))
+        provider.watch()
+        provider.watch()
+        assert len(books) == 2
+        exchange, order_book = books[-1]
+        assert exchange == 'quoinex' and order_book['stale']
+        assert order_book['asks'] == order_book['bids'] == []
+        assert provider.book_store.snapshot()[('quoinex', 'XRP_JPY')] is order_book
+        # whatever is left in the slot of a dead worker is not dispatched again
+        store.write(('quoinex', 'XRP_JPY'), dict(version=2, asks=[], bids=[]))
+        assert provider.poll() == 0
+    finally:
+        store.close()
+        store.unlink()
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from coinarb.fundmanager import FundManager, InsufficientFund, reserve_funds
+
+
+def make_fund_manager(exchange: str, **totals) -> FundManager:
+    fund_manager = FundManager(exchange)
+    fund_manager.update_balances({currency: dict(total=total, used=0) for currency, total in totals.items()})
+    for currency in totals:
+        fund_manager.balances[currency].locked = 0
+    return fund_manager
+
+
+def test_reserve_release():
+    fund_manager = make_fund_manager('quoinex', JPY=100)
+    fund = fund_manager.reserve_fund('JPY', 60)
+    assert fund_manager.has(fund)
+    assert fund_manager.balances['JPY'].free == 40
+    with pytest.raises(InsufficientFund):
+        fund_manager.reserve_fund('JPY', 50)
+    fund.release()
+    fund.release()
+    assert fund_manager.balances['JPY'].free == 100
+
+    with fund_manager.reserve_fund('JPY', 10) as fund:
+        fund_manager.apply_fund(fund)
+    assert fund_manager.balances['JPY'].total == 90
+    assert fund_manager.balances['JPY'].reserved == 0
+
+
+def test_reserve_funds():
+    quoinex = make_fund_manager('quoinex', XRP=10)
+    bitbankcc = make_fund_manager('bitbankcc', JPY=100)
+    with pytest.raises(InsufficientFund):
+        reserve_funds([(quoinex, 'XRP', 5), (bitbankcc, 'JPY', 200)])
+    assert quoinex.balances['XRP'].reserved == 0
+
+    sell_fund, buy_fund = reserve_funds([(quoinex, 'XRP', 5), (bitbankcc, 'JPY', 50)])
+    assert (sell_fund.owner, buy_fund.owner) == (quoinex, bitbankcc)
+    assert quoinex.balances['XRP'].free == 5
+    assert bitbankcc.balances['JPY'].free == 50
+
+
+def test_reserve_concurrently():
+    quoinex = make_fund_manager('quoinex', XRP=10 ** 6)
+    bitbankcc = make_fund_manager('bitbankcc', JPY=10 ** 6)
+
+    def run(requests):
+        for _ in range(1000):
+            for fund in reserve_funds(requests):
+                fund.release()
+
+    threads = [threading.Thread(target=run, args=([(quoinex, 'XRP', 1), (bitbankcc, 'JPY', 1)],)),
+               threading.Thread(target=run, args=([(bitbankcc, 'JPY', 1), (quoinex, 'XRP', 1)],))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert quoinex.balances['XRP'].reserved == 0
+    assert bitbankcc.balances['JPY'].reserved == 0
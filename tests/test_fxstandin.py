@@ -0,0 +1,23 @@
+import json
+import urllib.request
+
+from coinarb.fxstandin import FxStandIn
+from coinarb.isotime import parse_timestamp
+
+
+def test_fxstandin():
+    with FxStandIn(dict(USD_JPY=(110.0, 110.02)), interval=0.01) as stand_in:
+        with urllib.request.urlopen(stand_in.url + '/v1/prices?instruments=USD_JPY') as res:
+            prices = json.loads(res.read().decode())['prices']
+        assert [(p['instrument'], p['bid'], p['ask']) for p in prices] == [('USD_JPY', 110.0, 110.02)]
+        assert parse_timestamp(prices[0]['time']) > 0
+
+        with urllib.request.urlopen(stand_in.url + '/v1/prices?accountId=1&instruments=USD_JPY') as res:
+            ticks = []
+            while len(ticks) < 2:
+                data = json.loads(res.readline().decode())
+                if 'tick' in data:
+                    ticks.append(data['tick'])
+                    stand_in.set_price('USD_JPY', 111.0, 111.02)
+        assert ticks[0]['bid'] == 110.0
+        assert ticks[1]['bid'] == 111.0
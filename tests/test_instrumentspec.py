@@ -0,0 +1,27 @@
+from coinarb.instrumentspec import InstrumentSpec, compile_specs
+
+
+def test_round():
+    spec = InstrumentSpec('bitbankcc', 'XRP_JPY', 3, 4)
+    assert spec.to_ticks(0.29) == 290
+    assert spec.round_price(1.0299) == 1.029
+    assert spec.round_price(0.29) == 0.29
+    assert spec.inc_dec_price(0.29, 1) == 0.291
+    assert spec.inc_dec_price(0.29, -1) == 0.289
+    assert spec.to_lots(1.00005) == 10000
+    assert spec.round_qty(4.35) == 4.35
+    assert spec.inc_dec_qty(4.35, -1) == 4.3499
+    assert spec.to_ticks(-0.29) == -290
+    # feed levels round to the nearest feed unit instead
+    assert spec.to_feed_price(1.0299) == 102990000
+    assert spec.from_feed_qty(spec.to_feed_qty(0.00005)) == 0.00005
+
+
+def test_compile_specs():
+    specs = compile_specs({
+        'quoinex': {'precisions': {'XRP_JPY': dict(price=5, qty=6)}},
+        'bitbankcc': {'funds': {}},
+        'instruments': [('quoinex', 'XRP_JPY')],
+    })
+    assert list(specs) == [('quoinex', 'XRP_JPY')]
+    assert specs[('quoinex', 'XRP_JPY')].price_scale == 10 ** 5
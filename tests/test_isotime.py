@@ -0,0 +1,15 @@
+import datetime
+
+from coinarb.isotime import format_timestamp, parse_timestamp
+
+
+def test_parse_timestamp():
+    expected = datetime.datetime(2013, 9, 16, 18, 59, 3, 687308, tzinfo=datetime.timezone.utc).timestamp()
+    assert abs(parse_timestamp('2013-09-16T18:59:03.687308Z') - expected) < 1e-6
+    assert abs(parse_timestamp('2013-09-16T18:59:03.687308+00:00') - expected) < 1e-6
+    assert parse_timestamp('2013-09-16T18:59:03Z') == int(expected)
+    assert parse_timestamp('2013-09-16T18:59:03.5Z') == int(expected) + 0.5
+    # not the fixed format, parsed by datetime
+    assert parse_timestamp('2013-09-16T19:59:03+01:00') == int(expected)
+    assert parse_timestamp('2013-09-16 18:59:03') == int(expected)
+    assert abs(parse_timestamp(format_timestamp(expected)) - expected) < 1e-6
@@ -0,0 +1,26 @@
+from coinarb import latency
+
+
+def test_histogram():
+    histogram = latency.Histogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1000)
+    assert histogram.count == 1000
+    assert histogram.min == 1000
+    assert histogram.max == 1000000
+    for p in (50, 90, 99):
+        assert abs(histogram.percentile(p) - p / 100) <= p / 100 * 0.01
+    assert histogram.percentile(100) == 1
+    assert latency.Histogram().to_dict() == dict(count=0)
+
+
+def test_recorder():
+    recorder = latency.LatencyRecorder()
+    recorder.record(latency.FEED, 'quoinex', 'XRP_JPY', 0.001)
+    recorder.record(latency.FEED, 'quoinex', 'XRP_JPY', 0.003)
+    assert recorder.record_since(latency.QUEUE, 'quoinex', '*', 0) > 0
+    dump = recorder.dump(reset=True)
+    assert list(dump) == ['feed|quoinex|XRP_JPY']
+    assert dump['feed|quoinex|XRP_JPY']['count'] == 2
+    assert dump['feed|quoinex|XRP_JPY']['mean'] == 0.002
+    assert recorder.dump() == {}
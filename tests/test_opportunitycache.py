@@ -0,0 +1,41 @@
+from coinarb import utils
+from coinarb.opportunitycache import OpportunityCache
+from coinarb.scanner import Scanner
+
+
+def test_opportunity_cache():
+    cache = OpportunityCache(maxsize=2)
+    calls = []
+
+    def compute(x):
+        calls.append(x)
+        return x * 10
+
+    assert cache.get_or_compute('a', lambda: compute(1)) == 10
+    assert cache.get_or_compute('a', lambda: compute(2)) == 10
+    assert cache.get_or_compute('b', lambda: compute(3)) == 30
+    assert cache.get_or_compute('a', lambda: compute(4)) == 10
+    # b is the least recently used
+    assert cache.get_or_compute('c', lambda: compute(5)) == 50
+    assert cache.get_or_compute('b', lambda: compute(6)) == 60
+    assert calls == [1, 3, 5, 6]
+    assert cache.stats() == dict(size=2, hits=2, misses=4, evictions=2, hit_rate=2 / 6)
+
+
+def test_scanner_cache():
+    def make_order_book(asks, bids, version):
+        asks, bids = utils.adjust_asks_bids(asks, bids, 1)
+        return dict(asks=asks, bids=bids, version=version)
+
+    cache = OpportunityCache()
+    scanners = [Scanner('XRP_JPY', 1, cache=cache) for _ in range(2)]
+    for scanner in scanners:
+        scanner.update('a', make_order_book([(10, 1)], [(8, 10)], 1))
+        results = scanner.update('b', make_order_book([(20, 10)], [(14, 1)], 1))
+        assert [(x['sell_exchange'], x['buy_exchange'], x['qty']) for x in results] == [('b', 'a', 1)]
+    # the second agent evaluated the same versions
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    results = scanners[0].update('b', make_order_book([(20, 10)], [(15, 1)], 2))
+    assert results[0]['diff'] == 5
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,121 @@
+import random
+
+from coinarb import utils
+from coinarb.instrumentspec import InstrumentSpec
+from coinarb.orderbook import OrderBook
+
+
+def test_apply_snapshot():
+    book = OrderBook('bitbankcc', 'XRP_JPY')
+    version = book.apply_snapshot(dict(instrument='XRP_JPY', timestamp=1,
+                                       asks=[(10, 10), (11, 20)], bids=[(10, 20), (8, 20)]))
+    assert version == 1
+    converted = book.to_dict()
+    assert converted['version'] == 1
+    assert converted['timestamp'] == 1
+    assert converted['asks'] == [(11, 20, 11)]
+    assert converted['bids'] == [(10, 10, 10), (8, 20, 8)]
+
+    book.apply_deltas(bids=[(10, 0)], timestamp=2)
+    converted = book.to_dict()
+    assert converted['version'] == 2
+    assert converted['timestamp'] == 2
+    assert converted['asks'] == [(10, 10, 10), (11, 20, 11)]
+    assert converted['bids'] == [(8, 20, 8)]
+
+    book.set_rate(1.5)
+    converted = book.to_dict()
+    assert converted['version'] == 3
+    assert converted['asks'] == [(10 * 1.5, 10, 10), (11 * 1.5, 20, 11)]
+
+
+def test_apply_snapshot_random():
+    rnd = random.Random(0)
+    book = OrderBook('quoinex', 'XRP_JPY', rate=1.5)
+    for _ in range(200):
+        asks = sorted({100 + rnd.randint(-3, 20) / 10: float(rnd.randint(1, 20)) for _ in range(10)}.items())
+        bids = sorted({100 - rnd.randint(-3, 20) / 10: float(rnd.randint(1, 20)) for _ in range(10)}.items(),
+                      reverse=True)
+        book.apply_snapshot(dict(instrument='XRP_JPY', asks=asks, bids=bids))
+        converted = book.to_dict()
+        try:
+            expected = utils.adjust_asks_bids(asks, bids, 1.5)
+        except (StopIteration, RuntimeError):
+            continue
+        assert (converted['asks'], converted['bids']) == expected
+
+
+def test_apply_snapshot_spec():
+    book = OrderBook('bitbankcc', 'XRP_JPY', spec=InstrumentSpec('bitbankcc', 'XRP_JPY', 1, 0))
+    book.apply_snapshot(dict(instrument='XRP_JPY', asks=[(10.1, 10)], bids=[(9.9, 5)]))
+    version = book.version
+    # float noise of the same levels is no change
+    book.apply_snapshot(dict(instrument='XRP_JPY', asks=[(10.1000000001, 10.2)], bids=[(9.9, 5)]))
+    converted = book.to_dict()
+    assert converted['version'] == version + 1
+    # order precision is not applied to the feed: the qty below a lot is kept
+    assert converted['asks'] == [(10.1, 10.2, 10.1)]
+
+
+def test_feed_precision_keeps_levels():
+    book = OrderBook('bitbankcc', 'XRP_JPY', spec=InstrumentSpec('bitbankcc', 'XRP_JPY', 1, 0))
+    book.apply_snapshot(dict(instrument='XRP_JPY', asks=[(10.05, 0.5), (10.2, 3)], bids=[(10.01, 2)]))
+    converted = book.to_dict()
+    # truncating to ticks would make the ask 10.0 and cross the bid, and drop its 0.5
+    assert converted['asks'] == [(10.05, 0.5, 10.05), (10.2, 3, 10.2)]
+    assert converted['bids'] == [(10.01, 2, 10.01)]
+
+
+def test_apply_delta_message():
+    book = OrderBook('bitbankcc', 'XRP_JPY')
+    book.apply(dict(instrument='XRP_JPY', asks=[(11, 20), (12, 5)], bids=[(10, 10)]))
+    book.apply(dict(instrument='XRP_JPY', delta=True, asks=[(12, 0), (11.5, 3)], timestamp=2))
+    converted = book.to_dict()
+    assert converted['asks'] == [(11, 20, 11), (11.5, 3, 11.5)]
+    assert converted['bids'] == [(10, 10, 10)]
+    assert 'delta' not in converted
+    assert book.mid() == 10.5
+
+
+def test_to_dict_shares_unchanged_side():
+    book = OrderBook('bitbankcc', 'XRP_JPY')
+    book.apply(dict(instrument='XRP_JPY', asks=[(11, 20), (12, 5)], bids=[(10, 10), (9, 5)]))
+    first = book.to_dict()
+    book.apply_deltas(bids=[(9, 7)])
+    second = book.to_dict()
+    assert second['asks'] is first['asks']
+    assert second['depth'].asks is first['depth'].asks
+    # the published list is never changed by later updates
+    assert first['bids'] == [(10, 10, 10), (9, 5, 9)]
+    assert second['bids'] == [(10, 10, 10), (9, 7, 9)]
+    assert second['depth'].bids.cum_qty == [10, 17]
+
+
+def test_full_book_changes():
+    spec = InstrumentSpec('quoinex', 'XRP_JPY', 3, 4)
+    rnd = random.Random(1)
+    book = OrderBook('quoinex', 'XRP_JPY', rate=1.5, spec=spec)
+    asks = [(100 + i / 100, float(rnd.randint(1, 20))) for i in range(1, 21)]
+    bids = [(100 - i / 100, float(rnd.randint(1, 20))) for i in range(20)]
+    for i in range(300):
+        if i % 50 == 0:
+            # a side that mostly changed is rebuilt
+            asks = [(price + 0.05, qty) for price, qty in asks]
+        j = rnd.randrange(len(bids))
+        if rnd.random() < 0.2:
+            del bids[j]
+            bids.append((bids[-1][0] - 0.01, 1.0))
+        else:
+            bids[j] = (bids[j][0], float(rnd.randint(1, 20)))
+        if i % 30 == 0:
+            book.apply(dict(instrument='XRP_JPY', delta=True, bids=[(bids[0][0], 7.0)]))
+            bids[0] = (bids[0][0], 7.0)
+        previous = book.to_dict()
+        book.apply_snapshot(dict(instrument='XRP_JPY', asks=list(asks), bids=list(bids)))
+        converted = book.to_dict()
+        expected = OrderBook('quoinex', 'XRP_JPY', rate=1.5, spec=spec)
+        expected.apply_snapshot(dict(instrument='XRP_JPY', asks=asks, bids=bids))
+        assert (converted['asks'], converted['bids']) == (expected.to_dict()['asks'], expected.to_dict()['bids'])
+        if i % 50:
+            # only the bids changed, the asks are published as they were
+            assert converted['asks'] is previous['asks']
@@ -0,0 +1,55 @@
+import threading
+
+from coinarb.ordertracker import OrderTracker
+
+
+def test_notify():
+    tracker = OrderTracker()
+    future = tracker.track(1)
+    tracker.notify(dict(id=2, state='CLOSED'))
+    assert tracker.wait(1, 0) == (False, None)
+
+    tracker.notify(dict(id=1, qty_executed=1))
+    assert tracker.wait(1, 0) == (True, None)
+    assert not future.done()
+
+    threading.Timer(0.01, tracker.notify, args=(dict(id=1, state='CLOSED', qty_executed=2),)).start()
+    assert tracker.wait(1, 1) == (True, dict(id=1, state='CLOSED', qty_executed=2))
+    assert future.result() == dict(id=1, state='CLOSED', qty_executed=2)
+    assert tracker.result(1)['qty_executed'] == 2
+
+    tracker.untrack(1)
+    assert tracker.result(1) is None
+    assert tracker.wait(1, 0) == (False, None)
+
+
+def test_updates_before_track():
+    tracker = OrderTracker(max_pending=2)
+    # the stream is faster than the REST response that returns the id
+    tracker.notify(dict(id=1, state='FILLED', qty_executed=2))
+    tracker.notify(dict(id=2, qty_executed=1))
+    tracker.notify(dict(id=3, qty_executed=1))
+    tracker.notify(dict(id=4, qty_executed=1))
+    # only the most recent ids are kept
+    assert tracker.track(1).done() is False
+    assert tracker.wait(1, 0) == (False, None)
+    future = tracker.track(4)
+    assert not future.done()
+    assert tracker.wait(4, 0) == (True, None)
+
+    tracker = OrderTracker()
+    tracker.notify(dict(id=1, state='FILLED', qty_executed=2))
+    assert tracker.track(1).result(0) == dict(id=1, state='FILLED', qty_executed=2)
+
+
+def test_fills_complete_order():
+    tracker = OrderTracker()
+    tracker.notify(dict(id=1, fill_qty=1.0, fill_price=10.0))
+    future = tracker.track(1, qty=3)
+    assert not future.done()
+    tracker.notify(dict(id=1, fill_qty=2.0, fill_price=13.0))
+    assert future.result(0) == dict(id=1, state='FILLED', qty_executed=3.0, price_executed_average=12.0)
+    # without the qty of the order, fills only wake the waiter
+    tracker.track(2)
+    tracker.notify(dict(id=2, fill_qty=1.0, fill_price=10.0))
+    assert tracker.wait(2, 0) == (True, None)
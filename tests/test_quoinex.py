@@ -0,0 +1,37 @@
+import functools
+import types
+
+import pytest
+
+coinlib = pytest.importorskip('coinlib')
+from coinarb.agents import quoinex  # noqa: E402
+from coinarb.arbconfig import CONFIG  # noqa: E402
+from coinarb.dataprovider import DataProvider  # noqa: E402
+from coinarb.fxprovider import FxProvider  # noqa: E402
+from coinarb.simclient import SimulatedStreamClient  # noqa: E402
+from coinarb.simexchange import SimulatedExchange  # noqa: E402
+
+
+def test_execution_stream(monkeypatch):
+    exchange = SimulatedExchange('quoinex', dict(XRP_JPY=100.0), dict(JPY=10000.0, XRP=100.0), depth=5,
+                                 level_qty=10, seed=0)
+    monkeypatch.setattr(coinlib, 'quoinex', types.SimpleNamespace(
+        StreamClient=functools.partial(SimulatedStreamClient, exchange)), raising=False)
+    monkeypatch.setitem(CONFIG['quoinex'], 'credentials', [dict(api_key='key', api_secret='secret')])
+    agent = quoinex.Agent(DataProvider([], fx_provider=FxProvider([])))
+    agent.init()
+    try:
+        # a resting order canceled on the venue completes its future through the execution subscription
+        order = exchange.create_order('XRP_JPY', 'limit', 'BUY', 1, price=50)
+        future = agent.order_tracker.track(order['id'], qty=1)
+        exchange.cancel_order(order['id'])
+        assert future.result(0)['state'] == 'CANCELED'
+
+        # fills without a state add up to the qty of the order, a message without either is only logged
+        future = agent.order_tracker.track('fills', qty=2)
+        agent.on_execution(('execution', ('XRP_JPY', 0)), dict(order_id='fills', quantity='2', price='100'))
+        agent.on_execution(('execution', ('XRP_JPY', 0)), dict(order_id='fills'))
+        assert future.result(0)['qty_executed'] == 2
+    finally:
+        agent.stop()
+    assert agent.client is None
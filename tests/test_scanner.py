@@ -0,0 +1,62 @@
+import itertools
+
+from coinarb import utils
+from coinarb.scanner import Scanner
+
+
+def make_order_book(asks, bids):
+    asks, bids = utils.adjust_asks_bids(asks, bids, 1)
+    return dict(asks=asks, bids=bids)
+
+
+def test_update():
+    scanner = Scanner('XRP_JPY', 1)
+    assert scanner.update('a', make_order_book([(10, 10)], [(9, 10)])) == []
+    assert scanner.update('b', make_order_book([(10.5, 10)], [(9.5, 10)])) == []
+    results = scanner.update('c', make_order_book([(8, 5)], [(7, 3)]))
+    assert [(x['sell_exchange'], x['buy_exchange']) for x in results] == [('b', 'c'), ('a', 'c')]
+    assert results[0]['diff'] == 1.5
+    assert results[0]['qty'] == 5
+
+    results = scanner.update('d', make_order_book([(13, 1)], [(12, 2)]))
+    assert [(x['sell_exchange'], x['buy_exchange']) for x in results] == [('d', 'c'), ('d', 'a'), ('d', 'b')]
+
+    # c and d move back, nothing crosses any more
+    scanner.remove('d')
+    assert scanner.update('c', make_order_book([(11, 5)], [(8, 3)])) == []
+    assert scanner.scan() == []
+
+
+def test_scan_matches_all_pairs():
+    books = {
+        'a': make_order_book([(10, 10), (11, 10)], [(9, 10), (8, 10)]),
+        'b': make_order_book([(12, 10), (13, 10)], [(11.5, 10), (11, 10)]),
+        'c': make_order_book([(8, 1), (9, 10)], [(7, 10), (6, 10)]),
+        'd': make_order_book([(14, 10)], [(13, 2), (10, 10)]),
+    }
+    scanner = Scanner('XRP_JPY', 1, max_candidates=100)
+    for exchange, order_book in books.items():
+        scanner.update(exchange, order_book)
+    expected = set()
+    for sell, buy in itertools.permutations(books, 2):
+        result = utils.calculate_diff(books[sell], books[buy], 1)
+        if result and result['diff'] >= 1:
+            expected.add((sell, buy))
+    assert {(x['sell_exchange'], x['buy_exchange']) for x in scanner.scan()} == expected
+
+    scanner.max_candidates = 1
+    assert len(scanner.scan()) == 1
+
+
+def test_tiers():
+    scanner = Scanner('XRP_JPY', 1, tiers=[0, 3])
+    scanner.update('a', make_order_book([(10, 1), (12, 5)], [(8, 10)]))
+    results = scanner.update('b', make_order_book([(20, 10)], [(14, 1), (12, 2), (11, 5)]))
+    assert len(results) == 1
+    result = results[0]
+    assert (result['sell_exchange'], result['buy_exchange']) == ('b', 'a')
+    assert [tier['qty'] for tier in result['tiers']] == [
+        utils.calculate_diff(scanner._order_books['b'], scanner._order_books['a'], diff_min)['qty']
+        for diff_min in (0, 3)]
+    assert {k: v for k, v in result.items() if k not in ('tiers', 'instrument', 'sell_exchange', 'buy_exchange')} \
+        == utils.calculate_diff(scanner._order_books['b'], scanner._order_books['a'], 1)
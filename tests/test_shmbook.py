@@ -0,0 +1,60 @@
+import multiprocessing
+
+from coinarb.shmbook import SharedBookStore
+
+
+def _write_many(spec, n):
+    store = SharedBookStore(**spec)
+    for i in range(1, n + 1):
+        store.write(('quoinex', 'XRP_JPY'), dict(version=i, asks=[(i, i, i)] * (i % 5 + 1),
+                                                 bids=[(-i, -i, -i)] * (i % 3 + 1)))
+    store.close()
+
+
+def test_shmbook():
+    store = SharedBookStore([('quoinex', 'XRP_JPY'), ('bitbankcc', 'XRP_JPY')], ['USD_JPY'], depth=2)
+    try:
+        key = ('quoinex', 'XRP_JPY')
+        assert store.read(key) is None
+        assert store.read_rate('USD_JPY') is None
+
+        store.write(key, dict(version=3, timestamp=10.0, received_at=11.0,
+                              asks=[(101.0, 1.0, 101.0), (102.0, 2.0, 102.0), (103.0, 3.0, 103.0)],
+                              bids=[(100.0, 4.0, 100.0)]))
+        order_book = store.read(key)
+        assert order_book == dict(instrument='XRP_JPY', version=3, timestamp=10.0, received_at=11.0,
+                                  asks=[(101.0, 1.0, 101.0), (102.0, 2.0, 102.0)], bids=[(100.0, 4.0, 100.0)])
+        assert store.read(key, since_version=3) is None
+        assert store.version(key) == 3
+        assert store.read(('bitbankcc', 'XRP_JPY')) is None
+
+        store.write_rate('USD_JPY', 110.5, 12.0)
+        assert store.read_rate('USD_JPY') == dict(instrument='USD_JPY', mid=110.5, timestamp=12.0)
+
+        other = SharedBookStore(**store.spec())
+        assert other.read(key) == order_book
+        other.close()
+    finally:
+        store.close()
+        store.unlink()
+
+
+def test_shmbook_concurrent_reader():
+    store = SharedBookStore([('quoinex', 'XRP_JPY')], depth=8)
+    try:
+        n = 2000
+        writer = multiprocessing.Process(target=_write_many, args=(store.spec(), n))
+        writer.start()
+        version = None
+        while version != n:
+            order_book = store.read(('quoinex', 'XRP_JPY'), version)
+            if order_book is None:
+                continue
+            version = order_book['version']
+            # never a torn read: every level belongs to the version of the header
+            assert order_book['asks'] == [(version, version, version)] * (version % 5 + 1)
+            assert order_book['bids'] == [(-version, -version, -version)] * (version % 3 + 1)
+        writer.join()
+    finally:
+        store.close()
+        store.unlink()
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from coinarb.simexchange import SimulatedExchange, SimulatedExchangeError
+
+
+def make_exchange(**kwargs):
+    return SimulatedExchange('sim', dict(XRP_JPY=100.0), dict(JPY=100000.0, XRP=1000.0), depth=5, level_qty=10,
+                             seed=0, **kwargs)
+
+
+def test_market_and_limit_orders():
+    exchange = make_exchange()
+    order_book = exchange.order_book('XRP_JPY')
+    best_ask, best_bid = order_book['asks'][0][0], order_book['bids'][0][0]
+    assert best_ask > best_bid
+    executions = []
+    exchange.subscribe(('execution', ('XRP_JPY', 0)), lambda key, data: executions.append(data))
+
+    order = exchange.create_order('XRP_JPY', 'market', 'BUY', 5)
+    assert order['state'] == 'FILLED' and order['qty_executed'] == pytest.approx(5)
+    assert order['price_executed_average'] == best_ask
+    balances = exchange.get_balances()
+    assert balances['XRP']['total'] == pytest.approx(1005)
+    assert balances['JPY']['total'] == pytest.approx(100000 - 5 * best_ask)
+    assert executions[-1]['order_id'] == order['id']
+
+    # a limit far below the book rests and locks its funds until canceled
+    order = exchange.create_order('XRP_JPY', 'limit', 'BUY', 3, price=50)
+    assert order['state'] == 'ACTIVE'
+    assert exchange.get_balances()['JPY']['used'] == pytest.approx(150)
+    assert exchange.cancel_order(order['id'])['state'] == 'CANCELED'
+    assert exchange.get_balances()['JPY']['used'] == 0
+    with pytest.raises(SimulatedExchangeError):
+        exchange.cancel_order(order['id'])
+    with pytest.raises(SimulatedExchangeError):
+        exchange.create_order('XRP_JPY', 'market', 'SELL', 10000)
+
+
+def test_partial_fills_and_dynamics():
+    exchange = make_exchange(fill_ratio=0.5, volatility=0.01)
+    total = sum(qty for _, qty in exchange.order_book('XRP_JPY')['bids'])
+    # half of every level, and the rest of a market order is canceled
+    order = exchange.create_order('XRP_JPY', 'market', 'SELL', total)
+    assert order['state'] == 'CANCELED'
+    assert order['qty_executed'] == pytest.approx(total / 2)
+
+    books = []
+    exchange.subscribe(('order_book', 'XRP_JPY'), lambda key, data: books.append(data))
+    order = exchange.create_order('XRP_JPY', 'limit', 'SELL', 1, price=exchange.mids['XRP_JPY'] * 1.001)
+    for _ in range(200):
+        exchange.step()
+        if exchange.get_order(order['id'])['state'] != 'ACTIVE':
+            break
+    # the mid walked up through the resting order (the walk is seeded)
+    assert exchange.get_order(order['id'])['state'] == 'FILLED'
+    assert books and exchange.mids['XRP_JPY'] != 100.0
+
+
+def test_stream_latency():
+    exchange = make_exchange(stream_latency=0.05, update_interval=0.01)
+    received = []
+    exchange.subscribe(('order_book', 'XRP_JPY'), lambda key, data: received.append((time.time(), data)))
+    exchange.start()
+    try:
+        deadline = time.time() + 2
+        while len(received) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        exchange.stop()
+    assert len(received) >= 5
+    assert all(at - data['timestamp'] >= 0.05 for at, data in received)
+
+
+def test_market_buy_funds_and_unlocked_delivery():
+    asks = make_exchange().order_book('XRP_JPY')['asks']
+    qty = asks[0][1] + 1
+    cost = (asks[0][0] * asks[0][1] + asks[1][0]) * 1.01
+    # enough for qty at the best ask, not for the second level and the fee
+    exchange = SimulatedExchange('sim', dict(XRP_JPY=100.0), dict(JPY=qty * asks[0][0] + 1), depth=5, level_qty=10,
+                                 seed=0, fee=0.01)
+    with pytest.raises(SimulatedExchangeError):
+        exchange.create_order('XRP_JPY', 'market', 'BUY', qty)
+    exchange = SimulatedExchange('sim', dict(XRP_JPY=100.0), dict(JPY=cost + 1e-6), depth=5, level_qty=10,
+                                 seed=0, fee=0.01)
+    assert exchange.create_order('XRP_JPY', 'market', 'BUY', qty)['state'] == 'FILLED'
+    assert exchange.get_balances()['JPY']['total'] == pytest.approx(0, abs=1e-5)
+
+    # a callback may wait on another thread that calls the venue, the delivery thread holds no lock
+    called = []
+
+    def on_book(key, data):
+        thread = threading.Thread(target=lambda: called.append(exchange.get_balances()))
+        thread.start()
+        thread.join(1)
+
+    exchange.subscribe(('order_book', 'XRP_JPY'), on_book)
+    exchange.update_interval = 0.01
+    exchange.start()
+    try:
+        deadline = time.time() + 2
+        while len(called) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        exchange.stop()
+    assert len(called) >= 3
+
+
+def test_callback_calling_the_venue_keeps_order():
+    exchange = make_exchange()
+    received = []
+
+    def on_execution(key, data):
+        if not received:
+            exchange.create_order('XRP_JPY', 'market', 'SELL', 1)
+
+    exchange.subscribe(('execution', ('XRP_JPY', 0)), on_execution)
+    exchange.subscribe(('execution', ('XRP_JPY', 1)), lambda key, data: received.append(data['id']))
+    first = exchange.create_order('XRP_JPY', 'market', 'BUY', 1)
+    # the execution of the order placed by the first callback is delivered after the first one
+    assert received == [first['id'], first['id'] + 1]
@@ -0,0 +1,54 @@
+import logging
+import threading
+
+from coinarb.subscribers import QueuedSubscriber, Subscriber, callback_name
+
+logger = logging.getLogger(__name__)
+
+
+def test_subscriber():
+    received = []
+
+    def on_data(exchange, key, data):
+        received.append((exchange, key, data))
+        if data == 'bad':
+            raise ValueError(data)
+
+    subscriber = Subscriber(on_data, logger)
+    assert subscriber.name == 'on_data'
+    subscriber('x', ('order_book', 'A'), 1)
+    # an exception of the callback is logged, not raised into the feed
+    subscriber('x', ('order_book', 'A'), 'bad')
+    assert received == [('x', ('order_book', 'A'), 1), ('x', ('order_book', 'A'), 'bad')]
+    assert subscriber.stats()['callback']['count'] == 2
+
+
+def test_callback_name():
+    class Agent:
+        name = 'quoinex'
+
+        def on_data(self, exchange, key, data):
+            pass
+
+    assert callback_name(Agent().on_data) == 'quoinex.on_data'
+
+
+def test_queued_subscriber_conflates_and_drops():
+    received = []
+    subscriber = QueuedSubscriber(lambda exchange, key, data: received.append((exchange, key[1], data)), logger, 2)
+    # not started: updates stay queued
+    subscriber('x', ('order_book', 'A'), 1)
+    subscriber('x', ('order_book', 'B'), 1)
+    subscriber('x', ('order_book', 'A'), 2)
+    subscriber('y', ('order_book', 'A'), 1)
+    stats = subscriber.stats()
+    assert (stats['queued'], stats['conflated'], stats['dropped'], stats['depth']) == (4, 1, 1, 2)
+
+    subscriber.start()
+    done = threading.Event()
+    subscriber.callback = lambda exchange, key, data: (received.append((exchange, key[1], data)), done.set())
+    subscriber('z', ('order_book', 'A'), 1)
+    assert done.wait(5)
+    subscriber.stop()
+    # x A was dropped although it was conflated, it was the oldest
+    assert received == [('x', 'B', 1), ('y', 'A', 1), ('z', 'A', 1)]
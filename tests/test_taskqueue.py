@@ -0,0 +1,47 @@
+import threading
+from queue import Empty
+
+import pytest
+
+from coinarb.taskqueue import BACKGROUND, MARKET, ROUTINE, PriorityTaskQueue
+
+
+def make_task(name, put_at=0.0):
+    return name, (), {}, put_at
+
+
+def test_priority_order():
+    q = PriorityTaskQueue()
+    assert q.put(make_task('balances'), BACKGROUND) == 1
+    assert q.put(make_task('main'), ROUTINE) == 2
+    assert q.put(make_task('arb1'), MARKET) == 3
+    assert q.put(make_task('arb2'), MARKET) == 4
+    assert [q.get_nowait()[1][0] for _ in range(4)] == ['arb1', 'arb2', 'main', 'balances']
+    with pytest.raises(Empty):
+        q.get_nowait()
+    stats = q.stats()
+    assert (stats['depth'], stats['max_depth'], stats['put']) == (0, 4, 4)
+
+
+def test_expired_tasks_are_dropped():
+    now = [100.0]
+    q = PriorityTaskQueue(clock=lambda: now[0])
+    expired = []
+    q.put(make_task('late'), MARKET, deadline=101.0, on_expired=lambda: expired.append('late'))
+    q.put(make_task('fresh'), MARKET, deadline=103.0)
+    q.put(make_task('balances'), BACKGROUND)
+    now[0] = 102.0
+    assert q.get_nowait() == (MARKET, make_task('fresh'))
+    assert expired == ['late']
+    assert q.get_nowait() == (BACKGROUND, make_task('balances'))
+    assert q.stats()['expired'] == dict(market=1, routine=0, background=0)
+
+
+def test_get_waits_for_put():
+    q = PriorityTaskQueue()
+    with pytest.raises(Empty):
+        q.get(timeout=0.01)
+    timer = threading.Timer(0.05, q.put, args=(make_task('arb'), MARKET))
+    timer.start()
+    assert q.get(timeout=5) == (MARKET, make_task('arb'))
+    timer.join()
@@ -0,0 +1,36 @@
+from coinarb import tickfile
+
+
+def test_write_read(tmpdir):
+    path = str(tmpdir.join('ticks.bin'))
+    with tickfile.TickWriter(path) as writer:
+        writer.write_fx(dict(instrument='USD_JPY', timestamp=1.5, bid=110.0, ask=110.2))
+        writer.write_order_book('quoinex', dict(instrument='XRP_JPY', timestamp=2.5,
+                                                asks=[(10, 10), (11, 20)], bids=[(9, 10)]))
+        writer.on_data('bitbankcc', ('order_book', 'XRP_JPY'),
+                       dict(instrument='XRP_JPY', timestamp=3.5, asks=[(15, 10, 10)], bids=[]))
+    ticks = list(tickfile.TickReader(path))
+    assert ticks == [
+        (tickfile.FX, 'oanda', dict(instrument='USD_JPY', timestamp=1.5, bid=110.0, ask=110.2,
+                                    mid=(110.0 + 110.2) / 2)),
+        (tickfile.ORDER_BOOK, 'quoinex', dict(instrument='XRP_JPY', timestamp=2.5,
+                                              asks=[(10, 10), (11, 20)], bids=[(9, 10)])),
+        (tickfile.ORDER_BOOK, 'bitbankcc', dict(instrument='XRP_JPY', timestamp=3.5, asks=[(10, 10)], bids=[])),
+    ]
+
+
+def test_write_raw_messages(tmpdir):
+    path = str(tmpdir.join('ticks.bin'))
+    writer = tickfile.TickWriter(path)
+    # no timestamp: stamped when written
+    writer.on_data('quoinex', ('order_book', 'XRP_JPY'), dict(instrument='XRP_JPY', asks=[(10, 1)], bids=[]))
+    writer.on_data('quoinex', ('order_book', 'XRP_JPY'),
+                   dict(instrument='XRP_JPY', timestamp=2.0, delta=True, asks=[(10, 0)], bids=[(9, 2)]))
+    writer.close()
+    # late feed callbacks after close are ignored
+    writer.on_data('quoinex', ('order_book', 'XRP_JPY'), dict(instrument='XRP_JPY', timestamp=3.0, asks=[], bids=[]))
+    ticks = list(tickfile.TickReader(path))
+    assert len(ticks) == 2
+    assert ticks[0][2]['timestamp'] > 0
+    assert ticks[1] == (tickfile.ORDER_BOOK, 'quoinex', dict(instrument='XRP_JPY', timestamp=2.0, delta=True,
+                                                             asks=[(10, 0)], bids=[(9, 2)]))
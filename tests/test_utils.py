@@ -90,3 +90,16 @@ def test_calculate_diff():
     assert result['sell_jpy'] == 11 * 1.5
     assert result['sell_price'] == 11
     assert result['qty'] == 8
+
+
+def test_calculate_diffs():
+    asks, bids = utils.adjust_asks_bids([(100, 1), (101, 2), (103, 5)], [(99, 1)], 1)
+    order_book_for_buy = dict(asks=asks, bids=bids)
+    asks, bids = utils.adjust_asks_bids([(110, 1)], [(106, 1), (104, 2), (102, 4), (100, 10)], 1)
+    order_book_for_sell = dict(asks=asks, bids=bids)
+    diff_mins = [3, -1, 0, 1, 5]
+    results = utils.calculate_diffs(order_book_for_sell, order_book_for_buy, diff_mins)
+    assert results == [utils.calculate_diff(order_book_for_sell, order_book_for_buy, diff_min)
+                       for diff_min in diff_mins]
+    assert [result['qty'] for result in results] == [3, 7, 3, 3, 1]
+    assert utils.calculate_diffs(order_book_for_sell, order_book_for_buy, []) == []